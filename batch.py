@@ -0,0 +1,336 @@
+"""
+Batch Evaluation with NumPy
+N positions are held as an N x 12 array of uint64 bitboards (bitboard.PIECES order, bit 0 is a8) plus side to move,
+castling rights and en-passant square arrays. Attack masks, check flags, legal move counts and the material and
+piece-square evaluation are computed for the whole batch at once with shifts and fills over the arrays,
+following the move rules of GameState (queen-only promotion, castling as in get_castle_moves).
+Needs NumPy 2.0 or later.
+Run with: python -m chess.batch [--positions N] [--seed N] - times the batch against GameState and cross-checks it
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from chess import bitboard
+from chess import engine
+from chess import search
+
+_ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+_ZERO = np.uint64(0)
+
+
+def _file_mask(files):
+    mask = 0
+    for f in files:
+        for r in range(8):
+            mask |= bitboard.square_bit(r, f)
+    return np.uint64(mask)
+
+
+# after a shift that moves d_file files to the side, the files the bits wrapped around into
+_WRAP_MASKS = {0: _ALL, 1: ~_file_mask((0,)), 2: ~_file_mask((0, 1)), 3: ~_file_mask((0, 1, 2)),
+               -1: ~_file_mask((7,)), -2: ~_file_mask((6, 7)), -3: ~_file_mask((5, 6, 7))}
+_ROW_MASKS = [np.uint64(0xFF << (8 * r)) for r in range(8)]
+
+# the pin axes: pieces pinned along an axis may only move along it
+_AXIS = {(-1, 0): 0, (1, 0): 0, (0, -1): 1, (0, 1): 1, (-1, -1): 2, (1, 1): 2, (-1, 1): 3, (1, -1): 3}
+
+PAWN, ROOK, KNIGHT, BISHOP, QUEEN, KING = range(6) # column of each piece type in a side's N x 6 slice
+
+
+def _shift(bits, d_rank, d_file):
+    delta = d_rank * 8 + d_file
+    if delta > 0:
+        bits = bits << np.uint64(delta)
+    else:
+        bits = bits >> np.uint64(-delta)
+    return bits & _WRAP_MASKS[d_file]
+
+
+"""Squares reached from bits stepping in one direction, up to and including the first occupied square"""
+def _slide(bits, empty, d_rank, d_file):
+    attacks = np.zeros_like(bits)
+    for _ in range(7):
+        bits = _shift(bits, d_rank, d_file)
+        attacks |= bits
+        bits &= empty
+    return attacks
+
+
+def _steps(bits, offsets):
+    attacks = np.zeros_like(bits)
+    for d_rank, d_file in offsets:
+        attacks |= _shift(bits, d_rank, d_file)
+    return attacks
+
+
+"""Squares a pawn set attacks, for a batch where white says per position which way the pawns face"""
+def _pawn_attacks(pawns, white):
+    return np.where(white, _shift(pawns, -1, -1) | _shift(pawns, -1, 1), _shift(pawns, 1, -1) | _shift(pawns, 1, 1))
+
+
+def _count(bits):
+    return np.bitwise_count(bits).astype(np.int32)
+
+
+class PositionBatch:
+    def __init__(self, pieces, white_to_move, castling_rights=None, enpassant=None):
+        self.pieces = np.ascontiguousarray(pieces, dtype=np.uint64)
+        count = len(self.pieces)
+        self.white_to_move = np.asarray(white_to_move, dtype=bool)
+        self.castling_rights = np.zeros(count, np.uint8) if castling_rights is None else \
+            np.asarray(castling_rights, dtype=np.uint8)
+        self.enpassant = np.full(count, -1, np.int8) if enpassant is None else np.asarray(enpassant, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.pieces)
+
+    @classmethod
+    def from_states(cls, states):
+        states = list(states)
+        pieces = np.zeros((len(states), 12), np.uint64)
+        white_to_move = np.zeros(len(states), bool)
+        castling_rights = np.zeros(len(states), np.uint8)
+        enpassant = np.full(len(states), -1, np.int8)
+        index = {piece: i for i, piece in enumerate(bitboard.PIECES)}
+        for n, gs in enumerate(states):
+            boards = [0] * 12
+            for r in range(8):
+                row = gs.board[r]
+                for f in range(8):
+                    if row[f] != '--':
+                        boards[index[row[f]]] |= 1 << (r * 8 + f)
+            pieces[n] = boards
+            white_to_move[n] = gs.white_to_move
+            castling_rights[n] = gs.castling_rights
+            if gs.enpassant_possible != ():
+                enpassant[n] = gs.enpassant_possible[0] * 8 + gs.enpassant_possible[1]
+        return cls(pieces, white_to_move, castling_rights, enpassant)
+
+    @classmethod
+    def from_fens(cls, fens):
+        states = []
+        for fen in fens:
+            gs = engine.GameState()
+            gs.load_fen(fen)
+            states.append(gs)
+        return cls.from_states(states)
+
+    """From N x 12 x 64 piece planes (any dtype, nonzero means occupied) in bitboard.PIECES order"""
+    @classmethod
+    def from_planes(cls, planes, white_to_move, castling_rights=None, enpassant=None):
+        packed = np.packbits(np.asarray(planes) != 0, axis=-1, bitorder='little')
+        return cls(packed.view('<u8').reshape(len(packed), 12), white_to_move, castling_rights, enpassant)
+
+    """N x 12 x 64 uint8 piece planes"""
+    def planes(self):
+        as_bytes = self.pieces.astype('<u8', copy=False).view(np.uint8).reshape(len(self), 12, 8)
+        return np.unpackbits(as_bytes, axis=-1, bitorder='little')
+
+    """(side to move's N x 6 bitboards, opponent's N x 6 bitboards) in PAWN..KING column order"""
+    def sides(self):
+        white = self.white_to_move[:, None]
+        return np.where(white, self.pieces[:, :6], self.pieces[:, 6:]), \
+               np.where(white, self.pieces[:, 6:], self.pieces[:, :6])
+
+
+"""Every square the side with pieces (N x 6) attacks, pawns facing up the board where white is set"""
+def side_attacks(pieces, white, occupied):
+    empty = ~occupied
+    attacks = _pawn_attacks(pieces[:, PAWN], white)
+    attacks |= _steps(pieces[:, KNIGHT], bitboard.KNIGHT_OFFSETS)
+    attacks |= _steps(pieces[:, KING], bitboard.KING_OFFSETS)
+    rooks = pieces[:, ROOK] | pieces[:, QUEEN]
+    bishops = pieces[:, BISHOP] | pieces[:, QUEEN]
+    for d in bitboard.ROOK_DIRECTIONS:
+        attacks |= _slide(rooks, empty, *bitboard.DIRECTIONS[d])
+    for d in bitboard.BISHOP_DIRECTIONS:
+        attacks |= _slide(bishops, empty, *bitboard.DIRECTIONS[d])
+    return attacks
+
+
+"""N x 2 array of the squares white (column 0) and black (column 1) attack"""
+def attack_masks(batch):
+    pieces = batch.pieces
+    occupied = np.bitwise_or.reduce(pieces, axis=1)
+    white = np.ones(len(batch), bool)
+    return np.stack((side_attacks(pieces[:, :6], white, occupied), side_attacks(pieces[:, 6:], ~white, occupied)),
+                    axis=1)
+
+
+"""Whether the side to move is in check, for every position"""
+def in_check(batch):
+    us, them = batch.sides()
+    occupied = np.bitwise_or.reduce(batch.pieces, axis=1)
+    return side_attacks(them, ~batch.white_to_move, occupied) & us[:, KING] != 0
+
+
+"""Whether enemy pieces (N x 6) attack the king bitboard with the given occupancy"""
+def _king_attacked(king, white, them, occupied):
+    empty = ~occupied
+    attacked = _pawn_attacks(king, white) & them[:, PAWN]
+    attacked |= _steps(king, bitboard.KNIGHT_OFFSETS) & them[:, KNIGHT]
+    rooks = them[:, ROOK] | them[:, QUEEN]
+    bishops = them[:, BISHOP] | them[:, QUEEN]
+    for d in bitboard.ROOK_DIRECTIONS:
+        attacked |= _slide(king, empty, *bitboard.DIRECTIONS[d]) & rooks
+    for d in bitboard.BISHOP_DIRECTIONS:
+        attacked |= _slide(king, empty, *bitboard.DIRECTIONS[d]) & bishops
+    return attacked != 0
+
+
+"""
+Number of legal moves of every position, as len(GameState.get_valid_moves()) would give.
+Moves are counted per piece type and direction: pieces sliding the same way can't reach the same square,
+so each popcount counts distinct moves. Pins restrict a piece to its pin axis, a single check restricts
+the other pieces to the checker and the squares between, and en passant is tried on the changed occupancy.
+"""
+def legal_move_counts(batch):
+    us, them = batch.sides()
+    white = batch.white_to_move
+    own = np.bitwise_or.reduce(us, axis=1)
+    enemy = np.bitwise_or.reduce(them, axis=1)
+    occupied = own | enemy
+    empty = ~occupied
+    king = us[:, KING]
+    enemy_rooks = them[:, ROOK] | them[:, QUEEN]
+    enemy_bishops = them[:, BISHOP] | them[:, QUEEN]
+
+    # the king may not step along a line it is itself blocking, so the enemy attacks see through it
+    attacked = side_attacks(them, ~white, occupied & ~king)
+    counts = _count(_steps(king, bitboard.KING_OFFSETS) & ~own & ~attacked)
+
+    checkers = (_steps(king, bitboard.KNIGHT_OFFSETS) & them[:, KNIGHT]) | (_pawn_attacks(king, white) & them[:, PAWN])
+    blocks = np.zeros_like(king)
+    pinned_on = [np.zeros_like(king) for _ in range(4)]
+    for d, (d_rank, d_file) in enumerate(bitboard.DIRECTIONS):
+        sliders = enemy_rooks if d in bitboard.ROOK_DIRECTIONS else enemy_bishops
+        ray = _slide(king, empty, d_rank, d_file)
+        first = ray & occupied
+        checker = first & sliders
+        checkers |= checker
+        blocks |= np.where(checker != 0, ray, _ZERO)
+        blocker = first & own
+        pinner = _slide(blocker, empty, d_rank, d_file) & occupied & sliders
+        pinned_on[_AXIS[d_rank, d_file]] |= np.where(pinner != 0, blocker, _ZERO)
+    pinned = pinned_on[0] | pinned_on[1] | pinned_on[2] | pinned_on[3]
+    check_count = _count(checkers)
+    targets = np.where(check_count == 0, _ALL, np.where(check_count == 1, checkers | blocks, _ZERO)) & ~own
+
+    rooks = us[:, ROOK] | us[:, QUEEN]
+    bishops = us[:, BISHOP] | us[:, QUEEN]
+    for d, (d_rank, d_file) in enumerate(bitboard.DIRECTIONS):
+        movers = (rooks if d in bitboard.ROOK_DIRECTIONS else bishops) & (~pinned | pinned_on[_AXIS[d_rank, d_file]])
+        counts += _count(_slide(movers, empty, d_rank, d_file) & targets)
+    knights = us[:, KNIGHT] & ~pinned # a pinned knight can never move
+    for d_rank, d_file in bitboard.KNIGHT_OFFSETS:
+        counts += _count(_shift(knights, d_rank, d_file) & targets)
+
+    # pawns: work out both directions and keep the one for the side to move
+    pawns = us[:, PAWN]
+    enpassant_bit = np.where(batch.enpassant >= 0, np.uint64(1) << batch.enpassant.clip(0).astype(np.uint64), _ZERO)
+    pawn_counts = []
+    for forward, third_row in ((-1, 5), (1, 2)):
+        pushers = pawns & (~pinned | pinned_on[0])
+        one = _shift(pushers, forward, 0) & empty
+        pawn_count = _count(one & targets)
+        pawn_count += _count(_shift(one & _ROW_MASKS[third_row], forward, 0) & empty & targets)
+        for d_file in (-1, 1):
+            capturers = pawns & (~pinned | pinned_on[_AXIS[forward, d_file]])
+            pawn_count += _count(_shift(capturers, forward, d_file) & enemy & targets)
+            # en passant: make the capture on the occupancy and see whether the king is attacked afterwards
+            start = _shift(enpassant_bit, -forward, -d_file) & pawns
+            captured = _shift(enpassant_bit, -forward, 0)
+            after = (occupied & ~start & ~captured) | enpassant_bit
+            remaining = them.copy()
+            remaining[:, PAWN] &= ~captured
+            pawn_count += ((start != 0) & ~_king_attacked(king, white, remaining, after)).astype(np.int32)
+        pawn_counts.append(pawn_count)
+    counts += np.where(white, pawn_counts[0], pawn_counts[1])
+
+    # castling, with the same conditions as GameState.get_castle_moves
+    rights = batch.castling_rights
+    kingside = np.where(white, rights & engine.WKS, rights & engine.BKS) != 0
+    queenside = np.where(white, rights & engine.WQS, rights & engine.BQS) != 0
+    safe = check_count == 0
+    passing = _shift(king, 0, 1) | _shift(king, 0, 2)
+    counts += (kingside & safe & (passing & (occupied | attacked) == 0) &
+               (_count(passing) == 2)).astype(np.int32)
+    passing = _shift(king, 0, -1) | _shift(king, 0, -2)
+    counts += (queenside & safe & (passing & attacked == 0) &
+               ((passing | _shift(king, 0, -3)) & occupied == 0) & (_count(passing) == 2)).astype(np.int32)
+    return counts
+
+
+# material plus piece-square value of every piece on every square, negative for black, in plane order
+_SQUARE_VALUES = np.array([[value if piece[0] == 'w' else -value for value in search.SQUARE_VALUES[piece]]
+                           for piece in bitboard.PIECES], np.int32).reshape(768)
+
+
+"""search.evaluate for every position: material and piece-square score from the side to move's point of view"""
+def evaluate(batch):
+    score = batch.planes().reshape(len(batch), 768).astype(np.int32) @ _SQUARE_VALUES
+    return np.where(batch.white_to_move, score, -score)
+
+
+"""Indices of the positions where the batch disagrees with GameState on legal moves, check or evaluation"""
+def cross_check(states):
+    states = list(states)
+    batch = PositionBatch.from_states(states)
+    counts = legal_move_counts(batch)
+    checks = in_check(batch)
+    scores = evaluate(batch)
+    mismatches = []
+    for n, gs in enumerate(states):
+        if counts[n] != len(gs.get_valid_moves()) or checks[n] != gs.in_check() or scores[n] != search.evaluate(gs):
+            mismatches.append(n)
+    return mismatches
+
+
+"""count positions from random games of up to max_plies plies, as GameStates"""
+def random_positions(count, seed=None, max_plies=120):
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        gs = engine.GameState()
+        for _ in range(rng.randrange(max_plies)):
+            codes = gs.get_valid_move_codes()
+            if not codes:
+                break
+            gs.make_move(engine.Move.from_code(rng.choice(codes), gs.board))
+        states.append(gs)
+    return states
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the NumPy batch API against GameState and cross-check it')
+    parser.add_argument('--positions', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    states = random_positions(args.positions, args.seed)
+    start = time.perf_counter()
+    batch = PositionBatch.from_states(states)
+    encoded = time.perf_counter()
+    legal_move_counts(batch), in_check(batch), evaluate(batch), attack_masks(batch)
+    batch_time = time.perf_counter() - encoded
+    print('batch:     %d positions in %.3fs (+%.3fs encoding), %.0f positions/s'
+          % (len(batch), batch_time, encoded - start, len(batch) / batch_time))
+    start = time.perf_counter()
+    for gs in states:
+        gs.get_valid_move_codes(), gs.in_check(), search.evaluate(gs)
+    loop_time = time.perf_counter() - start
+    print('GameState: %d positions in %.3fs, %.0f positions/s' % (len(states), loop_time, len(states) / loop_time))
+    mismatches = cross_check(states)
+    print('cross-check: %d mismatches' % len(mismatches))
+    for n in mismatches[:10]:
+        print('  ' + states[n].get_fen())
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Bitboard Position, Attack Tables and Legal Move Generation
+Squares are numbered rank * 8 + file in GameState.board order, so bit 0 is a8 and bit 63 is h1.
+"""
+
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+QUEEN_DIRECTIONS = (0, 1, 2, 3, 4, 5, 6, 7)
+# directions that step to higher square numbers - the nearest blocker on those rays is the lowest set bit
+POSITIVE_DIRECTIONS = (2, 3, 6, 7)
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+PIECES = ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')
+
+# moves packed into one int: start square in bits 0-5, end square in bits 6-11, flag in bits 12-13
+ENPASSANT_FLAG = 1 << 12
+CASTLE_FLAG = 2 << 12
+
+
+def encode_move(start_sq, end_sq, flag=0):
+    return start_sq | end_sq << 6 | flag
+
+
+def square_bit(r, f):
+    return 1 << (r * 8 + f)
+
+
+def _build_step_table(offsets):
+    table = []
+    for sq in range(64):
+        r, f = divmod(sq, 8)
+        targets = 0
+        for d_rank, d_file in offsets:
+            if 0 <= r + d_rank < 8 and 0 <= f + d_file < 8:
+                targets |= square_bit(r + d_rank, f + d_file)
+        table.append(targets)
+    return table
+
+
+def _build_rays():
+    rays = []
+    for d_rank, d_file in DIRECTIONS:
+        direction_rays = []
+        for sq in range(64):
+            r, f = divmod(sq, 8)
+            ray = 0
+            for i in range(1, 8):
+                end_rank = r + d_rank * i
+                end_file = f + d_file * i
+                if not (0 <= end_rank < 8 and 0 <= end_file < 8):
+                    break
+                ray |= square_bit(end_rank, end_file)
+            direction_rays.append(ray)
+        rays.append(direction_rays)
+    return rays
+
+
+KNIGHT_ATTACKS = _build_step_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _build_step_table(KING_OFFSETS)
+# squares a pawn of the given colour standing on sq attacks
+PAWN_ATTACKS = {'w': _build_step_table(((-1, -1), (-1, 1))),
+                'b': _build_step_table(((1, -1), (1, 1)))}
+RAYS = _build_rays()
+
+
+def _build_between_and_line():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        for d in range(8):
+            ray = RAYS[d][sq]
+            d_rank, d_file = DIRECTIONS[d]
+            opposite = RAYS[DIRECTIONS.index((-d_rank, -d_file))][sq]
+            # walk outwards in order of distance so 'walked' holds the squares strictly between
+            walked = 0
+            r, f = divmod(sq, 8)
+            for i in range(1, 8):
+                end_rank = r + d_rank * i
+                end_file = f + d_file * i
+                if not (0 <= end_rank < 8 and 0 <= end_file < 8):
+                    break
+                target = end_rank * 8 + end_file
+                between[sq][target] = walked
+                line[sq][target] = ray | opposite | (1 << sq)
+                walked |= 1 << target
+    return between, line
+
+
+BETWEEN, LINE = _build_between_and_line()
+
+
+def slider_attacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d in POSITIVE_DIRECTIONS:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first] # cut the ray off behind the first blocker
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishop_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def squares(bits):
+    while bits:
+        lsb = bits & -bits
+        yield lsb.bit_length() - 1
+        bits ^= lsb
+
+
+class Bitboards:
+    def __init__(self, board):
+        self.pieces = {piece: 0 for piece in PIECES}
+        self.colors = {'w': 0, 'b': 0}
+        for r in range(8):
+            for f in range(8):
+                piece = board[r][f]
+                if piece != '--':
+                    self.add(piece, r * 8 + f)
+
+    @property
+    def occupied(self):
+        return self.colors['w'] | self.colors['b']
+
+    def add(self, piece, sq):
+        bit = 1 << sq
+        self.pieces[piece] |= bit
+        self.colors[piece[0]] |= bit
+
+    def remove(self, piece, sq):
+        bit = 1 << sq
+        self.pieces[piece] &= ~bit
+        self.colors[piece[0]] &= ~bit
+
+    """Mirrors GameState.make_move"""
+    def make_move(self, move):
+        start_sq = move.start_rank * 8 + move.start_file
+        end_sq = move.end_rank * 8 + move.end_file
+        self.remove(move.piece_moved, start_sq)
+        if move.is_enpassant_move:
+            self.remove(move.piece_captured, move.start_rank * 8 + move.end_file)
+        elif move.piece_captured != '--':
+            self.remove(move.piece_captured, end_sq)
+        if move.is_pawn_promotion:
+            self.add(move.piece_moved[0] + 'Q', end_sq)
+        else:
+            self.add(move.piece_moved, end_sq)
+        if move.is_castle_move:
+            self.move_castle_rook(move, undo=False)
+
+    """Mirrors GameState.undo_move"""
+    def undo_move(self, move):
+        start_sq = move.start_rank * 8 + move.start_file
+        end_sq = move.end_rank * 8 + move.end_file
+        if move.is_pawn_promotion:
+            self.remove(move.piece_moved[0] + 'Q', end_sq)
+        else:
+            self.remove(move.piece_moved, end_sq)
+        self.add(move.piece_moved, start_sq)
+        if move.is_enpassant_move:
+            self.add(move.piece_captured, move.start_rank * 8 + move.end_file)
+        elif move.piece_captured != '--':
+            self.add(move.piece_captured, end_sq)
+        if move.is_castle_move:
+            self.move_castle_rook(move, undo=True)
+
+    def move_castle_rook(self, move, undo):
+        rook = move.piece_moved[0] + 'R'
+        row = move.end_rank * 8
+        if move.end_file - move.start_file == 2: # kingside castle move
+            corner, castled = row + move.end_file + 1, row + move.end_file - 1
+        else: # queenside castle move
+            corner, castled = row + move.end_file - 2, row + move.end_file + 1
+        if undo:
+            corner, castled = castled, corner
+        if not self.pieces[rook] >> corner & 1: # no rook to move, so none may appear either
+            return
+        self.remove(rook, corner)
+        self.add(rook, castled)
+
+    """Bitboard of the pieces of color attacking sq with the given occupancy"""
+    def attackers(self, sq, color, occupied):
+        pieces = self.pieces
+        enemy = 'b' if color == 'w' else 'w'
+        queens = pieces[color + 'Q']
+        return (KNIGHT_ATTACKS[sq] & pieces[color + 'N']) | \
+               (KING_ATTACKS[sq] & pieces[color + 'K']) | \
+               (PAWN_ATTACKS[enemy][sq] & pieces[color + 'p']) | \
+               (bishop_attacks(sq, occupied) & (pieces[color + 'B'] | queens)) | \
+               (rook_attacks(sq, occupied) & (pieces[color + 'R'] | queens))
+
+    """
+    Legal moves as packed ints (see encode_move).
+    enpassant_sq is the square a pawn may capture onto, or None.
+    """
+    def generate_legal_moves(self, white_to_move, kingside, queenside, enpassant_sq):
+        pieces = self.pieces
+        if white_to_move:
+            us, them = 'w', 'b'
+        else:
+            us, them = 'b', 'w'
+        own = self.colors[us]
+        enemy = self.colors[them]
+        occupied = own | enemy
+        king_sq = pieces[us + 'K'].bit_length() - 1
+        checkers = self.attackers(king_sq, them, occupied)
+
+        # own pieces that are the only blocker between our king and an enemy slider
+        pinned = 0
+        enemy_queens = pieces[them + 'Q']
+        snipers = (rook_attacks(king_sq, 0) & (pieces[them + 'R'] | enemy_queens)) | \
+                  (bishop_attacks(king_sq, 0) & (pieces[them + 'B'] | enemy_queens))
+        for sniper in squares(snipers):
+            blockers = BETWEEN[king_sq][sniper] & occupied
+            if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                pinned |= blockers
+
+        moves = []
+        # king moves - the king itself must not block attacks on the squares it steps to
+        without_king = occupied & ~(1 << king_sq)
+        for end_sq in squares(KING_ATTACKS[king_sq] & ~own):
+            if not self.attackers(end_sq, them, without_king):
+                moves.append(king_sq | end_sq << 6)
+
+        if checkers & (checkers - 1):
+            return moves # double check - only the king can move
+        if checkers:
+            checker_sq = checkers.bit_length() - 1
+            targets = BETWEEN[king_sq][checker_sq] | checkers
+        else:
+            targets = ~0
+        target_mask = ~own & targets
+
+        for piece_type, attacks in (('N', None), ('B', BISHOP_DIRECTIONS), ('R', ROOK_DIRECTIONS),
+                                    ('Q', QUEEN_DIRECTIONS)):
+            for start_sq in squares(pieces[us + piece_type]):
+                if attacks is None:
+                    if pinned >> start_sq & 1:
+                        continue # a pinned knight can never move
+                    destinations = KNIGHT_ATTACKS[start_sq] & target_mask
+                else:
+                    destinations = slider_attacks(start_sq, occupied, attacks) & target_mask
+                    if pinned >> start_sq & 1:
+                        destinations &= LINE[king_sq][start_sq]
+                for end_sq in squares(destinations):
+                    moves.append(start_sq | end_sq << 6)
+
+        # pawns
+        if white_to_move:
+            step, start_rank = -8, 6
+        else:
+            step, start_rank = 8, 1
+        for start_sq in squares(pieces[us + 'p']):
+            allowed = target_mask
+            if pinned >> start_sq & 1:
+                allowed &= LINE[king_sq][start_sq]
+            one = start_sq + step
+            if not occupied >> one & 1:
+                if allowed >> one & 1:
+                    moves.append(start_sq | one << 6)
+                two = one + step
+                if start_sq // 8 == start_rank and not occupied >> two & 1 and allowed >> two & 1:
+                    moves.append(start_sq | two << 6)
+            for end_sq in squares(PAWN_ATTACKS[us][start_sq] & enemy & allowed):
+                moves.append(start_sq | end_sq << 6)
+            if enpassant_sq is not None and PAWN_ATTACKS[us][start_sq] >> enpassant_sq & 1:
+                # try it on the occupancy - the capture takes two pieces off one rank at once
+                captured_sq = enpassant_sq - step
+                after = (occupied & ~(1 << start_sq) & ~(1 << captured_sq)) | (1 << enpassant_sq)
+                pieces[them + 'p'] &= ~(1 << captured_sq)
+                attacked = self.attackers(king_sq, them, after)
+                pieces[them + 'p'] |= 1 << captured_sq
+                if not attacked:
+                    moves.append(start_sq | enpassant_sq << 6 | ENPASSANT_FLAG)
+
+        home = 60 if white_to_move else 4
+        if not checkers and king_sq == home:
+            # castling, same conditions as GameState.get_castle_moves, and only with the rook still in its corner
+            kingside = kingside and pieces[us + 'R'] >> (home + 3) & 1
+            queenside = queenside and pieces[us + 'R'] >> (home - 4) & 1
+            if kingside and not occupied >> (king_sq + 1) & 1 and not occupied >> (king_sq + 2) & 1:
+                if not self.attackers(king_sq + 1, them, occupied) and not self.attackers(king_sq + 2, them, occupied):
+                    moves.append(king_sq | (king_sq + 2) << 6 | CASTLE_FLAG)
+            if queenside and not occupied >> (king_sq - 1) & 1 and not occupied >> (king_sq - 2) & 1 \
+                    and not occupied >> (king_sq - 3) & 1:
+                if not self.attackers(king_sq - 1, them, occupied) and not self.attackers(king_sq - 2, them, occupied):
+                    moves.append(king_sq | (king_sq - 2) << 6 | CASTLE_FLAG)
+        return moves
+
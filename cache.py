@@ -0,0 +1,73 @@
+"""
+Legal Move Cache
+Remembers the legal moves, check status and checkmate/stalemate of recently seen positions by zobrist key,
+so revisiting a position (undo/redo, analysis, servers seeing the same openings and puzzles) costs a lookup.
+Least recently used entries are dropped past max_size. One cache can be shared by any number of threads and
+GameStates: entries hold packed move codes, and Move objects are built for the GameState asking.
+"""
+
+import threading
+from collections import OrderedDict
+
+from chess import engine
+
+
+class MoveCache:
+    def __init__(self, max_size=1 << 14):
+        if max_size <= 0:
+            raise ValueError('max_size must be positive')
+        self.max_size = max_size
+        self.entries = OrderedDict() # zobrist key -> (move codes, in_check, checkmate, stalemate)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    """(codes, in_check, checkmate, stalemate) for gs's position, generated and stored on a miss"""
+    def lookup(self, gs):
+        key = gs.zobrist_key
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            # generated outside the lock, so other threads aren't held up; two threads may both do the work
+            codes = tuple(gs.get_valid_move_codes())
+            entry = (codes, gs.in_check(), gs.checkmate, gs.stalemate)
+            with self.lock:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+                if len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        else:
+            gs.checkmate, gs.stalemate = entry[2], entry[3]
+        return entry
+
+    """Same as gs.get_valid_move_codes(), including setting gs.checkmate and gs.stalemate"""
+    def get_valid_move_codes(self, gs):
+        return list(self.lookup(gs)[0])
+
+    """Same as gs.get_valid_moves(), including setting gs.checkmate and gs.stalemate"""
+    def get_valid_moves(self, gs):
+        board = gs.board
+        return [engine.Move.from_code(code, board) for code in self.lookup(gs)[0]]
+
+    """(in_check, checkmate, stalemate) for gs's position"""
+    def status(self, gs):
+        return self.lookup(gs)[1:]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
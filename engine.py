@@ -1,8 +1,111 @@
 """
 Current State, Valid Moves, Storing Info like Move Log
 """
+import logging
+
+from chess import bitboard
+from chess import zobrist
+from chess.bitboard import encode_move, ENPASSANT_FLAG, CASTLE_FLAG, DIRECTIONS, KNIGHT_OFFSETS, KING_OFFSETS
+
+logger = logging.getLogger(__name__)
+
+# castling rights are kept as a 4-bit mask
+WKS = 1
+WQS = 2
+BKS = 4
+BQS = 8
+
+
+"""
+Move tables for the mailbox generators, built once at import.
+Each entry is an (end_rank, end_file, move code) step from the square the table is indexed by, so the generators
+index the board and append codes without any bounds checks or square arithmetic.
+"""
+def _build_targets(offsets):
+    table = []
+    for sq in range(64):
+        r, f = divmod(sq, 8)
+        table.append(tuple((r + d_rank, f + d_file, encode_move(sq, (r + d_rank) * 8 + f + d_file))
+                           for d_rank, d_file in offsets if 0 <= r + d_rank < 8 and 0 <= f + d_file < 8))
+    return table
+
+
+"""RAYS[sq][j] are the steps from sq in DIRECTIONS[j] out to the edge, nearest first"""
+def _build_rays():
+    rays = []
+    for sq in range(64):
+        r, f = divmod(sq, 8)
+        square_rays = []
+        for d_rank, d_file in DIRECTIONS:
+            ray = []
+            end_rank, end_file = r + d_rank, f + d_file
+            while 0 <= end_rank < 8 and 0 <= end_file < 8:
+                ray.append((end_rank, end_file, encode_move(sq, end_rank * 8 + end_file)))
+                end_rank, end_file = end_rank + d_rank, end_file + d_file
+            square_rays.append(tuple(ray))
+        rays.append(tuple(square_rays))
+    return rays
+
+
+"""Pushes (the double push only from the start rank, after the single one) and captures per colour and square"""
+def _build_pawn_tables():
+    pushes = {}
+    captures = {}
+    for color, forward, start_rank in (('w', -1, 6), ('b', 1, 1)):
+        pushes[color] = []
+        captures[color] = []
+        for sq in range(64):
+            r, f = divmod(sq, 8)
+            if not 0 <= r + forward < 8:
+                pushes[color].append(())
+                captures[color].append(())
+                continue
+            steps = [(r + forward, f, encode_move(sq, sq + forward * 8))]
+            if r == start_rank:
+                steps.append((r + forward * 2, f, encode_move(sq, sq + forward * 16)))
+            pushes[color].append(tuple(steps))
+            captures[color].append(tuple((r + forward, f + d_file, encode_move(sq, sq + forward * 8 + d_file))
+                                         for d_file in (-1, 1) if 0 <= f + d_file < 8))
+    return pushes, captures
+
+
+KNIGHT_TARGETS = _build_targets(KNIGHT_OFFSETS)
+KING_TARGETS = _build_targets(KING_OFFSETS)
+RAYS = _build_rays()
+ROOK_RAYS = [rays[:4] for rays in RAYS]
+BISHOP_RAYS = [rays[4:] for rays in RAYS]
+PAWN_PUSHES, PAWN_CAPTURES = _build_pawn_tables()
+
+
+"""
+Raises ValueError unless fen is a FEN (or EPD) load_fen can set up: 8 ranks of 8 squares, one king a side and
+castling rights only where the king and that rook are still on their starting squares
+"""
+def check_fen(fen):
+    fields = fen.split()
+    if not fields or len(fields[0].split('/')) != 8:
+        raise ValueError('bad FEN: %r' % fen)
+    for row in fields[0].split('/'):
+        if any(char not in 'pnbrqkPNBRQK12345678' for char in row) or \
+                sum(int(char) if char.isdigit() else 1 for char in row) != 8:
+            raise ValueError('bad FEN: %r' % fen)
+    if fields[0].count('K') != 1 or fields[0].count('k') != 1:
+        raise ValueError('bad FEN, each side needs one king: %r' % fen)
+    if len(fields) > 1 and fields[1] not in ('w', 'b'):
+        raise ValueError('bad FEN side to move: %r' % fen)
+    if len(fields) > 2:
+        ranks = [''.join('-' * int(char) if char.isdigit() else char for char in row) for row in fields[0].split('/')]
+        for right, rank, king, rook, rook_file in (('K', 7, 'K', 'R', 7), ('Q', 7, 'K', 'R', 0),
+                                                   ('k', 0, 'k', 'r', 7), ('q', 0, 'k', 'r', 0)):
+            if right in fields[2] and (ranks[rank][4] != king or ranks[rank][rook_file] != rook):
+                raise ValueError('bad FEN castling rights, %s without its king and rook at home: %r' % (right, fen))
+    if len(fields) > 3 and fields[3] != '-' and (len(fields[3]) != 2 or fields[3][0] not in 'abcdefgh' or
+                                                  fields[3][1] not in '36'):
+        raise ValueError('bad FEN en passant square: %r' % fen)
+
+
 class GameState:
-    def __init__(self):
+    def __init__(self, pin_aware=True, backend='mailbox'):
         self.board = [
             ['bR', 'bN', 'bB', 'bQ', 'bK', 'bB', 'bN', 'bR'],
             ['bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp', 'bp'],
@@ -22,6 +125,7 @@ class GameState:
             'K': self.get_king_moves
         }
 
+        self.pin_aware = pin_aware # False falls back to make/undo filtering in get_valid_moves
         self.white_to_move = True
         self.move_log = []
         self.white_king_location = (7, 4)
@@ -29,12 +133,103 @@ class GameState:
         self.checkmate = False
         self.stalemate = False
         self.enpassant_possible = () # coordinates for the square
-        self.current_castling_right = CastleRights(True, True, True, True)
-        self.castle_rights_log = [CastleRights(self.current_castling_right.wks, self.current_castling_right.bks,
-                                               self.current_castling_right.wqs, self.current_castling_right.bqs)]
-
+        self.castling_rights = WKS | WQS | BKS | BQS
+        # 'mailbox' generates moves from self.board, 'bitboard' keeps 64-bit boards per piece alongside it
+        if backend == 'bitboard':
+            self.bitboards = bitboard.Bitboards(self.board)
+        elif backend == 'mailbox':
+            self.bitboards = None
+        else:
+            raise ValueError('unknown backend: ' + str(backend))
+        self.halfmove_clock = 0 # plies since the last capture or pawn move, for the 50-move rule
+        self.fullmove_number = 1
+        self.zobrist_key = zobrist.compute_key(self)
+        # one (castling_rights, enpassant_possible, halfmove_clock, zobrist_key) tuple per move in move_log,
+        # holding the state make_move can't work backwards from
+        self.state_log = []
+
+    """
+    Sets up the position from a FEN string, the move clocks are optional (EPD lines work too).
+    Raises ValueError for a FEN check_fen rejects, leaving the position as it was. An en passant square with no
+    pawn behind it to take is dropped.
+    """
+    def load_fen(self, fen):
+        check_fen(fen)
+        fields = fen.split()
+        self.board = []
+        for row in fields[0].split('/'):
+            rank = []
+            for char in row:
+                if char.isdigit():
+                    rank.extend(['--'] * int(char))
+                else:
+                    color = 'w' if char.isupper() else 'b'
+                    piece = 'p' if char in 'pP' else char.upper()
+                    rank.append(color + piece)
+                    if piece == 'K':
+                        if color == 'w':
+                            self.white_king_location = (len(self.board), len(rank) - 1)
+                        else:
+                            self.black_king_location = (len(self.board), len(rank) - 1)
+            self.board.append(rank)
+        self.white_to_move = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        self.castling_rights = (WKS if 'K' in castling else 0) | (WQS if 'Q' in castling else 0) | \
+                               (BKS if 'k' in castling else 0) | (BQS if 'q' in castling else 0)
+        self.enpassant_possible = ()
+        if len(fields) > 3 and fields[3] != '-':
+            r, c = Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]]
+            # only kept behind a pawn of the side that just moved, which is the one en passant can take
+            pawn_row, pawn = (r + 1, 'bp') if self.white_to_move else (r - 1, 'wp')
+            if fields[3][1] == ('6' if self.white_to_move else '3') and self.board[r][c] == '--' and \
+                    self.board[pawn_row][c] == pawn:
+                self.enpassant_possible = (r, c)
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        if self.bitboards is not None:
+            self.bitboards = bitboard.Bitboards(self.board)
+        self.zobrist_key = zobrist.compute_key(self)
+        self.state_log = []
+
+    """Castling rights as a CastleRights object, for callers that want the flags by name"""
+    @property
+    def current_castling_right(self):
+        rights = self.castling_rights
+        return CastleRights(rights & WKS != 0, rights & BKS != 0, rights & WQS != 0, rights & BQS != 0)
+
+    """FEN of the current position"""
+    def get_fen(self):
+        rows = []
+        for row in self.board:
+            fen_row = ''
+            empty = 0
+            for piece in row:
+                if piece == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    fen_row += str(empty)
+                    empty = 0
+                fen_row += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            if empty:
+                fen_row += str(empty)
+            rows.append(fen_row)
+        rights = self.castling_rights
+        castling = ('K' if rights & WKS else '') + ('Q' if rights & WQS else '') + \
+                   ('k' if rights & BKS else '') + ('q' if rights & BQS else '')
+        enpassant = '-'
+        if self.enpassant_possible != ():
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        return ' '.join(('/'.join(rows), 'w' if self.white_to_move else 'b', castling or '-', enpassant,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
 
     def make_move(self, move):
+        previous_enpassant = self.enpassant_possible
+        previous_rights = self.castling_rights
+        self.state_log.append((previous_rights, previous_enpassant, self.halfmove_clock, self.zobrist_key))
         self.board[move.start_rank][move.start_file] = '--'
         self.board[move.end_rank][move.end_file] = move.piece_moved
         self.move_log.append(move)
@@ -67,8 +262,41 @@ class GameState:
                 self.board[move.end_rank][move.end_file-2] = '--' # remove the old rook
         # update castling rights - if it's a king or rook move
         self.update_castling_rights(move)
-        self.castle_rights_log.append(CastleRights(self.current_castling_right.wks, self.current_castling_right.bks,
-                                                   self.current_castling_right.wqs, self.current_castling_right.bqs))
+        if self.bitboards is not None:
+            self.bitboards.make_move(move)
+        self.update_zobrist_key(move, previous_rights, previous_enpassant)
+        # move clocks
+        if move.piece_moved[1] == 'p' or move.piece_captured != '--':
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if move.piece_moved[0] == 'b':
+            self.fullmove_number += 1
+
+    """Updates zobrist_key for a move make_move has just played"""
+    def update_zobrist_key(self, move, previous_rights, previous_enpassant):
+        piece_keys = zobrist.PIECE_KEYS
+        key = self.zobrist_key ^ zobrist.BLACK_TO_MOVE_KEY
+        key ^= piece_keys[move.piece_moved][move.start_rank * 8 + move.start_file]
+        key ^= piece_keys[self.board[move.end_rank][move.end_file]][move.end_rank * 8 + move.end_file]
+        if move.is_enpassant_move:
+            key ^= piece_keys[move.piece_captured][move.start_rank * 8 + move.end_file]
+        elif move.piece_captured != '--':
+            key ^= piece_keys[move.piece_captured][move.end_rank * 8 + move.end_file]
+        if move.is_castle_move:
+            rook = piece_keys[move.piece_moved[0] + 'R']
+            row = move.end_rank * 8
+            if move.end_file - move.start_file == 2: # kingside castle move
+                key ^= rook[row + move.end_file + 1] ^ rook[row + move.end_file - 1]
+            else: # queenside castle move
+                key ^= rook[row + move.end_file - 2] ^ rook[row + move.end_file + 1]
+        if previous_rights != self.castling_rights:
+            key ^= zobrist.CASTLING_KEYS[previous_rights] ^ zobrist.CASTLING_KEYS[self.castling_rights]
+        if previous_enpassant != ():
+            key ^= zobrist.ENPASSANT_KEYS[previous_enpassant[1]]
+        if self.enpassant_possible != ():
+            key ^= zobrist.ENPASSANT_KEYS[self.enpassant_possible[1]]
+        self.zobrist_key = key
 
 
     def undo_move(self):
@@ -86,20 +314,9 @@ class GameState:
             if move.is_enpassant_move:
                 self.board[move.end_rank][move.end_file] = '--' # leave landing square blank
                 self.board[move.start_rank][move.end_file] = move.piece_captured
-                self.enpassant_possible = (move.end_rank, move.end_file)
-
-            if move.piece_moved[1] == 'p' and abs(move.start_rank - move.end_rank) == 2:
-                self.enpassant_possible = ()
-
-            # undo castling rights
-            self.castle_rights_log.pop() # remove castling rights from undone move
-            new_rights = self.castle_rights_log[-1]
-            self.current_castling_right = CastleRights(new_rights.wks, new_rights.bks, new_rights.wqs, new_rights.bqs)
-            # self.current_castling_right.wks = self.castle_rights_log[-1].wks
-            # self.current_castling_right.wqs = self.castle_rights_log[-1].wqs
-            # self.current_castling_right.bks = self.castle_rights_log[-1].bks
-            # self.current_castling_right.bqs = self.castle_rights_log[-1].bqs
 
+            # castling rights, en-passant square, clock and key come back from the state log
+            self.castling_rights, self.enpassant_possible, self.halfmove_clock, self.zobrist_key = self.state_log.pop()
 
             # undo castle move - put rook back
             if move.is_castle_move:
@@ -110,33 +327,76 @@ class GameState:
                     self.board[move.end_rank][move.end_file-2] = self.board[move.end_rank][move.end_file+1]
                     self.board[move.end_rank][move.end_file+1] = '--'
 
+            if self.bitboards is not None:
+                self.bitboards.undo_move(move)
+            if move.piece_moved[0] == 'b':
+                self.fullmove_number -= 1
+            # the position had a legal move - the one just taken back
+            self.checkmate = False
+            self.stalemate = False
+
     def update_castling_rights(self, move):
         if move.piece_moved == 'wK':
-            self.current_castling_right.wks = False
-            self.current_castling_right.wqs = False
+            self.castling_rights &= ~(WKS | WQS)
         elif move.piece_moved == 'bK':
-            self.current_castling_right.bks = False
-            self.current_castling_right.bqs = False
+            self.castling_rights &= ~(BKS | BQS)
         elif move.piece_moved == 'wR':
             if move.start_rank == 7:
                 if move.start_file == 0:
-                    self.current_castling_right.wqs = False
+                    self.castling_rights &= ~WQS
                 elif move.start_file == 7:
-                    self.current_castling_right.wks = False
+                    self.castling_rights &= ~WKS
         elif move.piece_moved == 'bR':
             if move.start_rank == 0:
                 if move.start_file == 0:
-                    self.current_castling_right.bqs = False
+                    self.castling_rights &= ~BQS
                 elif move.start_file == 7:
-                    self.current_castling_right.bks = False
+                    self.castling_rights &= ~BKS
+        # a rook captured on its starting square can't castle any more either
+        if move.piece_captured == 'wR':
+            if move.end_rank == 7:
+                if move.end_file == 0:
+                    self.castling_rights &= ~WQS
+                elif move.end_file == 7:
+                    self.castling_rights &= ~WKS
+        elif move.piece_captured == 'bR':
+            if move.end_rank == 0:
+                if move.end_file == 0:
+                    self.castling_rights &= ~BQS
+                elif move.end_file == 7:
+                    self.castling_rights &= ~BKS
 
 
     def get_valid_moves(self):
-        # for log in self.castle_rights_log:
-        #     print(log.wks, log.wqs, log.bks, log.bqs)
+        if self.bitboards is None and not self.pin_aware:
+            return self.get_filtered_moves()
+        board = self.board
+        return [Move.from_code(code, board) for code in self.get_valid_move_codes()]
+
+    """Legal moves as packed ints (see bitboard.encode_move) - Move objects are only built for moves that get played"""
+    def get_valid_move_codes(self):
+        if self.bitboards is not None:
+            return self.get_bitboard_move_codes()
+        if self.pin_aware:
+            return self.get_pin_aware_move_codes()
+        return [move.code for move in self.get_filtered_moves()]
+
+    def get_bitboard_move_codes(self):
+        if self.white_to_move:
+            kingside, queenside = self.castling_rights & WKS, self.castling_rights & WQS
+        else:
+            kingside, queenside = self.castling_rights & BKS, self.castling_rights & BQS
+        enpassant_sq = None
+        if self.enpassant_possible != ():
+            enpassant_sq = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+        moves = self.bitboards.generate_legal_moves(self.white_to_move, kingside, queenside, enpassant_sq)
+        self.set_end_flags(len(moves) == 0, len(moves) == 0 and self.in_check())
+        return moves
+
+    """Plays every pseudo-legal move and drops the ones that leave the king in check"""
+    def get_filtered_moves(self):
         temp_enpassant_possible = self.enpassant_possible # save to temp because all moves calculated will change original
-        temp_castle_rights = CastleRights(self.current_castling_right.wks, self.current_castling_right.bks,
-                                          self.current_castling_right.wqs, self.current_castling_right.bqs)
+        temp_castle_rights = self.castling_rights
         moves = self.get_all_possible_moves()
 
         for i in range(len(moves)-1, -1, -1):
@@ -146,26 +406,160 @@ class GameState:
                 moves.remove(moves[i])
             self.white_to_move = not self.white_to_move
             self.undo_move()
-        if len(moves) == 0: # either checkmate or stalemate
-            if self.in_check():
-                self.checkmate = True
-                print('CHECKMATE')
-            else:
-                self.stalemate = True
-                print('STALEMATE')
-
 
+        castle_moves = []
         if self.white_to_move:
-            self.get_castle_moves(self.white_king_location[0], self.white_king_location[1], moves)
+            self.get_castle_moves(self.white_king_location[0], self.white_king_location[1], castle_moves)
         else:
-            self.get_castle_moves(self.black_king_location[0], self.black_king_location[1], moves)
+            self.get_castle_moves(self.black_king_location[0], self.black_king_location[1], castle_moves)
+        for code in castle_moves:
+            moves.append(Move.from_code(code, self.board))
         self.enpassant_possible = temp_enpassant_possible # bring original back from temp save
-        self.current_castling_right = temp_castle_rights
+        self.castling_rights = temp_castle_rights
+        self.set_end_flags(len(moves) == 0, len(moves) == 0 and self.in_check())
         return moves
-        #
-        # else:
-        #     self.checkmate = False
-        #     self.stalemate = False
+
+    """Works out pins and checks once per position and keeps only legal moves, without make/undo"""
+    def get_pin_aware_move_codes(self):
+        if self.white_to_move:
+            king_rank, king_file = self.white_king_location
+        else:
+            king_rank, king_file = self.black_king_location
+        in_check, pins, checks = self.check_for_pins_and_checks(king_rank, king_file)
+
+        block_squares = None # squares a non-king move has to land on when in single check
+        if len(checks) == 1:
+            check_rank, check_file, d_rank, d_file = checks[0]
+            if self.board[check_rank][check_file][1] == 'N':
+                block_squares = {check_rank * 8 + check_file}
+            else:
+                block_squares = set()
+                for i in range(1, 8):
+                    square = (king_rank + d_rank * i) * 8 + king_file + d_file * i
+                    block_squares.add(square)
+                    if square == check_rank * 8 + check_file:
+                        break
+
+        moves = []
+        for r in range(len(self.board)):
+            for f in range(len(self.board[r])):
+                turn_color = self.board[r][f][0]
+                if (turn_color == 'w' and self.white_to_move) or (turn_color == 'b' and not self.white_to_move):
+                    piece = self.board[r][f][1]
+                    piece_moves = []
+                    self.move_functions[piece](r, f, piece_moves)
+                    if piece == 'K':
+                        for code in piece_moves:
+                            end_rank, end_file = divmod(code >> 6 & 63, 8)
+                            if not self.king_square_attacked(end_rank, end_file):
+                                moves.append(code)
+                        continue
+                    if len(checks) > 1:
+                        continue # double check - only the king can move
+                    pin = pins.get((r, f))
+                    for code in piece_moves:
+                        end_sq = code >> 6 & 63
+                        if code & ENPASSANT_FLAG:
+                            if self.enpassant_leaves_king_safe(r, f, end_sq % 8, king_rank, king_file):
+                                moves.append(code)
+                            continue
+                        if pin is not None and \
+                                (end_sq // 8 - king_rank) * pin[1] != (end_sq % 8 - king_file) * pin[0]:
+                            continue # pinned piece leaving the pin line
+                        if block_squares is not None and end_sq not in block_squares:
+                            continue
+                        moves.append(code)
+
+        if not in_check:
+            if self.white_to_move:
+                kingside, queenside = self.castling_rights & WKS, self.castling_rights & WQS
+            else:
+                kingside, queenside = self.castling_rights & BKS, self.castling_rights & BQS
+            r, f = king_rank, king_file
+            if kingside and self.board[r][f+1] == '--' and self.board[r][f+2] == '--':
+                if not self.king_square_attacked(r, f+1) and not self.king_square_attacked(r, f+2):
+                    moves.append(encode_move(r * 8 + f, r * 8 + f+2, CASTLE_FLAG))
+            if queenside and self.board[r][f-1] == '--' and self.board[r][f-2] == '--' and self.board[r][f-3] == '--':
+                if not self.king_square_attacked(r, f-1) and not self.king_square_attacked(r, f-2):
+                    moves.append(encode_move(r * 8 + f, r * 8 + f-2, CASTLE_FLAG))
+        self.set_end_flags(len(moves) == 0, in_check)
+        return moves
+
+    """
+    Sets checkmate and stalemate for the position whose legal moves were just generated - both are assigned
+    every time, so they never describe a different position than the one on the board
+    """
+    def set_end_flags(self, no_moves, in_check):
+        self.checkmate = no_moves and in_check
+        self.stalemate = no_moves and not in_check
+        if no_moves:
+            logger.debug('checkmate' if in_check else 'stalemate')
+
+    """
+    Scans outwards from (r, f) for enemy pieces giving check and for own pieces pinned to the king.
+    Returns in_check, pins as {(rank, file): direction} and checks as [(rank, file, d_rank, d_file)].
+    The side to move's own king is treated as empty so the scan also works for squares the king is moving to.
+    """
+    def check_for_pins_and_checks(self, r, f):
+        pins = {}
+        checks = []
+        if self.white_to_move:
+            ally_color, enemy_color = 'w', 'b'
+        else:
+            ally_color, enemy_color = 'b', 'w'
+        board = self.board
+        rays = RAYS[r * 8 + f]
+        for j in range(8):
+            d = DIRECTIONS[j]
+            possible_pin = ()
+            for i, (end_rank, end_file, _) in enumerate(rays[j], 1):
+                end_piece = board[end_rank][end_file]
+                if end_piece[0] == ally_color and end_piece[1] != 'K':
+                    if possible_pin == ():
+                        possible_pin = (end_rank, end_file)
+                    else:
+                        break # second ally piece -> no pin or check in this direction
+                elif end_piece[0] == enemy_color:
+                    piece_type = end_piece[1]
+                    # rook orthogonally, bishop diagonally, queen anywhere, king one step,
+                    # pawn one step diagonally towards the side it captures
+                    if (0 <= j <= 3 and piece_type == 'R') or (4 <= j <= 7 and piece_type == 'B') or \
+                            piece_type == 'Q' or (i == 1 and piece_type == 'K') or \
+                            (i == 1 and piece_type == 'p' and
+                             ((enemy_color == 'w' and 6 <= j <= 7) or (enemy_color == 'b' and 4 <= j <= 5))):
+                        if possible_pin == ():
+                            checks.append((end_rank, end_file, d[0], d[1]))
+                        else:
+                            pins[possible_pin] = d
+                    break
+        enemy_knight = enemy_color + 'N'
+        for end_rank, end_file, _ in KNIGHT_TARGETS[r * 8 + f]:
+            if board[end_rank][end_file] == enemy_knight:
+                checks.append((end_rank, end_file, end_rank - r, end_file - f))
+        return len(checks) > 0, pins, checks
+
+    """Whether the side to move's king would be attacked standing on (r, f)"""
+    def king_square_attacked(self, r, f):
+        king_rank, king_file = self.white_king_location if self.white_to_move else self.black_king_location
+        king = self.board[king_rank][king_file]
+        self.board[king_rank][king_file] = '--' # the king must not shield the square it is stepping to
+        attacked = self.square_under_attack(r, f)
+        self.board[king_rank][king_file] = king
+        return attacked
+
+    """En-passant removes two pawns from a rank at once, so it is checked by trying it on the board"""
+    def enpassant_leaves_king_safe(self, r, f, end_file, king_rank, king_file):
+        pawn = self.board[r][f]
+        captured = self.board[r][end_file]
+        end_rank = r - 1 if pawn[0] == 'w' else r + 1
+        self.board[r][f] = '--'
+        self.board[r][end_file] = '--'
+        self.board[end_rank][end_file] = pawn
+        attacked = self.king_square_attacked(king_rank, king_file)
+        self.board[end_rank][end_file] = '--'
+        self.board[r][end_file] = captured
+        self.board[r][f] = pawn
+        return not attacked
 
     def in_check(self):
         if self.white_to_move:
@@ -173,16 +567,75 @@ class GameState:
         else:
             return self.square_under_attack(self.black_king_location[0], self.black_king_location[1])
 
+    """Fifty moves by each side without a capture or pawn move"""
+    def is_fifty_move_draw(self):
+        return self.halfmove_clock >= 100
+
+    """
+    Whether the current position has now occurred three times, counted from the keys in state_log.
+    Only positions since the last capture or pawn move with the same side to move can be repeats.
+    """
+    def is_threefold_repetition(self):
+        key = self.zobrist_key
+        count = 1
+        state_log = self.state_log
+        for i in range(len(state_log) - 2, max(len(state_log) - 1 - self.halfmove_clock, -1), -2):
+            if state_log[i][3] == key:
+                count += 1
+                if count == 3:
+                    return True
+        return False
+
+    """Neither side can mate: bare kings, a single knight or bishop, or only bishops all on one square colour"""
+    def is_insufficient_material(self):
+        minors = []
+        for r in range(8):
+            for f in range(8):
+                piece = self.board[r][f]
+                if piece == '--' or piece[1] == 'K':
+                    continue
+                if piece[1] in 'pRQ':
+                    return False
+                minors.append((piece[1], (r + f) % 2))
+        if len(minors) <= 1:
+            return True
+        return all(piece == 'B' and color == minors[0][1] for piece, color in minors)
+
+    """
+    Whether the opponent of the side to move attacks (r, f).
+    Looked up backwards from the square - the attack tables with bitboards, otherwise one scan per direction
+    that stops at the first piece - instead of generating every opponent move.
+    """
     def square_under_attack(self, r, f):
-        self.white_to_move = not self.white_to_move # switch to opponent's point of view
-        opponent_moves = self.get_all_possible_moves()
-        self.white_to_move = not self.white_to_move # switch turns / point of view back
-        for move in opponent_moves:
-            if move.end_rank == r and move.end_file == f:
+        enemy_color = 'b' if self.white_to_move else 'w'
+        if self.bitboards is not None:
+            return self.bitboards.attackers(r * 8 + f, enemy_color, self.bitboards.occupied) != 0
+        board = self.board
+        rays = RAYS[r * 8 + f]
+        for j in range(8):
+            for i, (end_rank, end_file, _) in enumerate(rays[j], 1):
+                end_piece = board[end_rank][end_file]
+                if end_piece == '--':
+                    continue
+                if end_piece[0] == enemy_color:
+                    piece_type = end_piece[1]
+                    if piece_type == 'Q' or (j < 4 and piece_type == 'R') or (j >= 4 and piece_type == 'B'):
+                        return True
+                    if i == 1 and (piece_type == 'K' or (piece_type == 'p' and (
+                            (enemy_color == 'w' and j >= 6) or (enemy_color == 'b' and 4 <= j <= 5)))):
+                        return True
+                break # first piece in this direction blocks the rest
+        enemy_knight = enemy_color + 'N'
+        for end_rank, end_file, _ in KNIGHT_TARGETS[r * 8 + f]:
+            if board[end_rank][end_file] == enemy_knight:
                 return True
         return False
 
     def get_all_possible_moves(self):
+        board = self.board
+        return [Move.from_code(code, board) for code in self.get_all_possible_move_codes()]
+
+    def get_all_possible_move_codes(self):
         moves = []
         for r in range(len(self.board)):
             for f in range(len(self.board[r])):
@@ -193,127 +646,80 @@ class GameState:
         return moves
 
     def get_pawn_moves(self, r, f, moves):
+        board = self.board
         if self.white_to_move:
-            if self.board[r-1][f] == '--':
-                moves.append(Move((r, f), (r-1, f), self.board))
-                if r == 6 and self.board[r-2][f] == '--':
-                    moves.append(Move((r, f), (r-2, f), self.board))
-
-            if f-1 >= 0:
-                if self.board[r-1][f-1][0] == 'b':
-                    moves.append(Move((r, f), (r-1, f-1), self.board))
-                elif (r-1, f-1) == self.enpassant_possible:
-                    moves.append(Move((r, f), (r-1, f-1), self.board, is_enpassant_move=True))
-
-            if f+1 < len(self.board[0]):
-                if self.board[r-1][f+1][0] == 'b':
-                    moves.append(Move((r, f), (r-1, f+1), self.board))
-                elif (r-1, f+1) == self.enpassant_possible:
-                    moves.append(Move((r, f), (r-1, f+1), self.board, is_enpassant_move=True))
-
-        else: # black moves
-            if self.board[r + 1][f] == '--':
-                moves.append(Move((r, f), (r + 1, f), self.board))
-                if r == 1 and self.board[r + 2][f] == '--':
-                    moves.append(Move((r, f), (r + 2, f), self.board))
-
-            if f-1 >= 0:
-                if self.board[r+1][f-1][0] == 'w':
-                    moves.append(Move((r, f), (r+1, f-1), self.board))
-                elif (r+1, f-1) == self.enpassant_possible:
-                    moves.append(Move((r, f), (r+1, f-1), self.board, is_enpassant_move=True))
-
-            if f+1 < len(self.board[0]):
-                if self.board[r+1][f+1][0] == 'w':
-                    moves.append(Move((r, f), (r+1, f+1), self.board))
-                elif (r+1, f+1) == self.enpassant_possible:
-                    moves.append(Move((r, f), (r+1, f+1), self.board, is_enpassant_move=True))
+            color, enemy_color = 'w', 'b'
+        else:
+            color, enemy_color = 'b', 'w'
+        sq = r * 8 + f
+        for end_rank, end_file, code in PAWN_PUSHES[color][sq]:
+            if board[end_rank][end_file] != '--':
+                break # a blocked single push blocks the double push too
+            moves.append(code)
+        for end_rank, end_file, code in PAWN_CAPTURES[color][sq]:
+            if board[end_rank][end_file][0] == enemy_color:
+                moves.append(code)
+            elif (end_rank, end_file) == self.enpassant_possible:
+                moves.append(code | ENPASSANT_FLAG)
 
     def get_rook_moves(self, r, f, moves):
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = 'b' if self.white_to_move else 'w'
-        for d in directions:
-            for i in range(1, 8): # max 7 squares moved
-                end_rank = r + d[0] * i
-                end_file = f + d[1] * i
-                if 0 <= end_rank < 8 and 0 <= end_file < 8: # on board
-                    end_piece = self.board[end_rank][end_file]
-                    if end_piece == '--': # empty square
-                        moves.append(Move((r, f), (end_rank, end_file), self.board))
-                    elif end_piece[0] == enemy_color: # enemy piece on square
-                        moves.append(Move((r, f), (end_rank, end_file), self.board))
-                        break
-                    else:
-                        break # friendly piece on square -> invalid
-                else: # off board
-                    break
+        self.get_slider_moves(ROOK_RAYS[r * 8 + f], moves)
 
     def get_knight_moves(self, r, f, moves):
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        enemy_color = 'b' if self.white_to_move else 'w'
-        for m in knight_moves:
-            end_rank = r + m[0]
-            end_file = f + m[1]
-            if 0 <= end_rank < 8 and 0 <= end_file < 8:
-                end_piece = self.board[end_rank][end_file]
-                if end_piece[0] == enemy_color or end_piece[0] == '-': # not a friendly piece on the square
-                    moves.append(Move((r, f), (end_rank, end_file), self.board))
+        board = self.board
+        ally_color = 'w' if self.white_to_move else 'b'
+        for end_rank, end_file, code in KNIGHT_TARGETS[r * 8 + f]:
+            if board[end_rank][end_file][0] != ally_color: # not a friendly piece on the square
+                moves.append(code)
 
     def get_bishop_moves(self, r, f, moves):
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_color = 'b' if self.white_to_move else 'w'
-        for d in directions:
-            for i in range(1, 8):  # max 7 squares moved
-                end_rank = r + d[0] * i
-                end_file = f + d[1] * i
-                if 0 <= end_rank < 8 and 0 <= end_file < 8:  # on board
-                    end_piece = self.board[end_rank][end_file]
-                    if end_piece == '--':  # empty square
-                        moves.append(Move((r, f), (end_rank, end_file), self.board))
-                    elif end_piece[0] == enemy_color:  # enemy piece on square
-                        moves.append(Move((r, f), (end_rank, end_file), self.board))
-                        break
-                    else:
-                        break  # friendly piece on square -> invalid
-                else:  # off board
-                    break
+        self.get_slider_moves(BISHOP_RAYS[r * 8 + f], moves)
 
     def get_queen_moves(self, r, f, moves):
-        self.get_rook_moves(r, f, moves)
-        self.get_bishop_moves(r, f, moves)
+        self.get_slider_moves(RAYS[r * 8 + f], moves)
 
-    def get_king_moves(self, r, f, moves):
-        king_moves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 0), (1, -1), (1, 0), (1, 1))
+    """Steps along each ray until the first piece, which is captured if it's an enemy"""
+    def get_slider_moves(self, rays, moves):
+        board = self.board
         enemy_color = 'b' if self.white_to_move else 'w'
-        for i in range(8):
-            end_rank = r + king_moves[i][0]
-            end_file = f + king_moves[i][1]
-            if 0 <= end_rank < 8 and 0 <= end_file < 8:
-                end_piece = self.board[end_rank][end_file]
-                if end_piece[0] == enemy_color or end_piece[0] == '-':  # not a friendly piece on the square
-                    moves.append(Move((r, f), (end_rank, end_file), self.board))
+        for ray in rays:
+            for end_rank, end_file, code in ray:
+                end_piece = board[end_rank][end_file]
+                if end_piece == '--': # empty square
+                    moves.append(code)
+                else:
+                    if end_piece[0] == enemy_color: # enemy piece on square
+                        moves.append(code)
+                    break
+
+    def get_king_moves(self, r, f, moves):
+        board = self.board
+        ally_color = 'w' if self.white_to_move else 'b'
+        for end_rank, end_file, code in KING_TARGETS[r * 8 + f]:
+            if board[end_rank][end_file][0] != ally_color: # not a friendly piece on the square
+                moves.append(code)
         # self.get_castle_moves(r, f, moves)
 
 
     def get_castle_moves(self, r, f, moves):
         if self.square_under_attack(r, f):
             return # can't castle when in check
-        if (self.white_to_move and self.current_castling_right.wks) or (not self.white_to_move and self.current_castling_right.bks):
+        if (self.white_to_move and self.castling_rights & WKS) or (not self.white_to_move and self.castling_rights & BKS):
             self.get_kingside_castle_moves(r, f, moves)
-        if (self.white_to_move and self.current_castling_right.wqs) or (not self.white_to_move and self.current_castling_right.bqs):
+        if (self.white_to_move and self.castling_rights & WQS) or (not self.white_to_move and self.castling_rights & BQS):
             self.get_queenside_castle_moves(r, f, moves)
 
 
     def get_kingside_castle_moves(self, r, f, moves):
         if self.board[r][f+1] == '--' and self.board[r][f+2] == '--':
             if not self.square_under_attack(r, f+1) and not self.square_under_attack(r, f+2):
-                moves.append(Move((r, f), (r, f+2), self.board, is_castle_move=True))
+                moves.append(encode_move(r * 8 + f, r * 8 + f+2, CASTLE_FLAG))
 
 
     def get_queenside_castle_moves(self, r, f, moves):
         if self.board[r][f-1] == '--' and self.board[r][f-2] == '--' and self.board[r][f-3] == '--':
             if not self.square_under_attack(r, f-1) and not self.square_under_attack(r, f-2):
-                moves.append(Move((r, f), (r, f-2), self.board, is_castle_move=True))
+                moves.append(encode_move(r * 8 + f, r * 8 + f-2, CASTLE_FLAG))
 
 class CastleRights:
     def __init__(self, wks, bks, wqs, bqs):
@@ -324,6 +730,9 @@ class CastleRights:
 
 
 class Move:
+    __slots__ = ('start_rank', 'start_file', 'end_rank', 'end_file', 'piece_moved', 'piece_captured',
+                 'is_pawn_promotion', 'is_enpassant_move', 'is_castle_move', 'move_id')
+
     ranks_to_rows = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
     files_to_cols = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
@@ -343,7 +752,19 @@ class Move:
             self.piece_captured = 'wp' if self.piece_moved == 'bp' else 'bp'
         self.is_castle_move = is_castle_move
 
-        self.move_id = self.start_rank * 1000 + self.start_file * 100 + self.end_rank * 10 + self.end_file
+        # start and end square packed like encode_move, without the flag so a clicked move equals the generated one
+        self.move_id = (self.start_rank * 8 + self.start_file) | (self.end_rank * 8 + self.end_file) << 6
+
+    """Builds the full Move for a packed move code on the current board"""
+    @classmethod
+    def from_code(cls, code, board):
+        return cls(divmod(code & 63, 8), divmod(code >> 6 & 63, 8), board,
+                   is_enpassant_move=code & ENPASSANT_FLAG != 0, is_castle_move=code & CASTLE_FLAG != 0)
+
+    @property
+    def code(self):
+        flag = ENPASSANT_FLAG if self.is_enpassant_move else CASTLE_FLAG if self.is_castle_move else 0
+        return self.move_id | flag
 
     """Overriding equals method"""
     def __eq__(self, other):
@@ -351,6 +772,9 @@ class Move:
             return self.move_id == other.move_id
         return False
 
+    def __hash__(self):
+        return self.move_id
+
 
     def write_chess_notation(self):
         return self.get_rank_file(self.start_rank, self.start_file) + self.get_rank_file(self.end_rank, self.end_file)
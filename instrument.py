@@ -0,0 +1,243 @@
+"""
+Instrumentation
+Opt-in counters and timing histograms for move generation, attack checks, make/undo, Move allocations and search.
+enable() wraps the measured methods on their classes and disable() puts the originals back, so while it is off
+nothing is wrapped and nothing costs anything. Search is measured once per Searcher.search call from the
+searcher's own node and cutoff counts and the transposition table's hit counts, never per node.
+The per-piece generators are called through each GameState's move_functions, which are bound when the state is
+created: states created while enabled are wrapped, and states created earlier can be passed to enable().
+Results export as JSON or in the Prometheus text format, or go to the log.
+Run with: python -m chess.instrument [--depth N] [--fen FEN] [--format json|prometheus]
+"""
+
+import argparse
+import bisect
+import functools
+import json
+import logging
+import sys
+import time
+import weakref
+
+from chess import engine
+from chess import search
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 1e-2, 0.1, 1.0, 10.0)
+
+HELP = {
+    'chess_valid_moves_seconds': 'Time to generate the legal moves of a position',
+    'chess_piece_moves_seconds': 'Time in a move_functions generator for one piece',
+    'chess_square_under_attack_seconds': 'Time per square_under_attack call',
+    'chess_make_move_total': 'Moves made',
+    'chess_undo_move_total': 'Moves undone',
+    'chess_move_allocations_total': 'Move objects created',
+    'chess_search_seconds': 'Time per Searcher.search call',
+    'chess_search_nodes_total': 'Nodes visited by searches',
+    'chess_search_cutoffs_total': 'Beta cutoffs in searches',
+    'chess_tt_hits_total': 'Transposition table probes that found the position',
+    'chess_tt_misses_total': 'Transposition table probes that did not',
+}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1) # the last bucket is everything above BUCKETS[-1]
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = {} # (name, labels) -> value, labels being a tuple of (label, value) pairs
+        self.histograms = {} # (name, labels) -> Histogram
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        return self.histograms[key]
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.__init__()
+        for key in self.counters:
+            self.counters[key] = 0
+
+    def to_dict(self):
+        counters = [{'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self.counters.items())]
+        histograms = [{'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,
+                       'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], histogram.counts))}
+                      for (name, labels), histogram in sorted(self.histograms.items())]
+        return {'counters': counters, 'histograms': histograms}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    """Prometheus text exposition format; histogram buckets are cumulative as the format requires"""
+    def to_prometheus(self):
+        lines = []
+        described = set()
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append('# HELP %s %s' % (name, HELP.get(name, name)))
+                lines.append('# TYPE %s %s' % (name, kind))
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{%s}' % ','.join('%s="%s"' % pair for pair in pairs) if pairs else ''
+        for (name, labels), value in sorted(self.counters.items()):
+            describe(name, 'counter')
+            lines.append('%s%s %d' % (name, label_text(labels), value))
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            describe(name, 'histogram')
+            total = 0
+            for bound, count in zip([repr(bound) for bound in BUCKETS] + ['+Inf'], histogram.counts):
+                total += count
+                lines.append('%s_bucket%s %d' % (name, label_text(labels, [('le', bound)]), total))
+            lines.append('%s_sum%s %r' % (name, label_text(labels), histogram.sum))
+            lines.append('%s_count%s %d' % (name, label_text(labels), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    """One log line per counter and histogram (count, mean and total time)"""
+    def log(self, level=logging.INFO):
+        for (name, labels), value in sorted(self.counters.items()):
+            logger.log(level, '%s%s %d', name, dict(labels) or '', value)
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            mean = histogram.sum / histogram.count if histogram.count else 0
+            logger.log(level, '%s%s count=%d mean=%.2fus total=%.3fs', name, dict(labels) or '', histogram.count,
+                       mean * 1e6, histogram.sum)
+
+
+metrics = Metrics() # what enable() records into unless it's given another Metrics
+
+_originals = {} # (class, attribute) -> the attribute enable() replaced
+_states = weakref.WeakSet() # GameStates whose move_functions are wrapped
+
+
+def _timed(function, histogram):
+    observe = histogram.observe
+    perf_counter = time.perf_counter
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            observe(perf_counter() - start)
+    return timed
+
+
+def _counted(function, counters, key):
+    @functools.wraps(function)
+    def counted(*args, **kwargs):
+        counters[key] = counters.get(key, 0) + 1
+        return function(*args, **kwargs)
+    return counted
+
+
+def _patch(cls, name, replacement):
+    _originals[(cls, name)] = cls.__dict__[name]
+    setattr(cls, name, replacement)
+
+
+def _wrap_move_functions(gs, into):
+    if gs in _states:
+        return
+    for piece, function in gs.move_functions.items():
+        gs.move_functions[piece] = _timed(function, into.histogram('chess_piece_moves_seconds', piece=piece))
+    _states.add(gs)
+
+
+def enabled():
+    return bool(_originals)
+
+
+"""Starts recording into into (the module's metrics by default); states are existing GameStates to include"""
+def enable(*states, into=None):
+    if enabled():
+        disable()
+    into = into if into is not None else metrics
+    GameState, Move, Searcher = engine.GameState, engine.Move, search.Searcher
+    for name in ('get_valid_moves', 'get_valid_move_codes'):
+        _patch(GameState, name, _timed(GameState.__dict__[name], into.histogram('chess_valid_moves_seconds',
+                                                                                method=name)))
+    _patch(GameState, 'square_under_attack', _timed(GameState.__dict__['square_under_attack'],
+                                                    into.histogram('chess_square_under_attack_seconds')))
+    counters = into.counters
+    for name, counter in (('make_move', 'chess_make_move_total'), ('undo_move', 'chess_undo_move_total')):
+        _patch(GameState, name, _counted(GameState.__dict__[name], counters, (counter, ())))
+    _patch(Move, '__init__', _counted(Move.__init__, counters, ('chess_move_allocations_total', ())))
+
+    initialise = GameState.__init__
+    @functools.wraps(initialise)
+    def init(self, *args, **kwargs):
+        initialise(self, *args, **kwargs)
+        _wrap_move_functions(self, into)
+    _patch(GameState, '__init__', init)
+    for gs in states:
+        _wrap_move_functions(gs, into)
+
+    search_call = Searcher.search
+    search_time = into.histogram('chess_search_seconds')
+    @functools.wraps(search_call)
+    def measured_search(self, *args, **kwargs):
+        hits, misses = self.table.hits, self.table.misses
+        start = time.perf_counter()
+        try:
+            return search_call(self, *args, **kwargs)
+        finally:
+            search_time.observe(time.perf_counter() - start)
+            into.increment('chess_search_nodes_total', self.nodes)
+            into.increment('chess_search_cutoffs_total', self.cutoffs)
+            into.increment('chess_tt_hits_total', self.table.hits - hits)
+            into.increment('chess_tt_misses_total', self.table.misses - misses)
+    _patch(Searcher, 'search', measured_search)
+    logger.info('instrumentation enabled')
+
+
+"""Puts every original method back, including the move_functions of the GameStates that were wrapped"""
+def disable():
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+    for gs in list(_states):
+        for piece, function in gs.move_functions.items():
+            gs.move_functions[piece] = getattr(function, '__wrapped__', function)
+    _states.clear()
+    logger.info('instrumentation disabled')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a search with instrumentation and print the metrics')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fen', help='position to search (default the start position)')
+    parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='mailbox')
+    parser.add_argument('--format', choices=('json', 'prometheus'), default='prometheus')
+    args = parser.parse_args(argv)
+
+    enable()
+    try:
+        gs = engine.GameState(backend=args.backend)
+        if args.fen:
+            gs.load_fen(args.fen)
+        search.Searcher().search(gs, args.depth)
+    finally:
+        disable()
+    sys.stdout.write(metrics.to_json() + '\n' if args.format == 'json' else metrics.to_prometheus())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,14 +2,22 @@
 Main
 """
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pygame as p
+from chess import cache
 from chess import engine
+from chess import search
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
-MAX_FPS = 15
 IMAGES = {}
+HUMAN_WHITE = True # set either to False to let the engine play that side
+HUMAN_BLACK = True
+ENGINE_TIME = 2.0 # seconds the engine may think per move
+MOVES_READY = p.USEREVENT + 1 # posted by the background worker with the legal moves (and engine move) it computed
 
 """Initialize global dict of images"""
 def load_images():
@@ -17,26 +25,83 @@ def load_images():
     for piece in pieces:
         IMAGES[piece] = p.transform.scale(p.image.load('images/' + piece + '.png'), (SQ_SIZE, SQ_SIZE))
 
+"""
+Computes legal moves, and engine replies when it's the engine's turn, off the UI thread.
+The worker thread has its own GameState, loaded from a FEN, so the UI's GameState is never shared.
+"""
+class BackgroundWorker:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.gs = engine.GameState()
+        self.searcher = search.Searcher(should_stop=self.superseded)
+        self.cache = cache.MoveCache() # undo and redo come back to positions already worked out
+        self.request_id = 0
+        self.working_on = 0 # request_id of the work in progress
+        self.lock = threading.Lock()
+
+    """Starts work on gs's position; the result is posted as a MOVES_READY event carrying request_id"""
+    def request(self, gs, think):
+        with self.lock:
+            self.request_id += 1
+            request_id = self.request_id
+        self.searcher.stop() # an engine move for an older position is no longer wanted
+        self.executor.submit(self.work, request_id, gs.get_fen(), think)
+        return request_id
+
+    """
+    Whether a newer request has come in than the one being worked on. The search polls this, because a stop()
+    that lands before search() starts is cleared by it.
+    """
+    def superseded(self):
+        return self.working_on != self.request_id
+
+    def work(self, request_id, fen, think):
+        self.working_on = request_id
+        self.gs.load_fen(fen)
+        valid_moves = self.cache.get_valid_moves(self.gs)
+        best_move = None
+        if think and len(valid_moves) > 0 and request_id == self.request_id:
+            best_move = self.searcher.search(self.gs, time_limit=ENGINE_TIME)
+        p.event.post(p.event.Event(MOVES_READY, request_id=request_id, valid_moves=valid_moves, best_move=best_move))
+
+    def shutdown(self):
+        self.searcher.stop()
+        self.executor.shutdown(wait=False)
+
 """Main"""
 def main():
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
-    clock = p.time.Clock()
-    screen.fill(p.Color('white'))
+    load_images()
+    board_surface = render_board()
     gs = engine.GameState()
-    valid_moves = gs.get_valid_moves()
-    move_made = False
+    worker = BackgroundWorker()
+
+    draw_gamestate(screen, board_surface, gs.board)
+    p.display.flip()
+    shown_board = [row[:] for row in gs.board] # what is on screen, to find the squares a move changed
+    request_id = worker.request(gs, think=not human_turn(gs))
+    valid_moves = None # None until the worker has answered for the current position
 
-    # print(gs.board)
-    load_images()
     running = True
     square_selected = ()
     player_clicks = [] # 2 tuples w/ (x,y) coordinates
 
     while running:
-        for e in p.event.get():
+        move_made = False
+        for e in [p.event.wait()] + p.event.get(): # sleeps until something happens instead of redrawing every frame
             if e.type == p.QUIT:
                 running = False
+            elif e.type in (p.WINDOWEXPOSED, p.VIDEOEXPOSE): # the window manager lost what was on screen
+                draw_gamestate(screen, board_surface, shown_board)
+                p.display.flip()
+            elif e.type == MOVES_READY:
+                if e.request_id == request_id:
+                    valid_moves = e.valid_moves
+                    if e.best_move is not None and not human_turn(gs):
+                        gs.make_move(e.best_move)
+                        move_made = True
+                        valid_moves = None
             elif e.type == p.MOUSEBUTTONDOWN:
                 location = p.mouse.get_pos()
                 file = location[0]//SQ_SIZE
@@ -50,39 +115,45 @@ def main():
                 if len(player_clicks) == 2:
                     move = engine.Move(player_clicks[0], player_clicks[1], gs.board)
                     print(move.write_chess_notation())
-                    for i in range(len(valid_moves)):
-                        if move == valid_moves[i]:
-                            gs.make_move(valid_moves[i])
-                            move_made = True
-                            square_selected = ()
-                            player_clicks = []
-                    if not move_made:
+                    if valid_moves is not None and human_turn(gs):
+                        for i in range(len(valid_moves)):
+                            if move == valid_moves[i]:
+                                gs.make_move(valid_moves[i])
+                                move_made = True
+                                valid_moves = None # stale until the worker answers for the new position
+                                square_selected = ()
+                                player_clicks = []
+                                break
+                    if square_selected != ():
                         player_clicks = [square_selected]
             # Key handlers
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_u: # undo move
                     gs.undo_move()
                     move_made = True
+                    valid_moves = None
         if move_made:
-            valid_moves = gs.get_valid_moves()
-            move_made = False
-
-        draw_gamestate(screen, gs)
-        clock.tick(MAX_FPS)
-        p.display.flip()
+            request_id = worker.request(gs, think=not human_turn(gs))
+            p.display.update(draw_changed_squares(screen, board_surface, shown_board, gs.board))
+    worker.shutdown()
 
-"""Draws all tiles and pieces"""
-def draw_gamestate(screen, gs):
-    draw_board(screen)
-    draw_pieces(screen, gs.board)
+def human_turn(gs):
+    return (gs.white_to_move and HUMAN_WHITE) or (not gs.white_to_move and HUMAN_BLACK)
 
-"""Draw the squares/tiles on the board"""
-def draw_board(screen):
+"""Draws the squares/tiles once onto a surface that is reused as the background"""
+def render_board():
+    surface = p.Surface((WIDTH, HEIGHT))
     colors = [p.Color('white'), p.Color('grey')]
     for r in range(DIMENSION):
         for f in range (DIMENSION):
             color = colors[((r+f) % 2)]
-            p.draw.rect(screen, color, p.Rect(f*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+            p.draw.rect(surface, color, p.Rect(f*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    return surface
+
+"""Draws all tiles and pieces"""
+def draw_gamestate(screen, board_surface, board):
+    screen.blit(board_surface, (0, 0))
+    draw_pieces(screen, board)
 
 """Draws the pieces using the current GameState.board"""
 def draw_pieces(screen, board):
@@ -92,6 +163,21 @@ def draw_pieces(screen, board):
             if piece != '--':
                 screen.blit(IMAGES[piece], p.Rect(f*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
 
+"""Redraws only the squares that differ between shown_board and board, updates shown_board and returns the dirty rects"""
+def draw_changed_squares(screen, board_surface, shown_board, board):
+    rects = []
+    for r in range(DIMENSION):
+        for f in range(DIMENSION):
+            piece = board[r][f]
+            if piece != shown_board[r][f]:
+                rect = p.Rect(f*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+                screen.blit(board_surface, rect, rect)
+                if piece != '--':
+                    screen.blit(IMAGES[piece], rect)
+                shown_board[r][f] = piece
+                rects.append(rect)
+    return rects
+
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
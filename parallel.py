@@ -0,0 +1,147 @@
+"""
+Parallel Perft and Search over a process pool
+The tree is split near the root and each subtree goes to a worker process as a FEN string,
+so no GameState (or its move log) is ever pickled. Every worker keeps one GameState for its lifetime.
+Run with: python -m chess.parallel [perft|search] [--depth N] [--workers N] [--scaling] [--fen FEN]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from chess import engine
+from chess import perft
+from chess import search
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+_worker_state = None # the long-lived GameState of a worker process
+
+
+def _init_worker(backend):
+    global _worker_state
+    _worker_state = engine.GameState(backend=backend)
+
+
+def _perft_task(fen, depth):
+    _worker_state.load_fen(fen)
+    return perft.perft(_worker_state, depth)
+
+
+"""
+(score, depth reached, nodes) for the side to move in fen. A position without legal moves is scored as mated or
+a draw and counts as searched, so root moves that mate or stalemate are compared like any other.
+"""
+def _search_task(fen, depth, deadline):
+    _worker_state.load_fen(fen)
+    if len(_worker_state.get_valid_move_codes()) == 0:
+        return (-search.MATE_SCORE if _worker_state.in_check() else 0), depth, 0
+    searcher = search.Searcher()
+    time_limit = None
+    if deadline is not None:
+        time_limit = max(deadline - time.time(), 0.0)
+    searcher.search(_worker_state, depth, time_limit)
+    return searcher.best_score, searcher.depth_reached, searcher.nodes
+
+
+def make_pool(workers=None, backend='mailbox'):
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                               initializer=_init_worker, initargs=(backend,))
+
+
+"""FENs of all positions split_depth plies below gs, so there are enough subtrees to keep every worker busy"""
+def split_positions(gs, split_depth):
+    if split_depth == 0:
+        return [gs.get_fen()]
+    fens = []
+    for code in gs.get_valid_move_codes():
+        gs.make_move(engine.Move.from_code(code, gs.board))
+        fens.extend(split_positions(gs, split_depth - 1))
+        gs.undo_move()
+    return fens
+
+
+"""
+Perft of gs counted across a process pool.
+The tree is split two plies down (one for shallow depths) to give the pool a few hundred even-sized jobs.
+"""
+def parallel_perft(gs, depth, pool, split_depth=None):
+    if split_depth is None:
+        split_depth = 2 if depth > 3 else 1
+    split_depth = min(split_depth, depth)
+    fens = split_positions(gs, split_depth)
+    return sum(pool.map(_perft_task, fens, [depth - split_depth] * len(fens), chunksize=4))
+
+
+"""
+Root-move splitting: every root move is searched by a worker to depth - 1, the best reply score wins.
+time_limit (seconds) bounds the whole call; moves whose worker ran out of time before finishing a depth are skipped.
+Returns (best Move, score).
+"""
+def parallel_search(gs, depth, pool, time_limit=None):
+    codes = gs.get_valid_move_codes()
+    if len(codes) == 0:
+        return None, 0
+    deadline = time.time() + time_limit if time_limit is not None else None
+    fens = []
+    for code in codes:
+        gs.make_move(engine.Move.from_code(code, gs.board))
+        fens.append(gs.get_fen())
+        gs.undo_move()
+    results = pool.map(_search_task, fens, [max(depth - 1, 1)] * len(fens), [deadline] * len(fens))
+    best_code = codes[0]
+    best_score = -search.INFINITY
+    for code, (score, depth_reached, nodes) in zip(codes, results):
+        if depth_reached > 0 and -score > best_score:
+            best_code = code
+            best_score = -score
+    return engine.Move.from_code(best_code, gs.board), best_score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Parallel perft and search over a process pool')
+    parser.add_argument('mode', choices=('perft', 'search'), nargs='?', default='perft')
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='bitboard')
+    parser.add_argument('--fen', default=START_FEN)
+    parser.add_argument('--time', type=float, help='search time limit in seconds')
+    parser.add_argument('--scaling', action='store_true', help='repeat perft with 1, 2, 4 ... workers')
+    args = parser.parse_args(argv)
+
+    gs = engine.GameState(backend=args.backend)
+    gs.load_fen(args.fen)
+    if args.mode == 'search':
+        with make_pool(args.workers, args.backend) as pool:
+            start = time.perf_counter()
+            move, score = parallel_search(gs, args.depth, pool, args.time)
+            print('bestmove %s  score %d  time %.3fs' % (move.write_chess_notation(), score,
+                                                          time.perf_counter() - start))
+        return 0
+
+    worker_counts = [args.workers]
+    if args.scaling:
+        worker_counts = []
+        count = 1
+        while count < args.workers:
+            worker_counts.append(count)
+            count *= 2
+        worker_counts.append(args.workers)
+    baseline = None
+    for workers in worker_counts:
+        with make_pool(workers, args.backend) as pool:
+            pool.submit(_perft_task, args.fen, 0).result() # start the workers before timing
+            start = time.perf_counter()
+            nodes = parallel_perft(gs, args.depth, pool)
+            elapsed = time.perf_counter() - start
+        nps = nodes / elapsed if elapsed else 0
+        baseline = baseline or nps
+        print('workers %3d  nodes %d  time %.3fs  nps %.0f  speedup %.2fx' % (workers, nodes, elapsed, nps,
+                                                                            nps / baseline if baseline else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Perft - counts the leaf nodes of the legal move tree to check and time the move generator
+Run with: python -m chess.perft [--depth N] [--backend mailbox|bitboard] [--hash SLOTS] [--fen FEN [--divide]]
+"""
+
+import argparse
+import sys
+import time
+
+from chess import engine
+from chess import zobrist
+
+"""
+Reference positions with known node counts per depth.
+The engine only promotes to a queen, so positions and depths whose counts include under-promotions are left out.
+"""
+POSITIONS = [
+    ('start position', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862}),
+    ('rook and pawn endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('illegal en-passant, pinned on the rank', '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1',
+     {1: 18, 2: 92, 3: 1670, 4: 10138}),
+    ('illegal en-passant, pinned on the diagonal', '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1',
+     {1: 13, 2: 102, 3: 1266, 4: 10276}),
+    ('en-passant capture gives check', '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1',
+     {1: 15, 2: 126, 3: 1928, 4: 13931}),
+    ('short castling gives check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1',
+     {1: 15, 2: 66, 3: 1198, 4: 6399}),
+    ('long castling gives check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1',
+     {1: 16, 2: 71, 3: 1286, 4: 7418}),
+    ('castling rights lost', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1',
+     {1: 26, 2: 1141, 3: 27826}),
+    ('castling prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1',
+     {1: 44, 2: 1494, 3: 50509}),
+    ('discovered check', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1',
+     {1: 29, 2: 165, 3: 5160}),
+    ('self stalemate', 'K1k5/8/P7/8/8/8/8/8 w - - 0 1',
+     {1: 2, 2: 6, 3: 13, 4: 63}),
+    ('double check', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1',
+     {1: 37, 2: 183, 3: 6559, 4: 23527}),
+]
+
+
+"""With a zobrist.TranspositionTable, counts of positions reached again by another move order are reused"""
+def perft(gs, depth, table=None):
+    if depth == 0:
+        return 1
+    if table is not None and depth > 1:
+        entry = table.probe(gs.zobrist_key)
+        if entry is not None and entry[0] == depth:
+            return entry[2]
+    moves = gs.get_valid_move_codes()
+    if depth == 1:
+        return len(moves) # leaves are only counted, so no Move objects are built for them
+    nodes = 0
+    for code in moves:
+        gs.make_move(engine.Move.from_code(code, gs.board))
+        nodes += perft(gs, depth - 1, table)
+        gs.undo_move()
+    if table is not None:
+        table.store(gs.zobrist_key, depth, zobrist.EXACT, nodes)
+    return nodes
+
+
+"""Node count below each root move, keyed by the move in coordinate notation"""
+def divide(gs, depth, table=None):
+    counts = {}
+    for move in gs.get_valid_moves():
+        gs.make_move(move)
+        counts[move.write_chess_notation()] = perft(gs, depth - 1, table)
+        gs.undo_move()
+    return counts
+
+
+"""Runs every reference position up to max_depth, returns False if any count is wrong"""
+def run_suite(max_depth, backend='mailbox', hash_size=0, out=sys.stdout):
+    all_passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, expected in POSITIONS:
+        gs = engine.GameState(backend=backend)
+        gs.load_fen(fen)
+        for depth in sorted(expected):
+            if depth > max_depth:
+                break
+            table = zobrist.TranspositionTable(hash_size) if hash_size else None
+            start = time.perf_counter()
+            nodes = perft(gs, depth, table)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            passed = nodes == expected[depth]
+            all_passed = all_passed and passed
+            out.write('%-45s depth %d  %10d nodes  %8.3fs  %10.0f nps  %s\n'
+                      % (name, depth, nodes, elapsed, nodes / elapsed if elapsed else 0,
+                         'ok' if passed else 'FAIL (expected %d)' % expected[depth]))
+    out.write('total %d nodes in %.3fs, %.0f nps\n'
+              % (total_nodes, total_time, total_nodes / total_time if total_time else 0))
+    return all_passed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Perft node counts for the chess move generator')
+    parser.add_argument('--depth', type=int, default=3, help='maximum depth (default 3)')
+    parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='mailbox')
+    parser.add_argument('--hash', type=int, default=0, metavar='SLOTS',
+                        help='reuse counts of transposed positions through a table of SLOTS entries (power of two)')
+    parser.add_argument('--fen', help='count a single position instead of the reference suite')
+    parser.add_argument('--divide', action='store_true', help='with --fen, print the count below each root move')
+    args = parser.parse_args(argv)
+
+    if args.fen is None:
+        return 0 if run_suite(args.depth, args.backend, args.hash) else 1
+
+    gs = engine.GameState(backend=args.backend)
+    gs.load_fen(args.fen)
+    table = zobrist.TranspositionTable(args.hash) if args.hash else None
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(gs, args.depth, table)
+        for move in sorted(counts):
+            print(move, counts[move])
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(gs, args.depth, table)
+    elapsed = time.perf_counter() - start
+    print('nodes %d  time %.3fs  nps %.0f' % (nodes, elapsed, nodes / elapsed if elapsed else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
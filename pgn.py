@@ -0,0 +1,171 @@
+"""
+PGN Reading and Writing, SAN Parsing and Formatting
+Games are read lazily one at a time, so files of any size can be streamed.
+"""
+
+import re
+
+from chess import engine
+
+_SAN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$')
+_RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+_TOKEN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|\(|\)|[^\s(){};]+')
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+class IllegalMoveError(ValueError):
+    pass
+
+
+"""The Move in gs.get_valid_moves() that a SAN string such as 'Nbd7', 'exd6', 'e8=Q' or 'O-O' stands for"""
+def san_to_move(gs, san):
+    san = san.rstrip('+#!?')
+    valid_moves = gs.get_valid_moves()
+    if san in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        kingside = san in ('O-O', '0-0')
+        for move in valid_moves:
+            if move.is_castle_move and (move.end_file > move.start_file) == kingside:
+                return move
+        raise IllegalMoveError('illegal castling: ' + san)
+
+    match = _SAN.match(san)
+    if match is None:
+        raise ValueError('not a SAN move: ' + san)
+    piece, from_file, from_rank, capture, to_square, promotion = match.groups()
+    if promotion is not None and promotion != 'Q':
+        raise IllegalMoveError('the engine only promotes to a queen: ' + san)
+    piece = piece or 'p'
+    end_rank = engine.Move.ranks_to_rows[to_square[1]]
+    end_file = engine.Move.files_to_cols[to_square[0]]
+    candidates = []
+    for move in valid_moves:
+        if move.piece_moved[1] != piece or move.end_rank != end_rank or move.end_file != end_file:
+            continue
+        if from_file is not None and move.start_file != engine.Move.files_to_cols[from_file]:
+            continue
+        if from_rank is not None and move.start_rank != engine.Move.ranks_to_rows[from_rank]:
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise IllegalMoveError(('ambiguous' if candidates else 'illegal') + ' move: ' + san)
+    return candidates[0]
+
+
+"""SAN string for a legal move on gs, with disambiguation and the check or mate suffix"""
+def move_to_san(gs, move, valid_moves=None):
+    if valid_moves is None:
+        valid_moves = gs.get_valid_moves()
+    piece = move.piece_moved[1]
+    if move.is_castle_move:
+        san = 'O-O' if move.end_file > move.start_file else 'O-O-O'
+    elif piece == 'p':
+        san = ''
+        if move.piece_captured != '--':
+            san = engine.Move.cols_to_files[move.start_file] + 'x'
+        san += move.get_rank_file(move.end_rank, move.end_file)
+        if move.is_pawn_promotion:
+            san += '=Q'
+    else:
+        rivals = [other for other in valid_moves if other.piece_moved == move.piece_moved and other != move
+                  and other.end_rank == move.end_rank and other.end_file == move.end_file]
+        san = piece
+        if rivals:
+            if all(other.start_file != move.start_file for other in rivals):
+                san += engine.Move.cols_to_files[move.start_file]
+            elif all(other.start_rank != move.start_rank for other in rivals):
+                san += engine.Move.rows_to_ranks[move.start_rank]
+            else:
+                san += move.get_rank_file(move.start_rank, move.start_file)
+        if move.piece_captured != '--':
+            san += 'x'
+        san += move.get_rank_file(move.end_rank, move.end_file)
+    gs.make_move(move)
+    if gs.in_check():
+        san += '#' if len(gs.get_valid_move_codes()) == 0 else '+'
+    gs.undo_move()
+    return san
+
+
+"""PGN text of one game: the tag pairs (Seven Tag Roster first), then the SAN moves numbered from the FEN tag"""
+def write_game(headers, moves, result='*'):
+    headers = dict(headers)
+    headers['Result'] = result
+    roster = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+    lines = ['[%s "%s"]' % (key, headers.get(key, '?')) for key in roster]
+    lines += ['[%s "%s"]' % (key, value) for key, value in headers.items() if key not in roster]
+    lines.append('')
+    fen_fields = headers.get('FEN', '').split()
+    white_to_move = len(fen_fields) < 2 or fen_fields[1] == 'w'
+    move_number = int(fen_fields[5]) if len(fen_fields) > 5 and fen_fields[5].isdigit() else 1
+    tokens = []
+    for san in moves:
+        if white_to_move:
+            tokens.append('%d.' % move_number)
+        elif not tokens:
+            tokens.append('%d...' % move_number)
+        tokens.append(san)
+        if not white_to_move:
+            move_number += 1
+        white_to_move = not white_to_move
+    tokens.append(result)
+    line = ''
+    for token in tokens: # wrap the movetext below 80 columns
+        if line and len(line) + len(token) >= 80:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+"""
+Yields (headers, moves) for each game in a PGN text file, moves being the main-line SAN strings.
+Comments, variations, NAGs and move numbers are skipped; only the current game is held in memory.
+"""
+def read_games(path):
+    with open(path, encoding='utf-8', errors='replace') as file:
+        headers = {}
+        movetext = []
+        for line in file:
+            stripped = line.strip()
+            if stripped.startswith('[') and stripped.endswith(']'):
+                if movetext:
+                    yield headers, parse_movetext(' '.join(movetext))
+                    headers = {}
+                    movetext = []
+                key, _, value = stripped[1:-1].partition(' ')
+                headers[key] = value.strip().strip('"')
+            elif stripped and not stripped.startswith('%'):
+                movetext.append(line)
+                if stripped.split()[-1] in _RESULTS and '{' not in stripped:
+                    yield headers, parse_movetext(' '.join(movetext))
+                    headers = {}
+                    movetext = []
+        if movetext or headers:
+            yield headers, parse_movetext(' '.join(movetext))
+
+
+def parse_movetext(text):
+    moves = []
+    variation_depth = 0
+    for token in _TOKEN.findall(text):
+        if token == '(':
+            variation_depth += 1
+        elif token == ')':
+            variation_depth -= 1
+        elif variation_depth > 0 or token[0] in '{;$' or token in _RESULTS:
+            continue
+        else:
+            token = token.split('.')[-1] # '12.e4', '12...' and '12.' all lose their move number
+            if token:
+                moves.append(token)
+    return moves
+
+
+"""Sets up gs for a game's headers (the FEN tag or the start position) and plays its moves, yielding after each"""
+def replay(gs, headers, moves):
+    gs.load_fen(headers.get('FEN', START_FEN))
+    for san in moves:
+        gs.make_move(san_to_move(gs, san))
+        yield gs
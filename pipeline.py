@@ -0,0 +1,154 @@
+"""
+Batch Analysis Pipeline
+Streams positions from FEN, EPD or PGN files, analyses them across worker processes and writes one JSON line
+per position as soon as it is done. Input is read lazily and only a bounded number of positions are in flight,
+so memory stays flat however large the input is.
+Run with: python -m chess.pipeline INPUT [-o OUTPUT] [--workers N] [--depth N] [--time SECONDS]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chess import engine
+from chess import pgn
+from chess import search
+
+_worker_state = None # the long-lived GameState of a worker process
+
+
+"""One position per line: a FEN with or without move clocks; '#' lines are comments"""
+def read_fen_file(path):
+    with open(path, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield str(line_number), line
+
+
+"""EPD lines: four FEN fields then opcodes such as 'bm e4; id "pos 1";' - the id opcode names the position"""
+def read_epd_file(path):
+    with open(path, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            fields = line.split(None, 4)
+            if len(fields) < 4 or line.startswith('#'):
+                continue
+            position_id = str(line_number)
+            if len(fields) == 5:
+                for operation in fields[4].split(';'):
+                    opcode, _, operand = operation.strip().partition(' ')
+                    if opcode == 'id':
+                        position_id = operand.strip().strip('"')
+            yield position_id, ' '.join(fields[:4])
+
+
+"""Every position reached in every game, or only each game's final position"""
+def read_pgn_file(path, final_only=False):
+    gs = engine.GameState()
+    for game_number, (headers, moves) in enumerate(pgn.read_games(path), 1):
+        fen = None
+        try:
+            for ply, position in enumerate(pgn.replay(gs, headers, moves), 1):
+                fen = position.get_fen()
+                if not final_only:
+                    yield '%d:%d' % (game_number, ply), fen
+        except ValueError:
+            pass # keep the positions of the game up to the bad move
+        if final_only and fen is not None:
+            yield str(game_number), fen
+
+
+def read_positions(path, final_only=False):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.pgn':
+        return read_pgn_file(path, final_only)
+    if extension == '.epd':
+        return read_epd_file(path)
+    return read_fen_file(path)
+
+
+def _init_worker(backend):
+    global _worker_state
+    _worker_state = engine.GameState(backend=backend)
+
+
+"""
+Legal move count, check/mate flags, static evaluation and search result for one position.
+Any failure, a FEN load_fen rejects or anything else, becomes an error record instead of ending the run.
+"""
+def analyse(position_id, fen, depth, time_limit):
+    try:
+        return _analyse(position_id, fen, depth, time_limit)
+    except Exception as error:
+        return {'id': position_id, 'fen': fen, 'error': '%s: %s' % (type(error).__name__, error)}
+
+
+def _analyse(position_id, fen, depth, time_limit):
+    gs = _worker_state
+    gs.load_fen(fen)
+    codes = gs.get_valid_move_codes()
+    result = {'id': position_id, 'fen': fen, 'legal_moves': len(codes), 'in_check': gs.in_check(),
+              'static_eval': search.evaluate(gs)}
+    if codes and depth > 0:
+        searcher = search.Searcher()
+        move = searcher.search(gs, depth, time_limit)
+        result['best_move'] = move.write_chess_notation()
+        result['eval'] = searcher.best_score
+        result['depth'] = searcher.depth_reached
+    result['checkmate'] = len(codes) == 0 and result['in_check']
+    result['stalemate'] = len(codes) == 0 and not result['in_check']
+    return result
+
+
+"""
+Analyses every (id, fen) from positions with a pool of workers and calls write(result) in completion order.
+At most max_pending positions are read ahead of the results. Returns the number of positions analysed.
+"""
+def run(positions, write, workers=None, depth=2, time_limit=None, backend='bitboard', max_pending=None):
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or workers * 4
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend,)) as pool:
+        pending = set()
+        for position_id, fen in positions:
+            pending.add(pool.submit(analyse, position_id, fen, depth, time_limit))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    write(future.result())
+                    count += 1
+        for future in pending:
+            write(future.result())
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse FEN/EPD/PGN positions in bulk')
+    parser.add_argument('input', help='.fen (one FEN per line), .epd or .pgn file')
+    parser.add_argument('-o', '--output', help='JSON lines output file (default stdout)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--depth', type=int, default=2, help='search depth, 0 skips the search')
+    parser.add_argument('--time', type=float, help='search time limit per position in seconds')
+    parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='bitboard')
+    parser.add_argument('--final-only', action='store_true', help='PGN: only analyse the final position of each game')
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        count = run(read_positions(args.input, args.final_only), lambda result: out.write(json.dumps(result) + '\n'),
+                    args.workers, args.depth, args.time, args.backend)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    sys.stderr.write('%d positions in %.3fs, %.1f positions/s\n' % (count, elapsed, count / elapsed if elapsed else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,322 @@
+"""
+Search - picks a move for the side to move
+Material plus piece-square-table evaluation, negamax alpha-beta with iterative deepening, quiescence search,
+a transposition table, MVV-LVA / killer / history move ordering, and a wall-clock or node budget.
+"""
+
+import time
+
+from chess import engine
+from chess import zobrist
+from chess.bitboard import ENPASSANT_FLAG
+
+PIECE_VALUES = {'p': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+
+"""Piece-square tables from white's point of view, laid out like GameState.board (row 0 is rank 8)"""
+PIECE_SQUARE_TABLES = {
+    'p': [[0, 0, 0, 0, 0, 0, 0, 0],
+          [50, 50, 50, 50, 50, 50, 50, 50],
+          [10, 10, 20, 30, 30, 20, 10, 10],
+          [5, 5, 10, 25, 25, 10, 5, 5],
+          [0, 0, 0, 20, 20, 0, 0, 0],
+          [5, -5, -10, 0, 0, -10, -5, 5],
+          [5, 10, 10, -20, -20, 10, 10, 5],
+          [0, 0, 0, 0, 0, 0, 0, 0]],
+    'N': [[-50, -40, -30, -30, -30, -30, -40, -50],
+          [-40, -20, 0, 0, 0, 0, -20, -40],
+          [-30, 0, 10, 15, 15, 10, 0, -30],
+          [-30, 5, 15, 20, 20, 15, 5, -30],
+          [-30, 0, 15, 20, 20, 15, 0, -30],
+          [-30, 5, 10, 15, 15, 10, 5, -30],
+          [-40, -20, 0, 5, 5, 0, -20, -40],
+          [-50, -40, -30, -30, -30, -30, -40, -50]],
+    'B': [[-20, -10, -10, -10, -10, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 10, 10, 5, 0, -10],
+          [-10, 5, 5, 10, 10, 5, 5, -10],
+          [-10, 0, 10, 10, 10, 10, 0, -10],
+          [-10, 10, 10, 10, 10, 10, 10, -10],
+          [-10, 5, 0, 0, 0, 0, 5, -10],
+          [-20, -10, -10, -10, -10, -10, -10, -20]],
+    'R': [[0, 0, 0, 0, 0, 0, 0, 0],
+          [5, 10, 10, 10, 10, 10, 10, 5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [-5, 0, 0, 0, 0, 0, 0, -5],
+          [0, 0, 0, 5, 5, 0, 0, 0]],
+    'Q': [[-20, -10, -10, -5, -5, -10, -10, -20],
+          [-10, 0, 0, 0, 0, 0, 0, -10],
+          [-10, 0, 5, 5, 5, 5, 0, -10],
+          [-5, 0, 5, 5, 5, 5, 0, -5],
+          [0, 0, 5, 5, 5, 5, 0, -5],
+          [-10, 5, 5, 5, 5, 5, 0, -10],
+          [-10, 0, 5, 0, 0, 0, 0, -10],
+          [-20, -10, -10, -5, -5, -10, -10, -20]],
+    'K': [[-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-30, -40, -40, -50, -50, -40, -40, -30],
+          [-20, -30, -30, -40, -40, -30, -30, -20],
+          [-10, -20, -20, -20, -20, -20, -20, -10],
+          [20, 20, 0, 0, 0, 0, 20, 20],
+          [20, 30, 10, 0, 0, 10, 30, 20]],
+}
+
+"""Value of each piece on each square, flattened to board square numbers and mirrored for black"""
+SQUARE_VALUES = {}
+for _piece, _table in PIECE_SQUARE_TABLES.items():
+    SQUARE_VALUES['w' + _piece] = [PIECE_VALUES[_piece] + _table[sq // 8][sq % 8] for sq in range(64)]
+    SQUARE_VALUES['b' + _piece] = [PIECE_VALUES[_piece] + _table[7 - sq // 8][sq % 8] for sq in range(64)]
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000 # scores beyond this are mates, counted in plies from the root
+INFINITY = MATE_SCORE + 1
+MAX_PLY = 64
+
+
+"""Material and piece-square score from the side to move's point of view"""
+def evaluate(gs):
+    score = 0
+    board = gs.board
+    for r in range(8):
+        row = board[r]
+        for f in range(8):
+            piece = row[f]
+            if piece != '--':
+                if piece[0] == 'w':
+                    score += SQUARE_VALUES[piece][r * 8 + f]
+                else:
+                    score -= SQUARE_VALUES[piece][r * 8 + f]
+    return score if gs.white_to_move else -score
+
+
+class SearchStopped(Exception):
+    pass
+
+
+class Searcher:
+    def __init__(self, table=None, book=None, tablebase=None, should_stop=None):
+        self.table = table if table is not None else zobrist.TranspositionTable()
+        self.book = book # a book.OpeningBook consulted before searching
+        self.tablebase = tablebase # a tablebase.Tablebase whose positions are played from the table
+        # called every 1024 nodes; unlike stop(), it can't be missed by a search that hasn't started yet
+        self.should_stop = should_stop
+        self.stopped = False
+        self.nodes = 0
+        self.cutoffs = 0 # beta cutoffs, in the main search and quiescence
+        self.best_move = None
+        self.best_score = 0
+        self.depth_reached = 0
+
+    """Asks a running search to return as soon as possible, e.g. from another thread"""
+    def stop(self):
+        self.stopped = True
+
+    """
+    Iterative deepening up to max_depth plies, within time_limit seconds and/or node_limit nodes.
+    Returns the best Move of the deepest finished iteration (None if there are no legal moves), or the book or
+    tablebase move without searching. best_score, depth_reached, nodes and cutoffs are left on the searcher.
+    """
+    def search(self, gs, max_depth=MAX_PLY, time_limit=None, node_limit=None):
+        self.stopped = False
+        self.nodes = 0
+        self.cutoffs = 0
+        self.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = {}
+        self.table.new_search()
+        self.best_move = None
+        self.best_score = 0
+        self.depth_reached = 0
+
+        root_length = len(gs.move_log)
+        root_moves = gs.get_valid_move_codes()
+        if len(root_moves) == 0:
+            return None
+        self.best_move = self.known_move(gs)
+        if self.best_move is not None:
+            return self.best_move
+        best_code = root_moves[0]
+        try:
+            for depth in range(1, min(max_depth, MAX_PLY) + 1):
+                score, code = self.search_root(gs, root_moves, depth, best_code)
+                best_code = code
+                self.best_score = score
+                self.depth_reached = depth
+                if abs(score) > MATE_BOUND:
+                    break # a forced mate won't get shorter by searching deeper
+        except SearchStopped:
+            while len(gs.move_log) > root_length:
+                gs.undo_move()
+        self.best_move = engine.Move.from_code(best_code, gs.board)
+        return self.best_move
+
+    """The book move, or the tablebase move with best_score set from the table, or None"""
+    def known_move(self, gs):
+        if self.book is not None:
+            move = self.book.choose(gs)
+            if move is not None:
+                return move
+        if self.tablebase is not None:
+            result = self.tablebase.probe(gs)
+            if result is not None:
+                move = self.tablebase.best_move(gs)
+                if move is not None:
+                    wdl, plies = result
+                    self.best_score = 0 if wdl == 0 else wdl * (MATE_SCORE - plies)
+                    return move
+        return None
+
+    def search_root(self, gs, root_moves, depth, pv_code):
+        alpha = -INFINITY
+        best_code = pv_code
+        for code in self.order_moves(gs, root_moves, 0, pv_code):
+            gs.make_move(engine.Move.from_code(code, gs.board))
+            score = -self.negamax(gs, depth - 1, -INFINITY, -alpha, 1)
+            gs.undo_move()
+            if score > alpha:
+                alpha = score
+                best_code = code
+        self.table.store(gs.zobrist_key, depth, zobrist.EXACT, alpha, best_code)
+        return alpha, best_code
+
+    def negamax(self, gs, depth, alpha, beta, ply):
+        self.count_node()
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(gs, alpha, beta, ply)
+
+        key = gs.zobrist_key
+        tt_code = 0
+        entry = self.table.probe(key)
+        if entry is not None:
+            tt_depth, flag, value, tt_code = entry
+            tt_code = tt_code or 0
+            if tt_depth >= depth:
+                value = score_from_table(value, ply)
+                if flag == zobrist.EXACT or (flag == zobrist.LOWER_BOUND and value >= beta) or \
+                        (flag == zobrist.UPPER_BOUND and value <= alpha):
+                    return value
+
+        moves = gs.get_valid_move_codes()
+        if len(moves) == 0:
+            return -MATE_SCORE + ply if gs.in_check() else 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_code = 0
+        board = gs.board
+        for code in self.order_moves(gs, moves, ply, tt_code):
+            is_capture = board[(code >> 6 & 63) >> 3][code >> 6 & 7] != '--' or code & ENPASSANT_FLAG
+            gs.make_move(engine.Move.from_code(code, board))
+            score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            gs.undo_move()
+            if score > best_score:
+                best_score = score
+                best_code = code
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.cutoffs += 1
+                if not is_capture:
+                    killers = self.killers[ply]
+                    if killers[0] != code:
+                        killers[1] = killers[0]
+                        killers[0] = code
+                    history_key = (board[(code & 63) >> 3][code & 7], code >> 6 & 63)
+                    self.history[history_key] = self.history.get(history_key, 0) + depth * depth
+                break
+
+        if best_score <= original_alpha:
+            flag = zobrist.UPPER_BOUND
+        elif best_score >= beta:
+            flag = zobrist.LOWER_BOUND
+        else:
+            flag = zobrist.EXACT
+        self.table.store(key, depth, flag, score_to_table(best_score, ply), best_code)
+        return best_score
+
+    """Searches captures only until the position is quiet, so the evaluation isn't taken mid-exchange"""
+    def quiescence(self, gs, alpha, beta, ply):
+        stand_pat = evaluate(gs)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        if ply >= MAX_PLY:
+            return alpha
+        board = gs.board
+        captures = [code for code in gs.get_valid_move_codes()
+                    if board[(code >> 6 & 63) >> 3][code >> 6 & 7] != '--' or code & ENPASSANT_FLAG]
+        for code in self.order_moves(gs, captures, ply, 0):
+            self.count_node()
+            gs.make_move(engine.Move.from_code(code, board))
+            score = -self.quiescence(gs, -beta, -alpha, ply + 1)
+            gs.undo_move()
+            if score >= beta:
+                self.cutoffs += 1
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    """Hash move first, then captures by MVV-LVA, then killer moves, then quiet moves by history score"""
+    def order_moves(self, gs, moves, ply, hash_code):
+        board = gs.board
+        killers = self.killers[ply] if ply <= MAX_PLY else (0, 0)
+        history = self.history
+        scored = []
+        for code in moves:
+            start_sq = code & 63
+            end_sq = code >> 6 & 63
+            piece = board[start_sq >> 3][start_sq & 7]
+            captured = board[end_sq >> 3][end_sq & 7]
+            if code == hash_code:
+                score = 1 << 30
+            elif captured != '--' or code & ENPASSANT_FLAG:
+                victim = PIECE_VALUES[captured[1]] if captured != '--' else PIECE_VALUES['p']
+                score = (1 << 20) + victim * 16 - PIECE_VALUES[piece[1]] // 100
+            elif code == killers[0]:
+                score = (1 << 19) + 1
+            elif code == killers[1]:
+                score = 1 << 19
+            else:
+                score = history.get((piece, end_sq), 0)
+            scored.append((score, code))
+        scored.sort(reverse=True)
+        return [code for score, code in scored]
+
+    def count_node(self):
+        self.nodes += 1
+        if self.stopped:
+            raise SearchStopped()
+        if self.nodes & 1023 == 0:
+            if (self.deadline is not None and time.perf_counter() >= self.deadline) or \
+                    (self.node_limit is not None and self.nodes >= self.node_limit) or \
+                    (self.should_stop is not None and self.should_stop()):
+                self.stopped = True
+                raise SearchStopped()
+
+
+"""Mate scores are stored relative to the node so they stay right when the position is reached at another ply"""
+def score_to_table(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+"""Best move for the side to move within the given depth, time (seconds) and node limits"""
+def find_best_move(gs, max_depth=MAX_PLY, time_limit=None, node_limit=None):
+    return Searcher().search(gs, max_depth, time_limit, node_limit)
@@ -0,0 +1,210 @@
+"""
+Headless Self-Play
+Plays games between move choosers straight on GameState, spread over worker processes, and streams every
+finished game to a PGN or JSON lines file as soon as it ends. Used for load testing and generating training data.
+Choosers: 'random', 'greedy' (takes the most valuable capture, otherwise random) and 'search:N' (fixed depth N).
+Run with: python -m chess.selfplay [--games N] [--white random] [--black search:2] [-o games.pgn|games.jsonl]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chess import book
+from chess import engine
+from chess import pgn
+from chess import search
+from chess import tablebase
+from chess.bitboard import ENPASSANT_FLAG
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+_worker_state = None # the long-lived GameState of a worker process
+_book = None # the worker's OpeningBook and Tablebase for search choosers, if any
+_tablebase = None
+
+
+def choose_random(gs, codes, rng):
+    return rng.choice(codes)
+
+
+"""The capture of the most valuable piece, by the least valuable attacker; a random move if nothing can be taken"""
+def choose_greedy(gs, codes, rng):
+    board = gs.board
+    best_codes = []
+    best_score = 0
+    for code in codes:
+        end = code >> 6 & 63
+        if code & ENPASSANT_FLAG:
+            score = search.PIECE_VALUES['p'] * 16
+        else:
+            captured = board[end >> 3][end & 7]
+            if captured == '--':
+                continue
+            start = code & 63
+            score = search.PIECE_VALUES[captured[1]] * 16 - search.PIECE_VALUES[board[start >> 3][start & 7][1]] // 100
+        if score > best_score:
+            best_score = score
+            best_codes = [code]
+        elif score == best_score:
+            best_codes.append(code)
+    return rng.choice(best_codes or codes)
+
+
+"""
+A chooser that runs a fixed-depth search; its searcher (and transposition table) lives for the whole game.
+It plays from the worker's opening book and tablebases where they have the position.
+"""
+def search_chooser(depth):
+    searcher = search.Searcher(book=_book, tablebase=_tablebase)
+    def choose(gs, codes, rng):
+        return searcher.search(gs, depth).code
+    return choose
+
+
+"""Chooser function for a spec such as 'random', 'greedy' or 'search:2'"""
+def make_chooser(spec):
+    name, _, argument = spec.partition(':')
+    if name == 'random':
+        return choose_random
+    if name == 'greedy':
+        return choose_greedy
+    if name == 'search':
+        return search_chooser(int(argument or 2))
+    raise ValueError('unknown chooser: ' + spec)
+
+
+"""
+(result, termination) if the game is over in gs's position, otherwise None.
+codes are the legal move codes of the position; draws are claimed as soon as they can be.
+"""
+def game_over(gs, codes):
+    if len(codes) == 0:
+        if gs.in_check():
+            return ('0-1' if gs.white_to_move else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if gs.is_insufficient_material():
+        return '1/2-1/2', 'insufficient material'
+    if gs.is_fifty_move_draw():
+        return '1/2-1/2', 'fifty-move rule'
+    if gs.is_threefold_repetition():
+        return '1/2-1/2', 'threefold repetition'
+    return None
+
+
+def _init_worker(backend, book_path=None, tablebase_dir=None):
+    global _worker_state, _book, _tablebase
+    _worker_state = engine.GameState(backend=backend)
+    # memory mapped, so every worker reads the same pages
+    _book = book.OpeningBook(book_path) if book_path else None
+    _tablebase = tablebase.Tablebase(tablebase_dir) if tablebase_dir else None
+
+
+"""Plays one game in the worker's GameState and returns it as a dict ready for JSON or PGN output"""
+def play_game(game_number, white, black, seed, fen=START_FEN, max_plies=500):
+    gs = _worker_state
+    gs.load_fen(fen)
+    rng = random.Random(seed)
+    choosers = {True: make_chooser(white), False: make_chooser(black)}
+    moves = []
+    start = time.perf_counter()
+    while True:
+        codes = gs.get_valid_move_codes()
+        ending = game_over(gs, codes)
+        if ending is not None:
+            result, termination = ending
+            break
+        if len(moves) >= max_plies:
+            result, termination = '*', 'ply limit'
+            break
+        code = choosers[gs.white_to_move](gs, codes, rng)
+        board = gs.board
+        move = engine.Move.from_code(code, board)
+        moves.append((pgn.move_to_san(gs, move, [engine.Move.from_code(c, board) for c in codes]),
+                      move.write_chess_notation()))
+        gs.make_move(move)
+    headers = {'Event': 'Self-play', 'Site': '?', 'Date': time.strftime('%Y.%m.%d'), 'Round': str(game_number),
+               'White': white, 'Black': black, 'Result': result, 'Termination': termination}
+    if fen != START_FEN:
+        headers['SetUp'] = '1'
+        headers['FEN'] = fen
+    return {'game': game_number, 'headers': headers, 'result': result, 'termination': termination,
+            'plies': len(moves), 'san': [san for san, _ in moves], 'moves': [uci for _, uci in moves],
+            'final_fen': gs.get_fen(), 'seconds': time.perf_counter() - start}
+
+
+"""
+Plays games games over a pool of workers and calls write(game) in completion order.
+With alternate the choosers swap colours every other game. Returns the game results in completion order.
+"""
+def run(games, write, white='random', black='random', workers=None, seed=None, fen=START_FEN, max_plies=500,
+        backend='bitboard', alternate=False, max_pending=None, book_path=None, tablebase_dir=None):
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or workers * 4
+    seeds = random.Random(seed)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(backend, book_path, tablebase_dir)) as pool:
+        pending = set()
+        for game_number in range(1, games + 1):
+            players = (black, white) if alternate and game_number % 2 == 0 else (white, black)
+            pending.add(pool.submit(play_game, game_number, players[0], players[1], seeds.getrandbits(64), fen,
+                                    max_plies))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    game = future.result()
+                    write(game)
+                    results.append(game['result'])
+        for future in pending:
+            game = future.result()
+            write(game)
+            results.append(game['result'])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play games between move choosers without a UI')
+    parser.add_argument('--games', type=int, default=10)
+    parser.add_argument('--white', default='random', help="random, greedy or search:N (default random)")
+    parser.add_argument('--black', default='random', help="random, greedy or search:N (default random)")
+    parser.add_argument('--alternate', action='store_true', help='swap colours every other game')
+    parser.add_argument('-o', '--output', help='.pgn for PGN, anything else for JSON lines (default stdout, JSON lines)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, help='makes random and greedy games reproducible')
+    parser.add_argument('--fen', default=START_FEN, help='start every game from this position')
+    parser.add_argument('--max-plies', type=int, default=500, help='games still going are stopped with result *')
+    parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='bitboard')
+    parser.add_argument('--book', help='Polyglot opening book for the search choosers')
+    parser.add_argument('--tablebases', help='tablebase directory for the search choosers')
+    args = parser.parse_args(argv)
+    make_chooser(args.white), make_chooser(args.black) # fail on a bad spec before starting the pool
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    as_pgn = args.output is not None and args.output.lower().endswith('.pgn')
+    def write(game):
+        if as_pgn:
+            out.write(pgn.write_game(game['headers'], game['san'], game['result']))
+        else:
+            out.write(json.dumps(game) + '\n')
+        out.flush()
+    start = time.perf_counter()
+    try:
+        results = run(args.games, write, args.white, args.black, args.workers, args.seed, args.fen, args.max_plies,
+                      args.backend, args.alternate, book_path=args.book, tablebase_dir=args.tablebases)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    summary = ', '.join('%s %d' % (result, results.count(result)) for result in ('1-0', '0-1', '1/2-1/2', '*'))
+    sys.stderr.write('%d games in %.3fs, %.2f games/s (%s)\n'
+                     % (len(results), elapsed, len(results) / elapsed if elapsed else 0, summary))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,649 @@
+"""
+Game Server
+Hosts many concurrent games as JSON over HTTP and WebSockets, using nothing but asyncio. Every session keeps its
+own GameState. Legal moves come from a shared MoveCache in the event loop; searches and perft run in a process
+pool, so the loop never blocks on them. Pool requests have a time limit (504 when it runs out), the number of
+requests in the pool is bounded (503 when full), and a WebSocket's requests are cancelled when it closes.
+Searches and perft stop themselves at their deadline in the worker, and a request keeps its place in the pool
+bound until its worker is really done, so work that timed out still counts against the bound while it runs.
+The bench command is a load generator: simulated clients play games against a server and p50/p99 latency is
+reported per request kind.
+
+HTTP:  POST /games {"fen"}               GET /games/<id>              DELETE /games/<id>
+       POST /games/<id>/moves {"move"}  POST /games/<id>/undo
+       POST /games/<id>/search {"depth", "time", "play"}             POST /games/<id>/perft {"depth"}
+       GET /stats                       GET /ws (WebSocket upgrade)
+WebSocket messages are {"id", "op", "game", ...} with op one of new, get, move, undo, search, perft, delete,
+stats and cancel ({"target": id}); every reply carries the message's id.
+
+Run with: python -m chess.server serve [--port 8000] [--workers N]
+          python -m chess.server bench [--clients 50] [--requests 20] [--url http://127.0.0.1:8000]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import struct
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+from chess import book
+from chess import cache
+from chess import engine
+from chess import perft
+from chess import pgn
+from chess import search
+from chess import selfplay
+from chess import tablebase
+from chess import uci
+
+logger = logging.getLogger(__name__)
+
+START_FEN = pgn.START_FEN
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_BODY = 1 << 16
+KEEP_ALIVE = 30.0 # seconds an idle HTTP connection is kept open
+GRACE = 0.5 # seconds a search may overrun its deadline (it checks the clock every 1024 nodes)
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+           504: 'Gateway Timeout'}
+
+_worker_state = None # the long-lived GameState of a worker process
+_book = None # the worker's OpeningBook and Tablebase for searches, if any
+_tablebase = None
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _init_worker(backend, book_path=None, tablebase_dir=None):
+    global _worker_state, _book, _tablebase
+    _worker_state = engine.GameState(backend=backend)
+    _book = book.OpeningBook(book_path) if book_path else None
+    _tablebase = tablebase.Tablebase(tablebase_dir) if tablebase_dir else None
+
+
+"""The worker's GameState set to a session's position: its start FEN and the move codes played since"""
+def _load(fen, codes):
+    gs = _worker_state
+    gs.load_fen(fen)
+    for code in codes:
+        gs.make_move(engine.Move.from_code(code, gs.board))
+    return gs
+
+
+"""
+(move code or None, score, depth reached, nodes) of a search of up to time_limit seconds that ends by expires
+(a time.time()), or None if the request expired while it queued
+"""
+def _search_task(fen, codes, depth, time_limit, expires):
+    time_limit = min(time_limit, expires - time.time())
+    if time_limit <= 0:
+        return None
+    searcher = search.Searcher(book=_book, tablebase=_tablebase)
+    move = searcher.search(_load(fen, codes), depth, time_limit)
+    return (move.code if move is not None else None, searcher.best_score, searcher.depth_reached, searcher.nodes)
+
+
+class Expired(Exception):
+    pass
+
+
+"""perft that checks the clock before each subtree two plies from the leaves and gives up once expires passes"""
+def _perft(gs, depth, expires):
+    if depth <= 2:
+        if time.time() >= expires:
+            raise Expired()
+        return perft.perft(gs, depth)
+    nodes = 0
+    for code in gs.get_valid_move_codes():
+        gs.make_move(engine.Move.from_code(code, gs.board))
+        nodes += _perft(gs, depth - 1, expires)
+        gs.undo_move()
+    return nodes
+
+
+"""Perft node count, or None if the request expired while it queued or while counting"""
+def _perft_task(fen, codes, depth, expires):
+    try:
+        return _perft(_load(fen, codes), depth, expires)
+    except Expired:
+        return None
+
+
+class Session:
+    def __init__(self, session_id, fen, backend):
+        self.id = session_id
+        self.gs = engine.GameState(backend=backend)
+        self.gs.load_fen(fen)
+        self.fen = fen
+        self.codes = [] # move codes played from fen, which is how the position is sent to the pool
+        self.last_used = time.monotonic()
+
+
+class Server:
+    def __init__(self, workers=None, backend='bitboard', max_pending=None, max_sessions=10000, max_time=10.0,
+                 max_wait=2.0, max_perft_depth=4, idle_timeout=600.0, book_path=None, tablebase_dir=None):
+        self.workers = workers or os.cpu_count()
+        self.backend = backend
+        self.max_pending = max_pending or self.workers * 4
+        self.max_sessions = max_sessions
+        self.max_time = max_time
+        self.max_wait = max_wait # seconds a request may wait for a worker on top of its own time limit
+        self.max_perft_depth = max_perft_depth
+        self.idle_timeout = idle_timeout
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(backend, book_path, tablebase_dir))
+        self.cache = cache.MoveCache()
+        self.sessions = {}
+        self.pending = 0
+        self.counts = {'requests': 0, 'rejected': 0, 'timed_out': 0, 'cancelled': 0, 'failed': 0}
+        self.server = None
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self.sweeper = asyncio.get_running_loop().create_task(self.sweep())
+        # start the workers now, so the first requests don't pay for it
+        await asyncio.gather(*[asyncio.wrap_future(self.pool.submit(time.time)) for _ in range(self.workers)])
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self.sweeper.cancel()
+        self.server.close()
+        await self.server.wait_closed()
+        self.pool.shutdown(cancel_futures=True)
+
+    """Drops sessions nobody has touched for idle_timeout seconds"""
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 60.0))
+            cutoff = time.monotonic() - self.idle_timeout
+            for session_id in [s.id for s in self.sessions.values() if s.last_used < cutoff]:
+                del self.sessions[session_id]
+
+    def session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise RequestError(404, 'no such game: %s' % session_id)
+        session.last_used = time.monotonic()
+        return session
+
+    def state(self, session):
+        gs = session.gs
+        codes, in_check = self.cache.lookup(gs)[:2]
+        board = gs.board
+        format_code = uci.format_code
+        ending = selfplay.game_over(gs, codes)
+        return {'game': session.id, 'fen': gs.get_fen(), 'turn': 'w' if gs.white_to_move else 'b',
+                'moves': [format_code(code, board) for code in codes],
+                'in_check': in_check, 'result': ending[0] if ending else None,
+                'termination': ending[1] if ending else None, 'plies': len(session.codes)}
+
+    """
+    Runs function(*args, expires) in the pool, giving up on it after time_limit plus max_wait seconds.
+    A full pool is a 503 and a request that runs out of time a 504. The request's pending slot is only freed
+    when the pool job finishes or is dropped from the queue, not when the caller stops waiting for it.
+    """
+    async def offload(self, function, time_limit, *args):
+        if self.pending >= self.max_pending:
+            self.counts['rejected'] += 1
+            raise RequestError(503, 'server busy, try again')
+        timeout = time_limit + self.max_wait
+        loop = asyncio.get_running_loop()
+        job = self.pool.submit(function, *args, time.time() + timeout)
+        self.pending += 1
+        def finished(job):
+            try:
+                loop.call_soon_threadsafe(self.release)
+            except RuntimeError:
+                pass # the loop has closed, so there's no count left to keep
+        job.add_done_callback(finished)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job), timeout + GRACE)
+        except asyncio.TimeoutError:
+            self.counts['timed_out'] += 1
+            raise RequestError(504, 'time limit exceeded')
+        except asyncio.CancelledError:
+            self.counts['cancelled'] += 1 # a queued job is dropped with the future; a running one hits its deadline
+            raise
+        if result is None:
+            self.counts['timed_out'] += 1
+            raise RequestError(504, 'time limit exceeded in the worker')
+        return result
+
+    def release(self):
+        self.pending -= 1
+
+    """Seconds from a request's 'time', at most max_time; a 400 unless it's a positive finite number"""
+    def time_limit(self, body, default):
+        time_limit = float(body.get('time', default))
+        if not math.isfinite(time_limit) or time_limit <= 0:
+            raise RequestError(400, 'time must be a positive number of seconds')
+        return min(time_limit, self.max_time)
+
+    """Carries out one request; op names are the WebSocket ones, which the HTTP routes map onto"""
+    async def dispatch(self, op, session_id, body):
+        self.counts['requests'] += 1
+        if op == 'new':
+            if len(self.sessions) >= self.max_sessions:
+                raise RequestError(503, 'too many games')
+            try:
+                session = Session(uuid.uuid4().hex, str(body.get('fen') or START_FEN), self.backend)
+            except ValueError as error: # a FEN load_fen rejects
+                raise RequestError(400, str(error))
+            state = self.state(session) # before the session is stored, so a position that fails here isn't kept
+            self.sessions[session.id] = session
+            return state
+        if op == 'stats':
+            return dict(self.counts, games=len(self.sessions), pending=self.pending, max_pending=self.max_pending,
+                        workers=self.workers, cache=self.cache.stats())
+        session = self.session(session_id)
+        gs = session.gs
+        if op == 'get':
+            return self.state(session)
+        if op == 'delete':
+            del self.sessions[session.id]
+            return {'game': session.id, 'deleted': True}
+        if op == 'move':
+            try:
+                move = uci.parse_move(gs, str(body.get('move', '')), self.cache.lookup(gs)[0])
+            except ValueError as error: # includes pgn.IllegalMoveError
+                raise RequestError(400, str(error))
+            gs.make_move(move)
+            session.codes.append(move.code)
+            return self.state(session)
+        if op == 'undo':
+            if not session.codes:
+                raise RequestError(409, 'no move to undo')
+            gs.undo_move()
+            session.codes.pop()
+            return self.state(session)
+        if op == 'search':
+            depth = int(body.get('depth', search.MAX_PLY))
+            time_limit = self.time_limit(body, 1.0)
+            position = (len(session.codes), gs.zobrist_key)
+            start = time.perf_counter()
+            code, score, depth_reached, nodes = await self.offload(_search_task, time_limit, session.fen,
+                                                                   list(session.codes), depth, time_limit)
+            result = {'game': session.id, 'move': None, 'score': score, 'depth': depth_reached, 'nodes': nodes,
+                      'seconds': time.perf_counter() - start}
+            if code is not None:
+                result['move'] = uci.format_code(code, gs.board)
+            if body.get('play') and code is not None:
+                if (len(session.codes), gs.zobrist_key) != position:
+                    raise RequestError(409, 'the game moved on during the search')
+                gs.make_move(engine.Move.from_code(code, gs.board))
+                session.codes.append(code)
+                result['state'] = self.state(session)
+            return result
+        if op == 'perft':
+            depth = int(body.get('depth', 3))
+            if not 0 <= depth <= self.max_perft_depth:
+                raise RequestError(400, 'perft depth must be 0 to %d' % self.max_perft_depth)
+            time_limit = self.time_limit(body, self.max_time)
+            nodes = await self.offload(_perft_task, time_limit, session.fen, list(session.codes), depth)
+            return {'game': session.id, 'depth': depth, 'nodes': nodes}
+        raise RequestError(400, 'unknown op: %s' % op)
+
+    """(op, game id) for an HTTP method and path"""
+    def route(self, method, path):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['stats'] and method == 'GET':
+            return 'stats', None
+        if not parts or parts[0] != 'games' or len(parts) > 3:
+            raise RequestError(404, 'not found: %s' % path)
+        if len(parts) == 1:
+            if method == 'POST':
+                return 'new', None
+        elif len(parts) == 2:
+            if method in ('GET', 'DELETE'):
+                return ('get' if method == 'GET' else 'delete'), parts[1]
+        elif method == 'POST' and parts[2] in ('moves', 'undo', 'search', 'perft'):
+            return ('move' if parts[2] == 'moves' else parts[2]), parts[1]
+        else:
+            raise RequestError(404, 'not found: %s' % path)
+        raise RequestError(405, 'method not allowed: %s %s' % (method, path))
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE)
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                path = urlsplit(target).path
+                if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                    await self.websocket(reader, writer, headers)
+                    break
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    op, session_id = self.route(method, path)
+                    payload = json.loads(body) if body.strip() else {}
+                    if not isinstance(payload, dict):
+                        raise RequestError(400, 'the body must be a JSON object')
+                    result = await self.dispatch(op, session_id, payload)
+                    status = 201 if op == 'new' else 200
+                except RequestError as error:
+                    status, result = error.status, {'error': str(error)}
+                except (ValueError, TypeError) as error: # bad JSON or a bad number in it
+                    status, result = 400, {'error': str(error)}
+                except Exception:
+                    logger.exception('%s %s failed', method, path)
+                    self.counts['failed'] += 1
+                    status, result = 500, {'error': 'internal error'}
+                await self.respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except Exception:
+            logger.exception('connection failed')
+            self.counts['failed'] += 1
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, result, keep_alive):
+        body = json.dumps(result).encode()
+        extra = 'Retry-After: 1\r\n' if status == 503 else ''
+        head = ('HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%sConnection: %s\r\n\r\n'
+                % (status, REASONS.get(status, ''), len(body), extra, 'keep-alive' if keep_alive else 'close'))
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                      'Sec-WebSocket-Accept: %s\r\n\r\n' % accept).encode('latin-1'))
+        await writer.drain()
+        tasks = {} # message id -> task, for cancel
+        lock = asyncio.Lock()
+        async def send(message):
+            async with lock:
+                writer.write(encode_frame(0x1, json.dumps(message).encode()))
+                await writer.drain()
+        async def answer(message_id, message):
+            reply = {'id': message_id}
+            try:
+                reply['result'] = await self.dispatch(message.get('op'), message.get('game'), message)
+            except RequestError as error:
+                reply.update(error=str(error), status=error.status)
+            except (ValueError, TypeError) as error:
+                reply.update(error=str(error), status=400)
+            except Exception:
+                logger.exception('%s failed', message.get('op'))
+                self.counts['failed'] += 1
+                reply.update(error='internal error', status=500)
+            finally:
+                tasks.pop(message_id, None)
+            await send(reply)
+        try:
+            while True:
+                opcode, payload = await read_message(reader)
+                if opcode == 0x8:
+                    async with lock:
+                        writer.write(encode_frame(0x8, payload[:2]))
+                    break
+                if opcode == 0x9:
+                    async with lock:
+                        writer.write(encode_frame(0xA, payload))
+                    continue
+                if opcode != 0x1:
+                    continue
+                try:
+                    message = json.loads(payload)
+                    if not isinstance(message, dict):
+                        raise ValueError('messages must be JSON objects')
+                    message_id = message.get('id')
+                    if not isinstance(message_id, (str, int, float, type(None))):
+                        raise ValueError('message ids must be strings or numbers')
+                except ValueError as error:
+                    await send({'id': None, 'error': str(error), 'status': 400})
+                    continue
+                if message.get('op') == 'cancel':
+                    # the cancelled request is answered here, as its task may be stopped before it even starts
+                    task = tasks.pop(message.get('target'), None)
+                    if task is not None:
+                        task.cancel()
+                        await send({'id': message.get('target'), 'error': 'cancelled', 'status': 409})
+                    await send({'id': message_id, 'result': {'cancelled': task is not None}})
+                    continue
+                tasks[message_id] = asyncio.get_running_loop().create_task(answer(message_id, message))
+        finally:
+            for task in list(tasks.values()):
+                task.cancel() # the client has gone, so its pool requests are dropped
+
+
+def encode_frame(opcode, payload):
+    length = len(payload)
+    if length < 126:
+        head = struct.pack('>BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        head = struct.pack('>BBH', 0x80 | opcode, 126, length)
+    else:
+        head = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+    return head + payload
+
+
+"""(opcode, payload) of the next whole WebSocket message, unmasked and with fragments joined"""
+async def read_message(reader):
+    opcode = None
+    fragments = []
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', await reader.readexactly(8))[0]
+        if length > MAX_BODY:
+            raise ValueError('WebSocket frame too large')
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask is not None:
+            key = int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+            payload = (int.from_bytes(payload, 'big') ^ key).to_bytes(length, 'big')
+        frame_opcode = first & 0x0F
+        if frame_opcode >= 0x8: # control frames may arrive between fragments
+            return frame_opcode, payload
+        if frame_opcode != 0x0:
+            opcode = frame_opcode
+        fragments.append(payload)
+        if first & 0x80:
+            return opcode, b''.join(fragments)
+
+
+"""A keep-alive HTTP/1.1 connection speaking the server's JSON, for the load generator"""
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b''
+        self.writer.write(('%s %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                           % (method, path, self.host, len(data))).encode('latin-1') + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        payload = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, json.loads(payload) if payload else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+"""
+One simulated player: starts a game, then mostly looks at it and plays random legal moves, sometimes asking for
+a search or taking a move back, and starts a new game when one ends. Latencies are appended to latencies[kind].
+"""
+async def _play(host, port, requests, search_time, search_share, latencies, statuses, rng):
+    client = Client(host, port)
+    async def call(kind, method, path, body=None):
+        start = time.perf_counter()
+        status, result = await client.request(method, path, body)
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+        return status, result
+    try:
+        status, state = await call('new', 'POST', '/games', {})
+        for _ in range(requests):
+            if state['result'] is not None:
+                await call('delete', 'DELETE', '/games/' + state['game'])
+                status, state = await call('new', 'POST', '/games', {})
+                continue
+            roll = rng.random()
+            path = '/games/' + state['game']
+            if roll < search_share:
+                status, result = await call('search', 'POST', path + '/search', {'time': search_time, 'play': True})
+                if status == 200 and 'state' in result:
+                    state = result['state']
+                continue
+            if roll < search_share + 0.05 and state['plies'] > 0:
+                status, result = await call('undo', 'POST', path + '/undo')
+            elif roll < 0.3:
+                status, result = await call('get', 'GET', path)
+            else:
+                status, result = await call('move', 'POST', path + '/moves', {'move': rng.choice(state['moves'])})
+            if status == 200:
+                state = result
+        await call('delete', 'DELETE', '/games/' + state['game'])
+    finally:
+        client.close()
+
+
+"""The value p percent of the way through sorted values (nearest rank)"""
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(len(ordered) * p / 100) - 1, 0)]
+
+
+"""
+Runs clients simulated players of requests requests each against url, or against a server started in-process
+when url is None, and returns (latencies by kind, counts by HTTP status, seconds taken).
+"""
+async def bench(clients=50, requests=20, url=None, search_time=0.1, search_share=0.1, seed=None, **server_options):
+    server = None
+    if url is None:
+        server = Server(**server_options)
+        host, port = '127.0.0.1', await server.start('127.0.0.1', 0)
+    else:
+        parts = urlsplit(url)
+        host, port = parts.hostname, parts.port or 80
+    latencies = {}
+    statuses = {}
+    seeds = random.Random(seed)
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[_play(host, port, requests, search_time, search_share, latencies, statuses,
+                                     random.Random(seeds.getrandbits(64))) for _ in range(clients)])
+    finally:
+        elapsed = time.perf_counter() - start
+        if server is not None:
+            await server.close()
+    return latencies, statuses, elapsed
+
+
+def report(latencies, statuses, elapsed):
+    lines = ['%-8s %8s %10s %10s %10s' % ('request', 'count', 'p50 ms', 'p99 ms', 'max ms')]
+    everything = []
+    for kind in sorted(latencies):
+        values = latencies[kind]
+        everything.extend(values)
+        lines.append('%-8s %8d %10.2f %10.2f %10.2f' % (kind, len(values), percentile(values, 50) * 1000,
+                                                         percentile(values, 99) * 1000, max(values) * 1000))
+    if everything:
+        lines.append('%-8s %8d %10.2f %10.2f %10.2f' % ('all', len(everything), percentile(everything, 50) * 1000,
+                                                         percentile(everything, 99) * 1000, max(everything) * 1000))
+    lines.append('%d requests in %.3fs, %.0f requests/s, status %s' % (
+        len(everything), elapsed, len(everything) / elapsed if elapsed else 0,
+        ' '.join('%d:%d' % item for item in sorted(statuses.items()))))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve games over HTTP and WebSockets, or load test a server')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='run the server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    bench_parser = commands.add_parser('bench', help='load test a server and report latency percentiles')
+    bench_parser.add_argument('--url', help='server to test (default start one in-process)')
+    bench_parser.add_argument('--clients', type=int, default=50, help='simulated players at once')
+    bench_parser.add_argument('--requests', type=int, default=20, help='requests per player')
+    bench_parser.add_argument('--search-time', type=float, default=0.1, help='seconds per search request')
+    bench_parser.add_argument('--search-share', type=float, default=0.1, help='fraction of requests that search')
+    bench_parser.add_argument('--seed', type=int)
+    for command_parser in (serve_parser, bench_parser):
+        command_parser.add_argument('--workers', type=int, default=os.cpu_count())
+        command_parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='bitboard')
+        command_parser.add_argument('--max-pending', type=int, help='pool requests at once (default 4 per worker)')
+        command_parser.add_argument('--book', help='Polyglot opening book for searches')
+        command_parser.add_argument('--tablebases', help='tablebase directory for searches')
+    args = parser.parse_args(argv)
+    options = dict(workers=args.workers, backend=args.backend, max_pending=args.max_pending, book_path=args.book,
+                   tablebase_dir=args.tablebases)
+
+    if args.command == 'bench':
+        if args.url is not None:
+            options = {}
+        latencies, statuses, elapsed = asyncio.run(bench(args.clients, args.requests, args.url, args.search_time,
+                                                         args.search_share, args.seed, **options))
+        print(report(latencies, statuses, elapsed))
+        return 0
+
+    async def serve():
+        server = Server(**options)
+        port = await server.start(args.host, args.port)
+        logger.info('serving on http://%s:%d', args.host, port)
+        try:
+            await server.server.serve_forever()
+        finally:
+            await server.close()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
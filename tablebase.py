@@ -0,0 +1,358 @@
+"""
+Endgame Tablebases
+A table holds the exact result of every position with one set of pieces (e.g. KQvK): one byte per position,
+indexed directly by the side to move and the square of each piece, worked out by retrograde analysis from
+the checkmates. Tables are memory mapped, so a probe is a single byte read and worker processes share the pages.
+Only queen promotions are followed, as the engine makes no others; castling and en passant never arise.
+Generation runs GameState over every placement: three pieces take under a minute, four need hours and gigabytes.
+Run with: python -m chess.tablebase generate KQvK KRvK KPvK [--dir DIR] | python -m chess.tablebase probe FEN [--dir DIR]
+"""
+
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from chess import engine
+
+PIECE_ORDER = 'KQRBNP'
+HEADER = struct.Struct('>4sB11s') # magic, number of pieces, signature
+MAGIC = b'CHTB'
+DRAW = 0 # any other value is the number of plies to mate plus one: odd plies are a win for the side to move
+INVALID = 255 # pieces overlap, a pawn on its first or last rank, or the side not to move is in check
+MAX_PLIES = 253
+
+
+"""'KQvK' -> ['wK', 'wQ', 'bK'], the order pieces are indexed in"""
+def signature_pieces(signature):
+    white, black = signature.upper().split('V')
+    if not (white.startswith('K') and black.startswith('K')):
+        raise ValueError('each side needs its king first: ' + signature)
+    pieces = []
+    for color, side in (('w', white), ('b', black)):
+        if any(piece not in PIECE_ORDER for piece in side) or side.count('K') != 1:
+            raise ValueError('not a tablebase signature: ' + signature)
+        pieces += [color + ('p' if piece == 'P' else piece) for piece in sorted(side, key=PIECE_ORDER.index)]
+    return pieces
+
+
+"""
+Sorts a placement into signature order and decides whether the colours have to be swapped to find its table,
+so that only one of KQvK and KvKQ is stored. Returns (signature, squares, white_to_move).
+"""
+def canonical(pieces, squares, white_to_move):
+    placed = sorted(zip(pieces, squares), key=lambda placement: (placement[0][0] != 'w',
+                                                                 PIECE_ORDER.index(placement[0][1].upper())))
+    white = ''.join(piece[1].upper() for piece, _ in placed if piece[0] == 'w')
+    black = ''.join(piece[1].upper() for piece, _ in placed if piece[0] == 'b')
+    strength = lambda side: (len(side), [-PIECE_ORDER.index(piece) for piece in side])
+    if strength(white) >= strength(black):
+        return white + 'v' + black, [square for _, square in placed], white_to_move
+    # swap colours and mirror the board top to bottom; black's pieces come first in the new order
+    mirrored = [square ^ 56 for piece, square in placed if piece[0] == 'b'] + \
+               [square ^ 56 for piece, square in placed if piece[0] == 'w']
+    return black + 'v' + white, mirrored, not white_to_move
+
+
+def table_index(squares, white_to_move):
+    index = 0 if white_to_move else 1
+    for square in squares:
+        index = index * 64 + square
+    return index
+
+
+"""(wdl, plies) from a table byte: wdl is 1, 0 or -1 for the side to move, plies the distance to mate or None"""
+def decode(value):
+    if value == DRAW:
+        return 0, None
+    plies = value - 1
+    return (1 if plies % 2 else -1), plies
+
+
+class Tablebase:
+    def __init__(self, directory='tablebases', max_pieces=5):
+        self.directory = directory
+        self.max_pieces = max_pieces
+        self.tables = {} # signature -> (file, mmap), or None when there is no file
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + '.tb')
+
+    def table(self, signature):
+        if signature not in self.tables:
+            self.tables[signature] = None
+            path = self.path(signature)
+            if os.path.exists(path):
+                file = open(path, 'rb')
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, _, stored = HEADER.unpack_from(data)
+                if magic != MAGIC or stored.rstrip(b'\0').decode() != signature:
+                    data.close()
+                    file.close()
+                    raise ValueError('not a tablebase for %s: %s' % (signature, path))
+                self.tables[signature] = (file, data)
+        table = self.tables[signature]
+        return table[1] if table is not None else None
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[1].close()
+                table[0].close()
+        self.tables = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    """Table byte for pieces on squares, or None if that table isn't available; bare kings are a draw"""
+    def probe_placement(self, pieces, squares, white_to_move):
+        signature, squares, white_to_move = canonical(pieces, squares, white_to_move)
+        if signature == 'KvK':
+            return DRAW
+        data = self.table(signature)
+        if data is None:
+            return None
+        return data[HEADER.size + table_index(squares, white_to_move)]
+
+    """(wdl, plies) for gs's position (see decode), or None when castling or en passant is possible or there's no table"""
+    def probe(self, gs):
+        if gs.castling_rights:
+            return None
+        if gs.enpassant_possible != ():
+            r, f = gs.enpassant_possible
+            pawn = 'wp' if gs.white_to_move else 'bp'
+            pawn_rank = r + 1 if gs.white_to_move else r - 1
+            if (f > 0 and gs.board[pawn_rank][f - 1] == pawn) or (f < 7 and gs.board[pawn_rank][f + 1] == pawn):
+                return None
+        pieces = []
+        squares = []
+        for r in range(8):
+            for f in range(8):
+                piece = gs.board[r][f]
+                if piece != '--':
+                    pieces.append(piece)
+                    squares.append(r * 8 + f)
+                    if len(pieces) > self.max_pieces:
+                        return None
+        value = self.probe_placement(pieces, squares, gs.white_to_move)
+        if value is None or value == INVALID:
+            return None
+        return decode(value)
+
+    """
+    The Move that keeps gs's result: the fastest mate when winning, the longest defence when losing and a move
+    that holds the draw otherwise. None when the position isn't covered or there are no legal moves.
+    """
+    def best_move(self, gs):
+        if self.probe(gs) is None:
+            return None
+        best = None
+        best_rank = None
+        for move in gs.get_valid_moves():
+            gs.make_move(move)
+            result = self.probe(gs)
+            gs.undo_move()
+            if result is None:
+                continue
+            wdl, plies = result
+            # the opponent's loss is our win: prefer it quickly, then draws, then their win as late as possible
+            rank = (wdl, plies if wdl < 0 else 0 if wdl == 0 else -plies)
+            if best_rank is None or rank < best_rank:
+                best, best_rank = move, rank
+        return best
+
+
+"""Signatures whose results the moves out of signature lead to: one piece captured, or a pawn made a queen"""
+def dependencies(signature):
+    pieces = signature_pieces(signature)
+    found = set()
+    for i, piece in enumerate(pieces):
+        if piece[1] == 'K':
+            continue
+        rest = pieces[:i] + pieces[i + 1:]
+        found.add(canonical(rest, list(range(len(rest))), True)[0])
+        if piece[1] == 'p':
+            promoted = pieces[:i] + [piece[0] + 'Q'] + pieces[i + 1:]
+            found.add(canonical(promoted, list(range(len(promoted))), True)[0])
+    found.discard('KvK')
+    return sorted(found)
+
+
+"""
+Builds the table for signature in directory, first building any table it depends on that isn't there yet.
+Every placement is set up on an empty GameState to find its legal moves; the results then spread backwards from
+the checkmates one ply at a time, so each win is the fastest mate and each loss the slowest one.
+"""
+def generate(signature, directory='tablebases', log=None):
+    pieces = signature_pieces(signature)
+    signature = canonical(pieces, list(range(len(pieces))), True)[0]
+    pieces = signature_pieces(signature)
+    for dependency in dependencies(signature):
+        if not os.path.exists(os.path.join(directory, dependency + '.tb')):
+            generate(dependency, directory, log)
+    start = time.perf_counter()
+    count = len(pieces)
+    size = 2 * 64 ** count
+    values = bytearray([INVALID]) * size
+    move_counts = array('b', bytes(size)) # legal moves not yet known to lose for the mover
+    longest = bytearray(size) # longest known opponent win over the moves counted off so far
+    pending = [[] for _ in range(MAX_PLIES + 2)] # positions by the ply count they are resolved at
+    # moves that stay in the table as (from index, to index) pairs, kept in flat int arrays to save memory
+    edges_from = array('i')
+    edges_to = array('i')
+    gs = engine.GameState()
+    gs.load_fen('4k3/8/8/8/8/8/8/4K3 w - - 0 1')
+    board = gs.board
+    board[0][4] = board[7][4] = '--' # start from an empty board, the kings are placed with the other pieces
+    tablebases = Tablebase(directory, count)
+    for squares in itertools.product(range(64), repeat=count):
+        if len(set(squares)) < count:
+            continue
+        if any(piece[1] == 'p' and not 8 <= square < 56 for piece, square in zip(pieces, squares)):
+            continue
+        for piece, square in zip(pieces, squares):
+            board[square >> 3][square & 7] = piece
+            if piece[1] == 'K':
+                if piece[0] == 'w':
+                    gs.white_king_location = (square >> 3, square & 7)
+                else:
+                    gs.black_king_location = (square >> 3, square & 7)
+        for white_to_move in (True, False):
+            gs.white_to_move = not white_to_move
+            if gs.in_check():
+                continue # the side that just moved left its king in check
+            gs.white_to_move = white_to_move
+            index = table_index(squares, white_to_move)
+            values[index] = DRAW
+            codes = gs.get_valid_move_codes()
+            if not codes:
+                if gs.in_check():
+                    pending[0].append(index)
+                continue
+            inside = 0
+            escapes = False # a move out of the table that doesn't lose
+            worst = 0
+            for code in codes:
+                end = code >> 6 & 63
+                moved = squares.index(code & 63)
+                after = list(squares)
+                after[moved] = end
+                after_pieces = pieces
+                if end in squares:
+                    captured = squares.index(end)
+                    after_pieces = pieces[:captured] + pieces[captured + 1:]
+                    del after[captured]
+                    moved -= captured < moved
+                if after_pieces[moved][1] == 'p' and end >> 3 in (0, 7):
+                    after_pieces = after_pieces[:moved] + [after_pieces[moved][0] + 'Q'] + after_pieces[moved + 1:]
+                if after_pieces is pieces:
+                    edges_from.append(index)
+                    edges_to.append(table_index(after, not white_to_move))
+                    inside += 1
+                    continue
+                value = tablebases.probe_placement(after_pieces, after, not white_to_move)
+                if value is None:
+                    raise ValueError('missing tablebase for a move out of ' + signature)
+                wdl, plies = decode(value)
+                if wdl < 0:
+                    pending[plies + 1].append(index)
+                elif wdl == 0:
+                    escapes = True
+                else:
+                    worst = max(worst, plies)
+            if escapes:
+                move_counts[index] = -1 # can never be lost
+            else:
+                move_counts[index] = inside
+                longest[index] = worst
+                if not inside:
+                    pending[worst + 1].append(index)
+        for square in squares:
+            board[square >> 3][square & 7] = '--'
+    tablebases.close()
+
+    # group the moves by the position they lead to: predecessors[first[i]:first[i + 1]] all move into index i
+    first = array('i', bytes(4 * (size + 1)))
+    for successor in edges_to:
+        first[successor + 1] += 1
+    for index in range(size):
+        first[index + 1] += first[index]
+    predecessors = array('i', bytes(4 * len(edges_to)))
+    filled = array('i', first)
+    for position, successor in zip(edges_from, edges_to):
+        predecessors[filled[successor]] = position
+        filled[successor] += 1
+    del edges_from, edges_to, filled
+    resolved = bytearray(size)
+    for plies in range(MAX_PLIES + 1):
+        for index in pending[plies]:
+            if resolved[index]:
+                continue
+            resolved[index] = 1
+            values[index] = plies + 1
+            for predecessor in predecessors[first[index]:first[index + 1]]:
+                if resolved[predecessor]:
+                    continue
+                if plies % 2 == 0: # index is lost for its mover, so moving there wins
+                    pending[plies + 1].append(predecessor)
+                elif move_counts[predecessor] > 0:
+                    move_counts[predecessor] -= 1
+                    longest[predecessor] = max(longest[predecessor], plies)
+                    if move_counts[predecessor] == 0: # every move loses
+                        pending[longest[predecessor] + 1].append(predecessor)
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, signature + '.tb')
+    with open(path + '.tmp', 'wb') as file:
+        file.write(HEADER.pack(MAGIC, count, signature.encode()))
+        file.write(values)
+    os.replace(path + '.tmp', path)
+    if log is not None:
+        log('%s: %d positions, %d won, %d lost, longest mate %d plies, %.1fs' % (
+            signature, sum(1 for value in values if value != INVALID),
+            sum(1 for value in values if value not in (DRAW, INVALID) and value % 2 == 0),
+            sum(1 for value in values if value not in (DRAW, INVALID) and value % 2 == 1),
+            max((value - 1 for value in values if value not in (DRAW, INVALID)), default=0),
+            time.perf_counter() - start))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate or probe endgame tablebases')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate_parser = commands.add_parser('generate', help='build tables, e.g. KQvK KRvK KPvK')
+    generate_parser.add_argument('signatures', nargs='+')
+    generate_parser.add_argument('--dir', default='tablebases')
+    probe_parser = commands.add_parser('probe', help='result and best move of a position')
+    probe_parser.add_argument('fen')
+    probe_parser.add_argument('--dir', default='tablebases')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        for signature in args.signatures:
+            generate(signature, args.dir, log=print)
+        return 0
+    gs = engine.GameState()
+    gs.load_fen(args.fen)
+    with Tablebase(args.dir) as tablebases:
+        result = tablebases.probe(gs)
+        if result is None:
+            print('not in the tablebases')
+            return 1
+        wdl, plies = result
+        move = tablebases.best_move(gs)
+        print('%s%s, best move %s' % ({1: 'win', 0: 'draw', -1: 'loss'}[wdl],
+                                      ' in %d plies' % plies if plies is not None else '',
+                                      move.write_chess_notation() if move is not None else 'none'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
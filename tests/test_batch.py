@@ -0,0 +1,45 @@
+"""
+The NumPy batch API against GameState over random games and the perft reference positions.
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from chess import batch
+from chess import bitboard
+from chess import engine
+from chess import perft
+
+
+def test_batch_cross_check():
+    assert batch.cross_check(batch.random_positions(300, seed=2)) == []
+
+
+def test_reference_positions():
+    fens = [fen for _, fen, _ in perft.POSITIONS]
+    positions = batch.PositionBatch.from_fens(fens)
+    assert list(batch.legal_move_counts(positions)) == [expected[1] for _, _, expected in perft.POSITIONS]
+    states = []
+    for fen in fens:
+        gs = engine.GameState()
+        gs.load_fen(fen)
+        states.append(gs)
+    assert list(batch.in_check(positions)) == [gs.in_check() for gs in states]
+
+
+def test_attack_masks_match_bitboards():
+    states = batch.random_positions(50, seed=3)
+    masks = batch.attack_masks(batch.PositionBatch.from_states(states))
+    for gs, side_masks in zip(states, masks):
+        boards = bitboard.Bitboards(gs.board)
+        for color, mask in zip('wb', side_masks):
+            expected = sum(1 << sq for sq in range(64) if boards.attackers(sq, color, boards.occupied))
+            assert int(mask) == expected, gs.get_fen()
+
+
+def test_planes_round_trip():
+    positions = batch.PositionBatch.from_states(batch.random_positions(20, seed=4))
+    again = batch.PositionBatch.from_planes(positions.planes(), positions.white_to_move, positions.castling_rights,
+                                            positions.enpassant)
+    assert np.array_equal(again.pieces, positions.pieces)
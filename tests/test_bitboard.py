@@ -0,0 +1,55 @@
+"""
+The bitboard backend against the mailbox one: the same legal moves, checks and game ends over random games,
+and castling only with the king and rook on their starting squares.
+"""
+
+import random
+
+from chess import bitboard
+from chess import engine
+
+
+def notations(moves):
+    return sorted(move.write_chess_notation() for move in moves)
+
+
+def test_mailbox_matches_bitboard():
+    rng = random.Random(2)
+    for _ in range(30):
+        mailbox = engine.GameState(backend='mailbox')
+        bitboard = engine.GameState(backend='bitboard')
+        for _ in range(100):
+            moves = mailbox.get_valid_moves()
+            assert notations(moves) == notations(bitboard.get_valid_moves())
+            assert mailbox.in_check() == bitboard.in_check()
+            assert (mailbox.checkmate, mailbox.stalemate) == (bitboard.checkmate, bitboard.stalemate)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            mailbox.make_move(move)
+            bitboard.make_move(move)
+
+
+def test_undo_restores_bitboards():
+    rng = random.Random(3)
+    gs = engine.GameState(backend='bitboard')
+    for _ in range(60):
+        moves = gs.get_valid_moves()
+        if not moves:
+            break
+        gs.make_move(rng.choice(moves))
+    while gs.move_log:
+        gs.undo_move()
+    assert gs.bitboards.pieces == engine.GameState(backend='bitboard').bitboards.pieces
+
+
+def test_castling_needs_the_king_and_rook_at_home():
+    gs = engine.GameState(backend='bitboard')
+    for fen in ('4k3/8/8/8/8/8/8/4K3 w - - 0 1', '4k3/8/8/8/8/8/8/6K1 w - - 0 1', '4k3/8/8/8/8/8/8/1K5R w - - 0 1'):
+        gs.load_fen(fen)
+        # rights the position can't back up, passed in directly since load_fen refuses them
+        codes = gs.bitboards.generate_legal_moves(True, True, True, None)
+        assert not any(code & bitboard.CASTLE_FLAG for code in codes), fen
+    gs.load_fen('4k3/8/8/8/8/8/8/4K3 w - - 0 1')
+    gs.bitboards.make_move(engine.Move((7, 4), (7, 6), gs.board, is_castle_move=True))
+    assert gs.bitboards.pieces['wR'] == 0 and gs.bitboards.colors['w'] == 1 << 62
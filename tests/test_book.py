@@ -0,0 +1,93 @@
+"""
+Polyglot keys against the format's published test positions, and books built, written and read back.
+"""
+
+import random
+
+import pytest
+
+from chess import book
+from chess import engine
+from chess import search
+
+# (moves from the start position, Polyglot key) from the Polyglot book format description
+KEYS = [
+    ((), 0x463B96181691FC9C),
+    (('e2e4',), 0x823C9B50FD114196),
+    (('e2e4', 'd7d5'), 0x0756B94461C50FB0),
+    (('e2e4', 'd7d5', 'e4e5'), 0x662FAFB965DB29D4),
+    (('e2e4', 'd7d5', 'e4e5', 'f7f5'), 0x22A48B5A8E47FF78),
+    (('e2e4', 'd7d5', 'e4e5', 'f7f5', 'e1e2'), 0x652A607CA3F242C1),
+    (('e2e4', 'd7d5', 'e4e5', 'f7f5', 'e1e2', 'e8f7'), 0x00FDD303C946BDD9),
+    (('a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4'), 0x3C8123EA7B067637),
+    (('a2a4', 'b7b5', 'h2h4', 'b5b4', 'c2c4', 'b4c3', 'a1a3'), 0x5C3F9B829B279560),
+]
+GAMES = '''[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 1-0
+
+[Result "1/2-1/2"]
+
+1. e4 c5 1/2-1/2
+
+[Result "0-1"]
+
+1. d4 d5 0-1
+'''
+
+
+def play(gs, moves):
+    for text in moves:
+        gs.make_move({move.write_chess_notation(): move for move in gs.get_valid_moves()}[text])
+
+
+@pytest.mark.parametrize('moves, key', KEYS)
+def test_polyglot_key(moves, key):
+    gs = engine.GameState()
+    play(gs, moves)
+    assert book.polyglot_key(gs) == key
+
+
+def test_castling_is_the_king_taking_its_rook():
+    gs = engine.GameState()
+    gs.load_fen('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1')
+    raws = {move.write_chess_notation(): book.encode_book_move(move) for move in gs.get_valid_moves()}
+    assert raws['e1g1'] == 7 | 4 << 6 and raws['e1c1'] == 0 | 4 << 6
+
+
+def test_book_moves_and_choice(tmp_path):
+    gs = engine.GameState()
+    key = book.polyglot_key(gs)
+    moves = {move.write_chess_notation(): book.encode_book_move(move) for move in gs.get_valid_moves()}
+    path = str(tmp_path / 'book.bin')
+    book.write_book(path, {(key, moves['d2d4']): 30, (key, moves['e2e4']): 70, (key + 1, moves['c2c4']): 5,
+                           (key, 0x7FFF): 50}) # a move that isn't legal is skipped
+    with book.OpeningBook(path) as opening_book:
+        assert len(opening_book) == 4
+        assert [(move.write_chess_notation(), weight) for move, weight in opening_book.moves(gs)] == \
+               [('e2e4', 70), ('d2d4', 30)]
+        assert opening_book.choose(gs).write_chess_notation() == 'e2e4'
+        assert opening_book.choose(gs, random.Random(1)).write_chess_notation() in ('e2e4', 'd2d4')
+        assert search.Searcher(book=opening_book).search(gs, 3).write_chess_notation() == 'e2e4'
+        play(gs, ['e2e4'])
+        assert opening_book.moves(gs) == [] and opening_book.choose(gs) is None
+
+
+def test_build_book(tmp_path):
+    pgn_path = tmp_path / 'games.pgn'
+    pgn_path.write_text(GAMES)
+    path = str(tmp_path / 'book.bin')
+    assert book.build_book(str(pgn_path), path, plies=2) == 3
+    with book.OpeningBook(path) as opening_book:
+        gs = engine.GameState()
+        # e4 won once and drew once, d4 only lost
+        assert [(move.write_chess_notation(), weight) for move, weight in opening_book.moves(gs)] == [('e2e4', 3)]
+        play(gs, ['e2e4'])
+        assert [(move.write_chess_notation(), weight) for move, weight in opening_book.moves(gs)] == [('c7c5', 1)]
+
+
+def test_empty_book(tmp_path):
+    path = str(tmp_path / 'empty.bin')
+    book.write_book(path, {})
+    with book.OpeningBook(path) as opening_book:
+        assert len(opening_book) == 0 and opening_book.choose(engine.GameState()) is None
@@ -0,0 +1,78 @@
+"""
+MoveCache: the same answers as GameState, least recently used eviction, and mate flags set on hits.
+"""
+
+import threading
+
+import pytest
+
+from chess import cache
+from chess import engine
+from chess import perft
+
+MATED = '3R2k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1'
+
+
+def load(fen):
+    gs = engine.GameState()
+    gs.load_fen(fen)
+    return gs
+
+
+def test_same_answers_as_the_game_state():
+    move_cache = cache.MoveCache()
+    for _, fen, _ in perft.POSITIONS:
+        gs = load(fen)
+        for _ in range(2):
+            assert move_cache.get_valid_move_codes(gs) == gs.get_valid_move_codes()
+            assert move_cache.get_valid_moves(gs) == gs.get_valid_moves()
+            assert move_cache.status(gs) == (gs.in_check(), gs.checkmate, gs.stalemate)
+    stats = move_cache.stats()
+    assert stats['size'] == len(perft.POSITIONS) and stats['misses'] == len(perft.POSITIONS)
+    assert stats['hits'] == 5 * len(perft.POSITIONS)
+
+
+def test_least_recently_used_are_dropped():
+    move_cache = cache.MoveCache(max_size=2)
+    states = [load(fen) for _, fen, _ in perft.POSITIONS[:3]]
+    move_cache.lookup(states[0])
+    move_cache.lookup(states[1])
+    move_cache.lookup(states[0]) # now the most recently used
+    move_cache.lookup(states[2])
+    assert len(move_cache) == 2
+    assert set(move_cache.entries) == {states[0].zobrist_key, states[2].zobrist_key}
+    with pytest.raises(ValueError):
+        cache.MoveCache(max_size=0)
+
+
+def test_hits_set_the_mate_flags():
+    move_cache = cache.MoveCache()
+    gs = load(MATED)
+    assert move_cache.get_valid_moves(gs) == [] and gs.checkmate
+    other = load(MATED)
+    assert not other.checkmate
+    move_cache.get_valid_move_codes(other)
+    assert other.checkmate and not other.stalemate
+    start = engine.GameState()
+    move_cache.lookup(start)
+    start.checkmate = True # left over from another position
+    move_cache.lookup(start)
+    assert not start.checkmate
+
+
+def test_shared_between_threads():
+    move_cache = cache.MoveCache(max_size=8)
+    expected = {fen: sorted(load(fen).get_valid_move_codes()) for _, fen, _ in perft.POSITIONS}
+    failures = []
+    def work():
+        states = [load(fen) for fen in expected]
+        for _ in range(20):
+            for gs, fen in zip(states, expected):
+                if sorted(move_cache.get_valid_move_codes(gs)) != expected[fen]:
+                    failures.append(fen)
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert failures == [] and len(move_cache) <= 8
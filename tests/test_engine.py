@@ -0,0 +1,132 @@
+"""
+GameState move generation: the pin/check-aware generator against make/undo filtering, checkmate detection,
+pins, packed move codes, square attack lookups, undo and the precomputed move tables.
+"""
+
+import random
+
+import pytest
+
+from chess import engine
+from chess import perft
+
+
+def notations(moves):
+    return sorted(move.write_chess_notation() for move in moves)
+
+
+"""Plays moves given in long algebraic notation ('e2e4') on gs, each of which has to be legal"""
+def play(gs, *moves):
+    for text in moves:
+        legal = {move.write_chess_notation(): move for move in gs.get_valid_moves()}
+        assert text in legal, text
+        gs.make_move(legal[text])
+
+
+def test_pin_aware_matches_filtering():
+    rng = random.Random(1)
+    for _ in range(30):
+        pin_aware = engine.GameState()
+        filtering = engine.GameState(pin_aware=False)
+        for _ in range(100):
+            moves = pin_aware.get_valid_moves()
+            assert notations(moves) == notations(filtering.get_valid_moves())
+            assert (pin_aware.checkmate, pin_aware.stalemate) == (filtering.checkmate, filtering.stalemate)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            pin_aware.make_move(move)
+            filtering.make_move(move)
+
+
+def test_checkmate():
+    gs = engine.GameState()
+    play(gs, 'f2f3', 'e7e5', 'g2g4', 'd8h4')
+    assert gs.get_valid_moves() == []
+    assert gs.checkmate and not gs.stalemate
+
+
+def test_pinned_piece_stays_on_the_pin_line():
+    gs = engine.GameState()
+    play(gs, 'e2e4', 'd7d6', 'd2d4', 'b8d7', 'f1b5')
+    assert not [move for move in notations(gs.get_valid_moves()) if move.startswith('d7')]
+
+
+def test_move_codes_round_trip():
+    flags = set()
+    for fen in [fen for _, fen, _ in perft.POSITIONS] + ['4k3/P7/8/8/8/8/8/4K3 w - - 0 1']:
+        gs = engine.GameState()
+        gs.load_fen(fen)
+        moves = gs.get_valid_moves()
+        assert [move.code for move in moves] == gs.get_valid_move_codes()
+        for move in moves:
+            again = engine.Move.from_code(move.code, gs.board)
+            assert again == move and hash(again) == hash(move)
+            assert (again.piece_moved, again.piece_captured, again.is_castle_move, again.is_enpassant_move,
+                    again.is_pawn_promotion) == (move.piece_moved, move.piece_captured, move.is_castle_move,
+                                                 move.is_enpassant_move, move.is_pawn_promotion)
+            flags.add((move.is_castle_move, move.is_enpassant_move, move.is_pawn_promotion))
+    assert {(True, False, False), (False, True, False), (False, False, True)} <= flags
+
+
+"""Whether the opponent attacks (r, f) the slow way: generating its moves, which only works for occupied squares"""
+def attacked_by_moves(gs, r, f):
+    gs.white_to_move = not gs.white_to_move
+    try:
+        return any(move.end_rank == r and move.end_file == f for move in gs.get_all_possible_moves())
+    finally:
+        gs.white_to_move = not gs.white_to_move
+
+
+@pytest.mark.parametrize('backend', ['mailbox', 'bitboard'])
+def test_square_under_attack(backend):
+    rng = random.Random(6)
+    for _ in range(10):
+        gs = engine.GameState(backend=backend)
+        for _ in range(80):
+            color = 'w' if gs.white_to_move else 'b'
+            for r in range(8):
+                for f in range(8):
+                    if gs.board[r][f][0] == color:
+                        assert gs.square_under_attack(r, f) == attacked_by_moves(gs, r, f)
+            moves = gs.get_valid_moves()
+            if not moves:
+                break
+            gs.make_move(rng.choice(moves))
+
+
+@pytest.mark.parametrize('backend', ['mailbox', 'bitboard'])
+def test_undo_restores_the_position(backend):
+    rng = random.Random(7)
+    for _, fen, _ in perft.POSITIONS:
+        gs = engine.GameState(backend=backend)
+        gs.load_fen(fen)
+        history = []
+        for _ in range(40):
+            moves = gs.get_valid_moves()
+            if not moves:
+                break
+            history.append((gs.get_fen(), gs.zobrist_key, gs.castling_rights, gs.enpassant_possible))
+            gs.make_move(rng.choice(moves))
+        while history:
+            gs.undo_move()
+            assert (gs.get_fen(), gs.zobrist_key, gs.castling_rights, gs.enpassant_possible) == history.pop()
+        assert gs.state_log == [] and gs.move_log == []
+
+
+def test_move_tables():
+    for sq in range(64):
+        r, f = divmod(sq, 8)
+        for table, offsets in ((engine.KNIGHT_TARGETS, engine.KNIGHT_OFFSETS), (engine.KING_TARGETS,
+                                                                                 engine.KING_OFFSETS)):
+            assert sorted((end_rank, end_file) for end_rank, end_file, _ in table[sq]) == \
+                sorted((r + d_rank, f + d_file) for d_rank, d_file in offsets
+                       if 0 <= r + d_rank < 8 and 0 <= f + d_file < 8)
+        for (d_rank, d_file), ray in zip(engine.DIRECTIONS, engine.RAYS[sq]):
+            assert [(end_rank, end_file) for end_rank, end_file, _ in ray] == \
+                [(r + d_rank * i, f + d_file * i) for i in range(1, len(ray) + 1)]
+            assert not 0 <= r + d_rank * (len(ray) + 1) < 8 or not 0 <= f + d_file * (len(ray) + 1) < 8
+            assert all(code == (sq | (end_rank * 8 + end_file) << 6) for end_rank, end_file, code in ray)
+    assert [end[:2] for end in engine.PAWN_PUSHES['w'][6 * 8 + 4]] == [(5, 4), (4, 4)]
+    assert [end[:2] for end in engine.PAWN_PUSHES['b'][2 * 8 + 4]] == [(3, 4)]
+    assert [end[:2] for end in engine.PAWN_CAPTURES['b'][1 * 8 + 0]] == [(2, 1)]
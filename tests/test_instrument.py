@@ -0,0 +1,69 @@
+"""
+Instrumentation: what enable() records, that disable() puts every original back, and the export formats.
+"""
+
+import json
+
+import pytest
+
+from chess import engine
+from chess import instrument
+from chess import search
+
+
+@pytest.fixture
+def metrics():
+    metrics = instrument.Metrics()
+    yield metrics
+    instrument.disable()
+
+
+def counter(metrics, name):
+    return sum(value for (counter_name, _), value in metrics.counters.items() if counter_name == name)
+
+
+def test_enable_records_and_disable_restores(metrics):
+    originals = {name: engine.GameState.__dict__[name] for name in
+                 ('__init__', 'get_valid_moves', 'get_valid_move_codes', 'square_under_attack', 'make_move',
+                  'undo_move')}
+    search_call = search.Searcher.search
+    existing = engine.GameState()
+    instrument.enable(existing, into=metrics)
+    assert instrument.enabled()
+    created = engine.GameState()
+    search.Searcher().search(created, 2)
+    existing.get_valid_moves()
+    assert counter(metrics, 'chess_make_move_total') == counter(metrics, 'chess_undo_move_total') > 0
+    assert counter(metrics, 'chess_search_nodes_total') > 0
+    assert metrics.histogram('chess_search_seconds').count == 1
+    assert metrics.histogram('chess_piece_moves_seconds', piece='N').count > 0
+    assert metrics.histogram('chess_valid_moves_seconds', method='get_valid_moves').count == 1
+
+    instrument.disable()
+    assert not instrument.enabled()
+    assert {name: engine.GameState.__dict__[name] for name in originals} == originals
+    assert search.Searcher.search is search_call
+    for gs in (existing, created):
+        assert all(not hasattr(function, '__wrapped__') for function in gs.move_functions.values())
+    made = counter(metrics, 'chess_make_move_total')
+    search.Searcher().search(engine.GameState(), 2)
+    assert counter(metrics, 'chess_make_move_total') == made
+
+
+def test_exports(metrics):
+    metrics.increment('chess_make_move_total', 3)
+    histogram = metrics.histogram('chess_piece_moves_seconds', piece='Q')
+    histogram.observe(2e-6)
+    histogram.observe(1.0)
+    histogram.observe(100.0)
+    text = metrics.to_prometheus()
+    assert '# TYPE chess_make_move_total counter\nchess_make_move_total 3\n' in text
+    assert 'chess_piece_moves_seconds_bucket{piece="Q",le="2.5e-06"} 1\n' in text
+    assert 'chess_piece_moves_seconds_bucket{piece="Q",le="1.0"} 2\n' in text
+    assert 'chess_piece_moves_seconds_bucket{piece="Q",le="+Inf"} 3\n' in text
+    assert 'chess_piece_moves_seconds_count{piece="Q"} 3\n' in text
+    exported = json.loads(metrics.to_json())
+    assert exported['counters'] == [{'name': 'chess_make_move_total', 'labels': {}, 'value': 3}]
+    assert exported['histograms'][0]['count'] == 3
+    metrics.reset()
+    assert metrics.counters[('chess_make_move_total', ())] == 0 and histogram.count == 0
@@ -0,0 +1,77 @@
+"""
+The pygame front end without a window: dirty-square redraws and the background move worker.
+"""
+
+import os
+import time
+
+import pytest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+p = pytest.importorskip('pygame')
+
+from chess import engine
+from chess import main
+
+
+@pytest.fixture(autouse=True)
+def pygame_display():
+    p.display.init()
+    images = dict(main.IMAGES)
+    for piece in ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK'):
+        main.IMAGES[piece] = p.Surface((main.SQ_SIZE, main.SQ_SIZE))
+    yield
+    main.IMAGES.clear()
+    main.IMAGES.update(images)
+    p.display.quit()
+
+
+def moves_ready(request_id, timeout=5000):
+    while True:
+        event = p.event.wait(timeout)
+        assert event.type != p.NOEVENT, 'no MOVES_READY event'
+        if event.type == main.MOVES_READY and event.request_id == request_id:
+            return event
+
+
+def test_only_changed_squares_are_redrawn():
+    screen = p.Surface((main.WIDTH, main.HEIGHT))
+    board_surface = main.render_board()
+    gs = engine.GameState()
+    shown_board = [row[:] for row in gs.board]
+    assert main.draw_changed_squares(screen, board_surface, shown_board, gs.board) == []
+    castle = None
+    for text in ('e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1c4', 'g8f6', 'e1g1'):
+        move = {move.write_chess_notation(): move for move in gs.get_valid_moves()}[text]
+        gs.make_move(move)
+        castle = main.draw_changed_squares(screen, board_surface, shown_board, gs.board)
+    assert sorted((rect.x // main.SQ_SIZE, rect.y // main.SQ_SIZE) for rect in castle) == [(4, 7), (5, 7), (6, 7),
+                                                                                           (7, 7)]
+    assert shown_board == gs.board
+    gs.undo_move()
+    assert len(main.draw_changed_squares(screen, board_surface, shown_board, gs.board)) == 4
+
+
+def test_worker_posts_moves_for_the_latest_request():
+    worker = main.BackgroundWorker()
+    try:
+        gs = engine.GameState()
+        event = moves_ready(worker.request(gs, think=False))
+        assert len(event.valid_moves) == 20 and event.best_move is None
+        gs.load_fen('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1')
+        event = moves_ready(worker.request(gs, think=True))
+        assert event.best_move.write_chess_notation() == 'd1d8'
+    finally:
+        worker.shutdown()
+
+
+def test_superseded_search_stops():
+    worker = main.BackgroundWorker()
+    try:
+        gs = engine.GameState()
+        start = time.perf_counter()
+        worker.request(gs, think=True)
+        moves_ready(worker.request(gs, think=False))
+        assert time.perf_counter() - start < main.ENGINE_TIME / 2
+    finally:
+        worker.shutdown()
@@ -0,0 +1,49 @@
+"""
+Process-pool perft and root-split search against the single-process results.
+"""
+
+import pytest
+
+from chess import engine
+from chess import parallel
+from chess import perft
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with parallel.make_pool(2) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize('name, fen, expected', perft.POSITIONS[:4], ids=[name for name, _, _ in perft.POSITIONS[:4]])
+def test_parallel_perft(pool, name, fen, expected):
+    gs = engine.GameState()
+    gs.load_fen(fen)
+    assert parallel.parallel_perft(gs, 3, pool) == expected[3]
+    assert parallel.parallel_perft(gs, 3, pool, split_depth=2) == expected[3]
+
+
+def test_split_positions():
+    gs = engine.GameState()
+    fen = gs.get_fen()
+    fens = parallel.split_positions(gs, 2)
+    assert len(fens) == 400 and len(set(fens)) == 400
+    assert gs.get_fen() == fen
+
+
+def test_parallel_search_plays_a_legal_move(pool):
+    gs = engine.GameState()
+    gs.load_fen(perft.POSITIONS[1][1])
+    fen = gs.get_fen()
+    move, score = parallel.parallel_search(gs, 2, pool)
+    assert move in gs.get_valid_moves()
+    assert gs.get_fen() == fen
+
+
+def test_parallel_search_finds_mate_in_one(pool):
+    gs = engine.GameState()
+    gs.load_fen(MATE_IN_ONE)
+    move, score = parallel.parallel_search(gs, 2, pool)
+    assert move.write_chess_notation() == 'd1d8'
@@ -0,0 +1,42 @@
+"""
+The perft reference suite on both backends and in filtering mode, and divide against perft.
+"""
+
+import io
+
+import pytest
+
+from chess import engine
+from chess import perft
+
+
+@pytest.mark.parametrize('backend', ['mailbox', 'bitboard'])
+@pytest.mark.parametrize('name, fen, expected', perft.POSITIONS, ids=[name for name, _, _ in perft.POSITIONS])
+def test_perft(backend, name, fen, expected):
+    gs = engine.GameState(backend=backend)
+    gs.load_fen(fen)
+    for depth in (1, 2, 3):
+        if depth in expected:
+            assert perft.perft(gs, depth) == expected[depth]
+
+
+def test_filter_mode_perft():
+    gs = engine.GameState(pin_aware=False)
+    for name, fen, expected in perft.POSITIONS:
+        gs.load_fen(fen)
+        assert perft.perft(gs, 2) == expected[2], name
+
+
+def test_divide_adds_up_to_perft():
+    name, fen, expected = perft.POSITIONS[1]
+    gs = engine.GameState()
+    gs.load_fen(fen)
+    counts = perft.divide(gs, 2)
+    assert len(counts) == expected[1]
+    assert sum(counts.values()) == expected[2]
+
+
+def test_run_suite_reports_every_position():
+    out = io.StringIO()
+    assert perft.run_suite(1, out=out)
+    assert out.getvalue().count(' ok\n') == len(perft.POSITIONS)
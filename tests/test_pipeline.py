@@ -0,0 +1,97 @@
+"""
+FEN move clocks, the PGN reader and the batch analysis pipeline's readers and results.
+"""
+
+import pytest
+
+from chess import engine
+from chess import perft
+from chess import pgn
+from chess import pipeline
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+GAME = '''[Event "Test"]
+[Result "1-0"]
+
+1. e4 {best by test} e5 2. Nf3 (2. f4 exf4) Nc6 3. Bb5 $1 a6 4. Bxc6 dxc6 5. O-O 1-0
+'''
+
+
+def test_fen_round_trip():
+    gs = engine.GameState()
+    for fen in [fen for _, fen, _ in perft.POSITIONS] + ['r3k2r/8/8/8/4Pp2/8/8/R3K2R b Qk e3 7 42']:
+        gs.load_fen(fen)
+        assert gs.get_fen() == fen
+
+
+def test_replay_pgn(tmp_path):
+    path = tmp_path / 'game.pgn'
+    path.write_text(GAME + '\n' + GAME)
+    games = list(pgn.read_games(str(path)))
+    assert len(games) == 2
+    headers, moves = games[0]
+    assert headers['Result'] == '1-0'
+    assert moves == ['e4', 'e5', 'Nf3', 'Nc6', 'Bb5', 'a6', 'Bxc6', 'dxc6', 'O-O']
+    gs = engine.GameState()
+    for _ in pgn.replay(gs, headers, moves):
+        pass
+    assert gs.get_fen() == 'r1bqkbnr/1pp2ppp/p1p5/4p3/4P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 1 5'
+
+
+def test_illegal_san_is_rejected():
+    with pytest.raises(pgn.IllegalMoveError):
+        pgn.san_to_move(engine.GameState(), 'Nf6')
+
+
+def test_read_positions(tmp_path):
+    fens = tmp_path / 'positions.fen'
+    fens.write_text('# comment\n%s\n\n%s\n' % (perft.POSITIONS[0][1], MATE_IN_ONE))
+    assert [position_id for position_id, _ in pipeline.read_positions(str(fens))] == ['2', '4']
+    epd = tmp_path / 'positions.epd'
+    epd.write_text('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - bm Rd8#; id "back rank";\n')
+    assert list(pipeline.read_positions(str(epd))) == [('back rank', '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - -')]
+    games = tmp_path / 'games.pgn'
+    games.write_text(GAME)
+    assert len(list(pipeline.read_positions(str(games)))) == 9
+    assert [position_id for position_id, _ in pipeline.read_positions(str(games), final_only=True)] == ['1']
+
+
+@pytest.mark.parametrize('backend', ['mailbox', 'bitboard'])
+def test_run(backend):
+    positions = [('start', perft.POSITIONS[0][1]), ('mate', MATE_IN_ONE),
+                 ('mated', '3R2k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1'), ('stalemate', 'k7/2Q5/1K6/8/8/8/8/8 b - - 0 1')]
+    results = []
+    assert pipeline.run(iter(positions), results.append, workers=2, depth=2, backend=backend, max_pending=2) == 4
+    results = {result['id']: result for result in results}
+    assert results['start']['legal_moves'] == 20
+    assert results['mate']['best_move'] == 'd1d8'
+    assert results['mated']['checkmate'] and results['mated']['in_check']
+    assert results['stalemate']['stalemate'] and 'best_move' not in results['stalemate']
+
+
+@pytest.mark.parametrize('fen', ['', '8/8/8/8/8/8/8/8 w - - 0 1', 'rnbqkbnr/pppppppp w KQkq - 0 1',
+                                 '4k3/8/8/8/8/8/8/4K2X w - - 0 1', '4k3/9/8/8/8/8/8/4K3 w - - 0 1',
+                                 '4k3/8/8/8/8/8/8/4K3 x - - 0 1', '4k3/8/8/8/8/8/8/4K3 w - e4 0 1',
+                                 '4k3/8/8/8/8/8/8/6K1 w K - 0 1', '4k3/8/8/8/8/8/8/1K6 w Q - 0 1',
+                                 '4k3/8/8/8/8/8/8/4K3 w KQ - 0 1', 'r3k3/8/8/8/8/8/8/4K3 b kq - 0 1'])
+def test_load_fen_rejects_malformed(fen):
+    with pytest.raises(ValueError):
+        engine.GameState().load_fen(fen)
+
+
+def test_en_passant_square_needs_a_pawn_to_take():
+    gs = engine.GameState()
+    for fen in ('4k3/8/8/8/8/8/8/4K3 w - e6 0 1', '4k3/8/8/4p3/8/8/8/4K3 b - e3 0 1',
+                '4k3/8/4p3/4p3/8/8/8/4K3 w - e6 0 1'):
+        gs.load_fen(fen)
+        assert gs.enpassant_possible == () and gs.get_fen() == fen.replace(' e6 ', ' - ').replace(' e3 ', ' - ')
+    gs.load_fen('4k3/8/8/3Pp3/8/8/8/4K3 w - e6 0 1')
+    assert 'd5e6' in [move.write_chess_notation() for move in gs.get_valid_moves()]
+
+
+def test_pipeline_reports_malformed_fen():
+    results = []
+    positions = [('bad', '8/8/8/8/8/8/8/8 w - - 0 1'), ('start', perft.POSITIONS[0][1])]
+    assert pipeline.run(iter(positions), results.append, workers=1, depth=1) == 2
+    results = {result['id']: result for result in results}
+    assert results['bad']['error'].startswith('ValueError') and results['start']['legal_moves'] == 20
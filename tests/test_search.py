@@ -0,0 +1,53 @@
+"""
+Alpha-beta search: mates and material found, positions left as they were, time and node limits kept.
+"""
+
+import time
+
+from chess import engine
+from chess import search
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+
+
+def load(fen):
+    gs = engine.GameState()
+    gs.load_fen(fen)
+    return gs
+
+
+def test_finds_mate_in_one():
+    gs = load(MATE_IN_ONE)
+    searcher = search.Searcher()
+    move = searcher.search(gs, 4)
+    assert move.write_chess_notation() == 'd1d8'
+    assert searcher.best_score == search.MATE_SCORE - 1
+
+
+def test_takes_a_hanging_queen():
+    move = search.find_best_move(load('k7/8/8/3q4/8/8/8/K2R4 w - - 0 1'), 3)
+    assert move.write_chess_notation() == 'd1d5'
+
+
+def test_no_move_without_legal_moves():
+    gs = load('3R2k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1')
+    assert search.find_best_move(gs, 3) is None
+
+
+def test_search_leaves_the_position_unchanged():
+    gs = load('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    board = [row[:] for row in gs.board]
+    key = gs.zobrist_key
+    search.Searcher().search(gs, 3, node_limit=5000) # stopped part way through an iteration
+    assert gs.board == board and gs.zobrist_key == key and gs.move_log == []
+
+
+def test_time_and_node_limits():
+    gs = engine.GameState()
+    searcher = search.Searcher()
+    start = time.perf_counter()
+    move = searcher.search(gs, time_limit=0.2)
+    assert time.perf_counter() - start < 1.0
+    assert move in gs.get_valid_moves() and searcher.depth_reached >= 1
+    searcher.search(gs, node_limit=3000)
+    assert searcher.nodes < 3000 + 1024
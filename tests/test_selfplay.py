@@ -0,0 +1,66 @@
+"""
+Game-end detection, SAN and PGN output, and self-play games played across worker processes.
+"""
+
+import pytest
+
+from chess import engine
+from chess import pgn
+from chess import selfplay
+
+
+def load(fen):
+    gs = engine.GameState()
+    gs.load_fen(fen)
+    return gs
+
+
+@pytest.mark.parametrize('fen, ending', [
+    ('3R2k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1', ('1-0', 'checkmate')),
+    ('k7/2Q5/1K6/8/8/8/8/8 b - - 0 1', ('1/2-1/2', 'stalemate')),
+    ('k7/8/1K6/8/8/8/8/2B1B3 w - - 0 1', ('1/2-1/2', 'insufficient material')),
+    ('k7/8/1K6/8/8/8/8/1NB5 w - - 0 1', None),
+    ('k7/8/1K6/8/8/8/8/7R w - - 100 80', ('1/2-1/2', 'fifty-move rule')),
+    ('k7/8/1K6/8/8/8/8/7R w - - 99 80', None),
+])
+def test_game_over(fen, ending):
+    gs = load(fen)
+    assert selfplay.game_over(gs, gs.get_valid_move_codes()) == ending
+
+
+def test_threefold_repetition():
+    gs = engine.GameState()
+    shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+    for ply, text in enumerate(shuffle * 2):
+        assert not gs.is_threefold_repetition(), ply
+        gs.make_move({move.write_chess_notation(): move for move in gs.get_valid_moves()}[text])
+    assert gs.is_threefold_repetition()
+    assert selfplay.game_over(gs, gs.get_valid_move_codes()) == ('1/2-1/2', 'threefold repetition')
+    gs.undo_move()
+    assert not gs.is_threefold_repetition()
+
+
+def test_move_to_san():
+    gs = load('4k3/8/8/8/8/8/4P3/R3K2R w KQ - 0 1')
+    sans = sorted(pgn.move_to_san(gs, move) for move in gs.get_valid_moves())
+    assert {'O-O', 'O-O-O', 'e4', 'Ra8+', 'Rh8+', 'Rd1', 'Rf1'} <= set(sans)
+    gs = load('4k3/8/8/R7/8/1K6/8/R6R w - - 0 1')
+    assert {pgn.move_to_san(gs, move) for move in gs.get_valid_moves()} >= {'Rad1', 'Rhd1', 'R1a3', 'R5a3', 'Rh8+'}
+    gs = load('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1')
+    assert pgn.move_to_san(gs, pgn.san_to_move(gs, 'Rd8')) == 'Rd8#'
+
+
+def test_games_replay_from_their_pgn(tmp_path):
+    games = []
+    results = selfplay.run(4, games.append, white='greedy', black='random', workers=2, seed=7, max_plies=200,
+                           alternate=True)
+    assert len(results) == 4 and sorted(game['game'] for game in games) == [1, 2, 3, 4]
+    path = tmp_path / 'games.pgn'
+    path.write_text(''.join(pgn.write_game(game['headers'], game['san'], game['result']) for game in games))
+    gs = engine.GameState()
+    for game, (headers, moves) in zip(games, pgn.read_games(str(path))):
+        assert headers['Result'] == game['result'] and moves == game['san']
+        for _ in pgn.replay(gs, headers, moves):
+            pass
+        assert gs.get_fen() == game['final_fen']
+        assert game['headers']['White'] == ('greedy' if game['game'] % 2 else 'random')
@@ -0,0 +1,145 @@
+"""
+The game server over real HTTP and WebSocket connections, with a one-worker pool.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import time
+
+from chess import server
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+
+
+def run(test, **options):
+    async def main():
+        game_server = server.Server(workers=1, **options)
+        port = await game_server.start('127.0.0.1', 0)
+        try:
+            await test(game_server, port)
+        finally:
+            await game_server.close()
+    asyncio.run(main())
+
+
+def test_http_game():
+    async def test(game_server, port):
+        client = server.Client('127.0.0.1', port)
+        try:
+            status, state = await client.request('POST', '/games', {})
+            assert status == 201 and len(state['moves']) == 20 and state['turn'] == 'w'
+            path = '/games/' + state['game']
+            status, state = await client.request('POST', path + '/moves', {'move': 'e2e4'})
+            assert status == 200 and state['turn'] == 'b' and state['plies'] == 1
+            assert (await client.request('POST', path + '/moves', {'move': 'e2e4'}))[0] == 400
+            assert (await client.request('POST', path + '/undo'))[1]['plies'] == 0
+            assert (await client.request('POST', path + '/undo'))[0] == 409
+            assert (await client.request('POST', path + '/perft', {'depth': 2})) == (
+                200, {'game': state['game'], 'depth': 2, 'nodes': 400})
+            assert (await client.request('POST', path + '/perft', {'depth': 9}))[0] == 400
+            for time_limit in ('nan', 'inf', -1, 0):
+                assert (await client.request('POST', path + '/search', {'time': time_limit}))[0] == 400
+                assert (await client.request('POST', path + '/perft', {'time': time_limit}))[0] == 400
+            assert (await client.request('GET', path))[1]['fen'] == server.START_FEN
+            assert (await client.request('PUT', path))[0] == 405
+            assert (await client.request('GET', '/games/nope'))[0] == 404
+            assert (await client.request('GET', '/nowhere'))[0] == 404
+            assert (await client.request('POST', '/games', [1]))[0] == 400
+            assert (await client.request('POST', '/games', {'fen': '8/8/8/8/8/8/8/8 w - - 0 1'}))[0] == 400
+            stats = (await client.request('GET', '/stats'))[1]
+            assert stats['games'] == 1 and stats['pending'] == 0
+            assert (await client.request('DELETE', path))[0] == 200
+            assert (await client.request('GET', path))[0] == 404
+        finally:
+            client.close()
+    run(test)
+
+
+def test_search_plays_the_mate():
+    async def test(game_server, port):
+        client = server.Client('127.0.0.1', port)
+        try:
+            game = (await client.request('POST', '/games', {'fen': MATE_IN_ONE}))[1]['game']
+            status, result = await client.request('POST', '/games/%s/search' % game, {'time': 2, 'play': True})
+            assert status == 200 and result['move'] == 'd1d8'
+            assert result['state']['result'] == '1-0' and result['state']['termination'] == 'checkmate'
+        finally:
+            client.close()
+    run(test)
+
+
+def test_full_pool_is_busy():
+    async def test(game_server, port):
+        clients = [server.Client('127.0.0.1', port) for _ in range(3)]
+        try:
+            game = (await clients[0].request('POST', '/games', {}))[1]['game']
+            statuses = await asyncio.gather(*[client.request('POST', '/games/%s/search' % game, {'time': 0.5})
+                                              for client in clients])
+            assert sorted(status for status, _ in statuses) == [200, 503, 503]
+        finally:
+            for client in clients:
+                client.close()
+    run(test, max_pending=1)
+
+
+def test_failed_new_game_is_not_kept(monkeypatch):
+    def broken_state(self, session):
+        raise RuntimeError('broken')
+    async def test(game_server, port):
+        monkeypatch.setattr(server.Server, 'state', broken_state)
+        client = server.Client('127.0.0.1', port)
+        try:
+            assert (await client.request('POST', '/games', {}))[0] == 500
+            assert game_server.sessions == {}
+        finally:
+            client.close()
+    run(test)
+
+
+async def websocket(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(('GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                  'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n' % key).encode('latin-1'))
+    assert (await reader.readline()).split()[1] == b'101'
+    while await reader.readline() != b'\r\n':
+        pass
+    return reader, writer
+
+
+def test_websocket():
+    async def test(game_server, port):
+        reader, writer = await websocket(port)
+        async def call(message):
+            writer.write(server.encode_frame(0x1, json.dumps(message).encode()))
+            opcode, payload = await server.read_message(reader)
+            assert opcode == 0x1
+            return json.loads(payload)
+        try:
+            reply = await call({'id': 1, 'op': 'new'})
+            assert reply['id'] == 1 and len(reply['result']['moves']) == 20
+            game = reply['result']['game']
+            reply = await call({'id': 'two', 'op': 'move', 'game': game, 'move': 'g1f3'})
+            assert reply['id'] == 'two' and reply['result']['plies'] == 1
+            assert (await call({'id': 3, 'op': 'move', 'game': game, 'move': 'g1f3'}))['status'] == 400
+            assert (await call({'id': 4, 'op': 'fly', 'game': game}))['status'] == 400
+            writer.write(server.encode_frame(0x1, json.dumps({'id': 5, 'op': 'search', 'game': game,
+                                                              'time': 5}).encode()))
+            replies = [await call({'id': 6, 'op': 'cancel', 'target': 5})]
+            replies.append(json.loads((await server.read_message(reader))[1]))
+            assert sorted(reply['id'] for reply in replies) == [5, 6]
+            assert {reply['id']: reply for reply in replies}[5]['status'] == 409
+            writer.write(server.encode_frame(0x9, b'ping'))
+            assert await server.read_message(reader) == (0xA, b'ping')
+        finally:
+            writer.write(server.encode_frame(0x8, b'\x03\xe8'))
+            writer.close()
+    run(test)
+
+
+def test_perft_gives_up_at_its_deadline():
+    server._init_worker('mailbox')
+    assert server._perft_task(server.START_FEN, [], 3, time.time() + 60) == 8902
+    assert server._perft_task(server.START_FEN, [], 4, time.time() - 1) is None
@@ -0,0 +1,50 @@
+"""
+Tablebase signatures and the KQvK table: generated once, then probed for wins, draws and best moves.
+"""
+
+import pytest
+
+from chess import engine
+from chess import search
+from chess import tablebase
+
+
+@pytest.fixture(scope='module')
+def tables(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('tablebases'))
+    tablebase.generate('KQvK', directory)
+    with tablebase.Tablebase(directory) as tables:
+        yield tables
+
+
+def load(fen):
+    gs = engine.GameState()
+    gs.load_fen(fen)
+    return gs
+
+
+def test_signatures():
+    assert tablebase.signature_pieces('KQvK') == ['wK', 'wQ', 'bK']
+    assert tablebase.canonical(['bK', 'bQ', 'wK'], [0, 1, 2], True) == ('KQvK', [56, 57, 58], False)
+    assert tablebase.dependencies('KPvK') == ['KQvK']
+    with pytest.raises(ValueError):
+        tablebase.signature_pieces('QvK')
+
+
+def test_probe(tables):
+    assert tables.probe(load('k7/8/1K6/8/8/8/8/6Q1 w - - 0 1')) == (1, 1)
+    assert tables.probe(load('k7/8/1K6/8/8/8/8/6Q1 b - - 0 1'))[0] == -1
+    assert tables.probe(load('k7/1Q6/8/8/8/8/8/7K b - - 0 1')) == (0, None) # the queen is taken
+    assert tables.probe(load('K7/1q6/8/8/8/8/8/7k w - - 0 1')) == (0, None) # colours swapped
+    assert tables.probe(load('k7/8/8/8/8/8/8/7K w - - 0 1')) == (0, None)
+    assert tables.probe(load('k7/8/1K6/8/8/8/8/7R w - - 0 1')) is None # no KRvK table
+
+
+def test_best_move_mates(tables):
+    gs = load('k7/8/1K6/8/8/8/8/6Q1 w - - 0 1')
+    gs.make_move(tables.best_move(gs))
+    assert gs.get_valid_moves() == [] and gs.checkmate
+    searcher = search.Searcher(tablebase=tables)
+    gs = load('8/8/8/3k4/8/8/8/KQ6 w - - 0 1')
+    move = searcher.search(gs, 2)
+    assert move is not None and searcher.best_score > search.MATE_BOUND
@@ -0,0 +1,131 @@
+"""
+The UCI front end driven line by line, with its output captured, and its move and time helpers.
+"""
+
+import io
+
+import pytest
+
+from chess import engine
+from chess import pgn
+from chess import search
+from chess import uci
+
+MATE_IN_ONE = '6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'
+
+
+@pytest.fixture
+def uci_engine():
+    uci_engine = uci.UCIEngine(output=io.StringIO())
+    yield uci_engine
+    uci_engine.close()
+
+
+"""Output of lines that answer straight away; a search's output is collected by finish"""
+def send(uci_engine, *lines):
+    for line in lines:
+        assert uci_engine.handle(line)
+    output = uci_engine.output.getvalue().splitlines()
+    uci_engine.output.seek(0)
+    uci_engine.output.truncate()
+    return output
+
+
+"""Output up to and including bestmove, once the search thread has finished on its own"""
+def finish(uci_engine):
+    uci_engine.thread.join(10)
+    assert not uci_engine.thread.is_alive()
+    return send(uci_engine)
+
+
+def test_handshake(uci_engine):
+    assert uci_engine.backend == 'bitboard'
+    output = send(uci_engine, 'uci', 'isready')
+    assert output[0] == 'id name ' + uci.NAME
+    assert output[-2:] == ['uciok', 'readyok']
+    assert send(uci_engine, 'setoption name Hash value 16') == ['info string unknown option Hash']
+    assert not uci_engine.handle('quit')
+
+
+def test_position(uci_engine):
+    assert send(uci_engine, 'position startpos moves e2e4 e7e5 g1f3', 'd') == [
+        'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2']
+    assert send(uci_engine, 'position fen 4k3/P7/8/8/8/8/8/4K3 w - - 0 1 moves a7a8q', 'd') == [
+        'Q3k3/8/8/8/8/8/8/4K3 b - - 0 1']
+    output = send(uci_engine, 'position startpos moves e2e5')
+    assert output[0].startswith('info string bad position')
+    output = send(uci_engine, 'position fen rnbqkbnr/pppppppp w KQkq - 0 1')
+    assert output[0].startswith('info string bad position')
+
+
+def test_go_finds_mate(uci_engine):
+    send(uci_engine, 'position fen ' + MATE_IN_ONE)
+    uci_engine.handle('go depth 3')
+    output = finish(uci_engine)
+    assert output[-1] == 'bestmove d1d8'
+    assert ' score mate 1 ' in output[-2]
+
+
+def test_go_infinite_waits_for_stop(uci_engine):
+    send(uci_engine, 'position fen ' + MATE_IN_ONE)
+    uci_engine.handle('go infinite')
+    uci_engine.thread.join(0.5)
+    assert uci_engine.thread.is_alive()
+    output = send(uci_engine, 'stop')
+    assert output[-1] == 'bestmove d1d8'
+    assert uci_engine.thread is None
+
+
+def test_go_with_a_clock(uci_engine):
+    uci_engine.handle('go wtime 2000 btime 2000 movestogo 40')
+    output = finish(uci_engine)
+    move = output[-1].split()[1]
+    assert move in [uci.format_move(move) for move in engine.GameState().get_valid_moves()]
+
+
+def test_go_with_a_bad_limit(uci_engine):
+    send(uci_engine, 'position fen ' + MATE_IN_ONE)
+    uci_engine.handle('go depth x movetime 2000')
+    output = finish(uci_engine)
+    assert output[0] == 'info string bad depth: x'
+    assert output[-1] == 'bestmove d1d8'
+
+
+def test_no_legal_moves(uci_engine):
+    send(uci_engine, 'position fen 3R2k1/5ppp/8/8/8/8/5PPP/6K1 b - - 1 1')
+    uci_engine.handle('go depth 2')
+    assert finish(uci_engine) == ['bestmove 0000']
+
+
+def test_failed_search_still_answers(uci_engine, monkeypatch):
+    def broken_search(*args):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(search.Searcher, 'search', broken_search)
+    uci_engine.handle('go depth 2')
+    assert finish(uci_engine) == ['info string search failed: RuntimeError: broken', 'bestmove 0000']
+
+
+def test_parse_and_format_moves():
+    gs = engine.GameState()
+    gs.load_fen('4k3/P7/8/8/8/8/8/4K3 w - - 0 1')
+    move = uci.parse_move(gs, 'a7a8q')
+    assert move.is_pawn_promotion and uci.format_move(move) == 'a7a8q'
+    assert uci.format_code(move.code, gs.board) == 'a7a8q'
+    assert uci.parse_move(gs, 'A7A8').is_pawn_promotion
+    with pytest.raises(pgn.IllegalMoveError):
+        uci.parse_move(gs, 'a7a8n')
+    with pytest.raises(pgn.IllegalMoveError):
+        uci.parse_move(gs, 'e1e3')
+    with pytest.raises(ValueError):
+        uci.parse_move(gs, 'castle')
+
+
+def test_scores_and_time():
+    assert uci.format_score(35) == 'cp 35'
+    assert uci.format_score(search.MATE_SCORE - 1) == 'mate 1'
+    assert uci.format_score(search.MATE_SCORE - 3) == 'mate 2'
+    assert uci.format_score(-search.MATE_SCORE + 2) == 'mate -1'
+    assert uci.allot_time({'movetime': 1500}, True) == 1.5
+    assert uci.allot_time({}, True) is None
+    assert uci.allot_time({'wtime': 60000, 'btime': 1000, 'movestogo': 30}, True) == 2.0
+    assert uci.allot_time({'wtime': 60000, 'btime': 100}, False) == 0.01
@@ -0,0 +1,70 @@
+"""
+Incremental Zobrist keys against keys computed from scratch, and the transposition table's replacement rules.
+"""
+
+import random
+
+import pytest
+
+from chess import engine
+from chess import perft
+from chess import zobrist
+
+
+def play(gs, *moves):
+    for text in moves:
+        legal = {move.write_chess_notation(): move for move in gs.get_valid_moves()}
+        gs.make_move(legal[text])
+
+
+@pytest.mark.parametrize('backend', ['mailbox', 'bitboard'])
+def test_incremental_key_matches_computed(backend):
+    rng = random.Random(4)
+    for name, fen, _ in perft.POSITIONS:
+        gs = engine.GameState(backend=backend)
+        gs.load_fen(fen)
+        keys = [gs.zobrist_key]
+        for _ in range(40):
+            moves = gs.get_valid_moves()
+            if not moves:
+                break
+            gs.make_move(rng.choice(moves))
+            assert gs.zobrist_key == zobrist.compute_key(gs), name
+            keys.append(gs.zobrist_key)
+        while gs.move_log:
+            keys.pop()
+            gs.undo_move()
+            assert gs.zobrist_key == keys[-1], name
+
+
+def test_transpositions_share_a_key():
+    first, second = engine.GameState(), engine.GameState()
+    play(first, 'g1f3', 'b8c6', 'b1c3')
+    play(second, 'b1c3', 'b8c6', 'g1f3')
+    assert first.zobrist_key == second.zobrist_key
+    play(first, 'c6b8')
+    assert first.zobrist_key != second.zobrist_key
+
+
+def test_table_keeps_deeper_entries_within_a_search():
+    table = zobrist.TranspositionTable(16)
+    table.store(5, 4, zobrist.EXACT, 10)
+    table.store(5 + 16, 2, zobrist.EXACT, 20) # same slot, another position, shallower
+    assert table.probe(5) == (4, zobrist.EXACT, 10, None)
+    assert table.probe(5 + 16) is None
+    table.new_search()
+    table.store(5 + 16, 2, zobrist.LOWER_BOUND, 20, 'move')
+    assert table.probe(5 + 16) == (2, zobrist.LOWER_BOUND, 20, 'move')
+    assert (table.hits, table.misses) == (2, 1)
+
+
+def test_table_size_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        zobrist.TranspositionTable(100)
+
+
+def test_hashed_perft():
+    for name, fen, expected in perft.POSITIONS[:3]:
+        gs = engine.GameState()
+        gs.load_fen(fen)
+        assert perft.perft(gs, 3, zobrist.TranspositionTable(1 << 12)) == expected[3], name
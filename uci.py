@@ -0,0 +1,261 @@
+"""
+UCI Front End
+Speaks the Universal Chess Interface on stdin/stdout, so the engine can be loaded into chess GUIs and match
+runners. Searches run on a background thread, so 'stop', 'isready' and 'quit' are answered while searching.
+Moves are in long algebraic notation ('e2e4', 'e7e8q'); the engine only promotes to a queen.
+Run with: python -m chess.uci [--backend mailbox|bitboard] [--book FILE] [--tablebases DIR]
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+from chess import book
+from chess import engine
+from chess import pgn
+from chess import search
+from chess import tablebase
+from chess import zobrist
+
+START_FEN = pgn.START_FEN
+NAME = 'chess'
+AUTHOR = 'the chess authors'
+SQUARE_NAMES = [f + r for r in '87654321' for f in 'abcdefgh'] # by board square number, a8 = 0
+
+
+"""Long algebraic notation of a move, with the 'q' UCI asks for on promotions"""
+def format_move(move):
+    return move.write_chess_notation() + ('q' if move.is_pawn_promotion else '')
+
+
+"""format_move for a packed move code on board, without building the Move"""
+def format_code(code, board):
+    start, end = code & 63, code >> 6 & 63
+    text = SQUARE_NAMES[start] + SQUARE_NAMES[end]
+    if board[start >> 3][start & 7][1] == 'p' and end >> 3 in (0, 7):
+        text += 'q'
+    return text
+
+
+"""The Move among codes (gs.get_valid_move_codes() by default) written as text in long algebraic notation"""
+def parse_move(gs, text, codes=None):
+    text = text.strip().lower()
+    if len(text) not in (4, 5) or text[0] not in 'abcdefgh' or text[2] not in 'abcdefgh' or \
+            text[1] not in '12345678' or text[3] not in '12345678':
+        raise ValueError('not a UCI move: ' + text)
+    if len(text) == 5 and text[4] != 'q':
+        raise pgn.IllegalMoveError('the engine only promotes to a queen: ' + text)
+    if codes is None:
+        codes = gs.get_valid_move_codes()
+    squares = text[:4]
+    for code in codes:
+        if SQUARE_NAMES[code & 63] + SQUARE_NAMES[code >> 6 & 63] == squares:
+            move = engine.Move.from_code(code, gs.board)
+            if len(text) == 4 or move.is_pawn_promotion:
+                return move
+    raise pgn.IllegalMoveError('illegal move: ' + text)
+
+
+"""UCI 'score' value: 'cp N' from the side to move's point of view, or 'mate N' in moves (negative if mated)"""
+def format_score(score):
+    if score > search.MATE_BOUND:
+        return 'mate %d' % ((search.MATE_SCORE - score + 1) // 2)
+    if score < -search.MATE_BOUND:
+        return 'mate %d' % -((search.MATE_SCORE + score) // 2)
+    return 'cp %d' % score
+
+
+"""
+Seconds to spend on a move for the limits of a 'go' command (None to search without a clock):
+movetime if given, otherwise a share of the remaining time plus most of the increment, kept clear of flagging.
+"""
+def allot_time(limits, white_to_move):
+    if 'movetime' in limits:
+        return limits['movetime'] / 1000
+    remaining = limits.get('wtime' if white_to_move else 'btime')
+    if remaining is None:
+        return None
+    increment = limits.get('winc' if white_to_move else 'binc', 0)
+    moves_to_go = limits.get('movestogo', 30)
+    budget = remaining / max(moves_to_go, 1) + increment * 0.8
+    return max(min(budget, remaining * 0.5 - 50), 10) / 1000
+
+
+class UCIEngine:
+    def __init__(self, backend='bitboard', book_path=None, tablebase_dir=None, output=None):
+        self.backend = backend
+        self.output = output if output is not None else sys.stdout
+        self.gs = engine.GameState(backend=backend)
+        self.table = zobrist.TranspositionTable()
+        self.book = book.OpeningBook(book_path) if book_path else None
+        self.tablebase = tablebase.Tablebase(tablebase_dir) if tablebase_dir else None
+        self.searcher = None
+        self.thread = None
+        self.output_lock = threading.Lock()
+        self.stop_requested = threading.Event() # set by 'stop'; an infinite search waits for it to report
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    """Handles one line of input; returns False once the engine should exit"""
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send('id name ' + NAME)
+            self.send('id author ' + AUTHOR)
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name TablebasePath type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            self.table = zobrist.TranspositionTable()
+            self.gs.load_fen(START_FEN)
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'd':
+            self.send(self.gs.get_fen())
+        elif command == 'quit':
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, args):
+        if 'name' not in args:
+            return
+        if 'value' in args:
+            name = ' '.join(args[args.index('name') + 1:args.index('value')])
+            value = ' '.join(args[args.index('value') + 1:])
+        else:
+            name, value = ' '.join(args[args.index('name') + 1:]), ''
+        if value == '<empty>':
+            value = ''
+        try:
+            if name.lower() == 'bookfile':
+                if self.book is not None:
+                    self.book.close()
+                self.book = book.OpeningBook(value) if value else None
+            elif name.lower() == 'tablebasepath':
+                if self.tablebase is not None:
+                    self.tablebase.close()
+                self.tablebase = tablebase.Tablebase(value) if value else None
+            else:
+                self.send('info string unknown option ' + name)
+        except OSError as error:
+            self.send('info string %s: %s' % (name, error))
+
+    """'position [startpos | fen <FEN>] [moves <move> ...]'"""
+    def set_position(self, args):
+        moves = []
+        if 'moves' in args:
+            moves = args[args.index('moves') + 1:]
+            args = args[:args.index('moves')]
+        if args and args[0] == 'fen':
+            fen = ' '.join(args[1:])
+        else:
+            fen = START_FEN
+        try:
+            self.gs.load_fen(fen)
+            for text in moves:
+                self.gs.make_move(parse_move(self.gs, text))
+        except ValueError as error: # includes pgn.IllegalMoveError
+            self.send('info string bad position: %s' % error)
+
+    """
+    'go' with depth, movetime, wtime/btime/winc/binc/movestogo, nodes and infinite; the search runs on a thread.
+    A limit whose value isn't a number is reported with info string and left out.
+    """
+    def go(self, args):
+        limits = {}
+        infinite = False
+        i = 0
+        while i < len(args):
+            if args[i] == 'infinite':
+                infinite = True
+            elif args[i] in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes') and \
+                    i + 1 < len(args):
+                try:
+                    limits[args[i]] = int(args[i + 1])
+                except ValueError:
+                    self.send('info string bad %s: %s' % (args[i], args[i + 1]))
+                i += 1
+            i += 1
+        time_limit = None if infinite else allot_time(limits, self.gs.white_to_move)
+        depth = limits.get('depth', search.MAX_PLY)
+        self.searcher = search.Searcher(self.table, self.book, self.tablebase)
+        self.stop_requested.clear()
+        self.thread = threading.Thread(target=self.run_search,
+                                       args=(self.searcher, depth, time_limit, limits.get('nodes'), infinite),
+                                       daemon=True)
+        self.thread.start()
+
+    """Runs on the search thread; a bestmove is always sent, '0000' if the search failed or found nothing"""
+    def run_search(self, searcher, depth, time_limit, node_limit, infinite):
+        move = None
+        try:
+            start = time.perf_counter()
+            move = searcher.search(self.gs, depth, time_limit, node_limit)
+            elapsed = time.perf_counter() - start
+            if searcher.depth_reached > 0:
+                self.send('info depth %d score %s nodes %d time %d nps %d pv %s' % (
+                    searcher.depth_reached, format_score(searcher.best_score), searcher.nodes, elapsed * 1000,
+                    searcher.nodes / elapsed if elapsed else 0, format_move(move)))
+        except Exception as error:
+            self.send('info string search failed: %s: %s' % (type(error).__name__, error))
+        finally:
+            if infinite:
+                self.stop_requested.wait() # 'go infinite' may only answer once told to stop
+            self.send('bestmove ' + (format_move(move) if move is not None else '0000'))
+
+    """Stops a running search and waits for its bestmove, so the position isn't changed under it"""
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stop_requested.set()
+        while self.thread.is_alive():
+            self.searcher.stop() # again, in case the search hadn't started when first asked
+            self.thread.join(0.01)
+        self.thread = None
+
+    def close(self):
+        self.stop()
+        if self.book is not None:
+            self.book.close()
+        if self.tablebase is not None:
+            self.tablebase.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='UCI engine on stdin/stdout')
+    parser.add_argument('--backend', choices=('mailbox', 'bitboard'), default='bitboard')
+    parser.add_argument('--book', help='Polyglot opening book')
+    parser.add_argument('--tablebases', help='directory of endgame tables')
+    args = parser.parse_args(argv)
+
+    uci = UCIEngine(args.backend, args.book, args.tablebases)
+    try:
+        for line in sys.stdin:
+            if not uci.handle(line):
+                break
+    finally:
+        uci.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
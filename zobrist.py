@@ -0,0 +1,89 @@
+"""
+Zobrist Keys and Transposition Table
+A position's key is the XOR of one random 64-bit number per (piece, square), plus side to move,
+castling rights and the en-passant file. GameState keeps its key up to date in make_move/undo_move.
+"""
+
+import random
+
+PIECES = ('wp', 'wR', 'wN', 'wB', 'wQ', 'wK', 'bp', 'bR', 'bN', 'bB', 'bQ', 'bK')
+
+# fixed seed so keys (and anything stored under them) are the same in every process
+_random = random.Random(0x5EED)
+PIECE_KEYS = {piece: [_random.getrandbits(64) for _ in range(64)] for piece in PIECES}
+BLACK_TO_MOVE_KEY = _random.getrandbits(64)
+CASTLING_KEYS = [_random.getrandbits(64) for _ in range(16)] # indexed by GameState.castling_rights
+ENPASSANT_KEYS = [_random.getrandbits(64) for _ in range(8)] # indexed by file
+del _random
+
+
+"""Key of a GameState computed from scratch"""
+def compute_key(gs):
+    key = 0
+    for r in range(8):
+        for f in range(8):
+            piece = gs.board[r][f]
+            if piece != '--':
+                key ^= PIECE_KEYS[piece][r * 8 + f]
+    if not gs.white_to_move:
+        key ^= BLACK_TO_MOVE_KEY
+    key ^= CASTLING_KEYS[gs.castling_rights]
+    if gs.enpassant_possible != ():
+        key ^= ENPASSANT_KEYS[gs.enpassant_possible[1]]
+    return key
+
+
+EXACT = 0
+LOWER_BOUND = 1 # value is at least the stored value (fail high)
+UPPER_BOUND = 2 # value is at most the stored value (fail low)
+
+
+class TranspositionTable:
+    """
+    Fixed number of slots indexed by the low bits of the key, so memory never grows past size entries.
+    A slot is replaced when it is empty, holds the same position, was written in an earlier search,
+    or holds a result from a shallower or equal depth - deeper results from the current search are kept.
+    """
+    def __init__(self, size=1 << 16):
+        if size <= 0 or size & (size - 1):
+            raise ValueError('size must be a power of two')
+        self.size = size
+        self.mask = size - 1
+        self.keys = [0] * size
+        self.entries = [None] * size # (depth, flag, value, move, generation)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    """Marks existing entries as old so a new search may overwrite them regardless of depth"""
+    def new_search(self):
+        self.generation += 1
+
+    def clear(self):
+        self.keys = [0] * self.size
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = self.misses = self.stores = 0
+
+    """Returns (depth, flag, value, move) for the position or None"""
+    def probe(self, key):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is not None and self.keys[index] == key:
+            self.hits += 1
+            return entry[:4]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, flag, value, move=None):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or self.keys[index] == key or entry[4] != self.generation or depth >= entry[0]:
+            self.keys[index] = key
+            self.entries[index] = (depth, flag, value, move, self.generation)
+            self.stores += 1
+
+    """Fraction of slots in use"""
+    def usage(self):
+        return sum(1 for entry in self.entries if entry is not None) / self.size